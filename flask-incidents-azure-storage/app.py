@@ -6,20 +6,63 @@ Application Flask pour la gestion d'incidents réseau avec :
 - Azure Blob Storage pour les documents
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, Response, abort, g, has_request_context, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import urllib.parse
 import os
-import uuid
 import io
+import base64
+import csv
+import re
+import math
+import heapq
+import bisect
+import hashlib
+import hmac
+import functools
+import json
+import mimetypes
+import random
+import socket
+import sys
+import zlib
+import tempfile
+from collections import deque, namedtuple
+import threading
+import time
+import unicodedata
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.exceptions import HTTPException
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
-from sqlalchemy import text
+from werkzeug.wsgi import get_input_stream
+from sqlalchemy import text, func, or_, and_, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.exc import IntegrityError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 
 # Azure Storage imports
-from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient
+from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient, StorageErrorCode, BlobSasPermissions, generate_blob_sas
 from azure.identity import DefaultAzureCredential
-from azure.core.exceptions import AzureError
+from azure.core.exceptions import AzureError, ClientAuthenticationError, ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.core.pipeline.transport import RequestsTransport
+import requests
+
+# Compression brotli optionnelle (gzip seul si le paquet brotli est absent)
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Codec zstd optionnel pour la compression au repos des pièces jointes
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Charger les variables d'environnement depuis le fichier .env
 try:
@@ -41,6 +84,17 @@ AZURE_SQL_DATABASE = os.environ.get('AZURE_SQL_DATABASE', 'IncidentsReseau')
 AZURE_SQL_USERNAME = os.environ.get('AZURE_SQL_USERNAME', 'votre-admin')
 AZURE_SQL_PASSWORD = os.environ.get('AZURE_SQL_PASSWORD', 'VotreMotDePasse123!')
 
+# Pool de connexions SQLAlchemy (appliqué aux moteurs SQL Server / Azure SQL)
+AZURE_SQL_POOL_SIZE = int(os.environ.get('AZURE_SQL_POOL_SIZE', '10'))
+AZURE_SQL_MAX_OVERFLOW = int(os.environ.get('AZURE_SQL_MAX_OVERFLOW', '20'))
+AZURE_SQL_POOL_TIMEOUT = int(os.environ.get('AZURE_SQL_POOL_TIMEOUT', '30'))
+# Azure SQL ferme les connexions inactives : les recycler avant (secondes)
+AZURE_SQL_POOL_RECYCLE = int(os.environ.get('AZURE_SQL_POOL_RECYCLE', '1800'))
+AZURE_SQL_POOL_PRE_PING = os.environ.get('AZURE_SQL_POOL_PRE_PING', 'True').lower() == 'true'
+AZURE_SQL_FAST_EXECUTEMANY = os.environ.get('AZURE_SQL_FAST_EXECUTEMANY', 'True').lower() == 'true'
+# Délai max d'exécution d'une requête en secondes (0 = illimité)
+AZURE_SQL_QUERY_TIMEOUT = int(os.environ.get('AZURE_SQL_QUERY_TIMEOUT', '0'))
+
 # ========================================
 # CONFIGURATION AZURE BLOB STORAGE
 # ========================================
@@ -51,9 +105,21 @@ AZURE_STORAGE_ACCOUNT_KEY = os.environ.get('AZURE_STORAGE_ACCOUNT_KEY', 'votre-c
 AZURE_STORAGE_CONNECTION_STRING = os.environ.get('AZURE_STORAGE_CONNECTION_STRING')
 AZURE_STORAGE_CONTAINER_NAME = os.environ.get('AZURE_STORAGE_CONTAINER_NAME', 'incident-documents')
 
-# Mode de stockage (mock pour tests, azure pour production)
+# Backend de stockage des documents : 'azure' (production), 'local' (système de fichiers),
+# 'memory' (en mémoire, par processus) ou 'mock' (alias de 'memory')
 AZURE_STORAGE_MODE = os.environ.get('AZURE_STORAGE_MODE', 'azure')
 
+# Backends locaux : répertoire racine (hors du dépôt par défaut) et injection de latence / débit / erreurs
+LOCAL_STORAGE_PATH = os.environ.get('LOCAL_STORAGE_PATH', os.path.join(tempfile.gettempdir(), 'incident-documents-storage'))
+STORAGE_SIMULATED_LATENCY_MS = float(os.environ.get('STORAGE_SIMULATED_LATENCY_MS', '0'))
+# Latence supplémentaire tirée d'une loi exponentielle (moyenne en ms) pour reproduire une queue de distribution
+STORAGE_SIMULATED_JITTER_MS = float(os.environ.get('STORAGE_SIMULATED_JITTER_MS', '0'))
+# Débit max par transfert en octets/s (0 = illimité)
+STORAGE_SIMULATED_BANDWIDTH = int(os.environ.get('STORAGE_SIMULATED_BANDWIDTH', '0'))
+# Proportion de requêtes en échec (0 à 1)
+STORAGE_SIMULATED_ERROR_RATE = float(os.environ.get('STORAGE_SIMULATED_ERROR_RATE', '0'))
+STORAGE_SIMULATED_SEED = os.environ.get('STORAGE_SIMULATED_SEED')
+
 # Types de fichiers autorisés et taille max
 ALLOWED_EXTENSIONS = {
     'documents': {'pdf', 'doc', 'docx', 'txt', 'md', 'rtf'},
@@ -65,6 +131,105 @@ ALLOWED_EXTENSIONS = {
 }
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16 MB
 
+# Compression au repos des pièces jointes, par catégorie (ex. 'documents:gzip,spreadsheets:gzip,other:zstd').
+# Désactivée par défaut ; zstd nécessite le paquet zstandard
+STORAGE_COMPRESSION = os.environ.get('STORAGE_COMPRESSION', '')
+STORAGE_GZIP_LEVEL = int(os.environ.get('STORAGE_GZIP_LEVEL', '6'))
+STORAGE_ZSTD_LEVEL = int(os.environ.get('STORAGE_ZSTD_LEVEL', '3'))
+STORAGE_COMPRESSION_MIN_SIZE = int(os.environ.get('STORAGE_COMPRESSION_MIN_SIZE', '1024'))
+
+# Pagination de la liste des incidents (page HTML et API)
+INCIDENTS_PAGE_SIZE = int(os.environ.get('INCIDENTS_PAGE_SIZE', '50'))
+INCIDENTS_MAX_PAGE_SIZE = int(os.environ.get('INCIDENTS_MAX_PAGE_SIZE', '500'))
+SEVERITES_VALIDES = ['Critique', 'Élevée', 'Moyenne', 'Faible']
+# Statistiques globales de la page d'accueil recalculées au plus toutes les N secondes par worker (0 = à chaque page)
+INCIDENT_STATS_TTL = float(os.environ.get('INCIDENT_STATS_TTL', '30'))
+
+# Recherche plein texte (index inversé en mémoire, resynchronisé depuis la base)
+SEARCH_SYNC_INTERVAL = float(os.environ.get('SEARCH_SYNC_INTERVAL', '5'))
+# Chevauchement de la synchronisation incrémentale : une ligne validée après le passage précédent avec une
+# date_modification antérieure (transaction lente, autre worker, horloges décalées) est relue si l'écart
+# reste sous ce délai ; au-delà, la reconstruction complète périodique la rattrape (secondes, 0 = jamais)
+SEARCH_SYNC_OVERLAP = float(os.environ.get('SEARCH_SYNC_OVERLAP', '300'))
+SEARCH_REBUILD_INTERVAL = float(os.environ.get('SEARCH_REBUILD_INTERVAL', '3600'))
+SEARCH_MAX_RESULTS = int(os.environ.get('SEARCH_MAX_RESULTS', '100'))
+
+# Import en masse (/api/incidents/bulk) : taille des lots d'INSERT, erreurs détaillées, taille max du flux
+BULK_IMPORT_BATCH_SIZE = int(os.environ.get('BULK_IMPORT_BATCH_SIZE', '1000'))
+BULK_IMPORT_MAX_ERRORS = int(os.environ.get('BULK_IMPORT_MAX_ERRORS', '1000'))
+BULK_IMPORT_MAX_SIZE = int(os.environ.get('BULK_IMPORT_MAX_SIZE', str(256 * 1024 * 1024)))
+
+# Export en streaming (/api/incidents/export) : lignes lues par aller-retour SQL, taille des blocs envoyés
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '2000'))
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', str(64 * 1024)))
+
+# Pool de connexions HTTP partagé par le client Blob Storage du processus
+AZURE_STORAGE_POOL_CONNECTIONS = int(os.environ.get('AZURE_STORAGE_POOL_CONNECTIONS', '10'))
+AZURE_STORAGE_POOL_MAXSIZE = int(os.environ.get('AZURE_STORAGE_POOL_MAXSIZE', '32'))
+AZURE_STORAGE_CONNECTION_TIMEOUT = int(os.environ.get('AZURE_STORAGE_CONNECTION_TIMEOUT', '10'))
+AZURE_STORAGE_READ_TIMEOUT = int(os.environ.get('AZURE_STORAGE_READ_TIMEOUT', '60'))
+# Durée de vie max du client (secondes) quand l'expiration n'est pas connue
+AZURE_STORAGE_CLIENT_TTL = int(os.environ.get('AZURE_STORAGE_CLIENT_TTL', '3600'))
+
+# Taille des blocs lus depuis Blob Storage lors des téléchargements en streaming
+AZURE_STORAGE_DOWNLOAD_CHUNK_SIZE = int(os.environ.get('AZURE_STORAGE_DOWNLOAD_CHUNK_SIZE', str(1024 * 1024)))
+
+# Upload : 'streaming' (blocs en parallèle depuis le flux) ou 'buffered' (fichier lu en mémoire)
+AZURE_STORAGE_UPLOAD_MODE = os.environ.get('AZURE_STORAGE_UPLOAD_MODE', 'streaming')
+AZURE_STORAGE_MAX_SINGLE_PUT_SIZE = int(os.environ.get('AZURE_STORAGE_MAX_SINGLE_PUT_SIZE', str(4 * 1024 * 1024)))
+AZURE_STORAGE_MAX_BLOCK_SIZE = int(os.environ.get('AZURE_STORAGE_MAX_BLOCK_SIZE', str(4 * 1024 * 1024)))
+AZURE_STORAGE_UPLOAD_CONCURRENCY = int(os.environ.get('AZURE_STORAGE_UPLOAD_CONCURRENCY', '4'))
+# Nombre de fichiers d'un même formulaire uploadés simultanément
+AZURE_STORAGE_UPLOAD_WORKERS = int(os.environ.get('AZURE_STORAGE_UPLOAD_WORKERS', '4'))
+
+# Suppression différée des blobs libérés : un blob non référencé depuis BLOB_RELEASE_GRACE secondes
+# est supprimé par un thread de purge (toutes les BLOB_PURGE_INTERVAL secondes, 0 pour désactiver)
+BLOB_RELEASE_GRACE = int(os.environ.get('BLOB_RELEASE_GRACE', '900'))
+BLOB_PURGE_INTERVAL = float(os.environ.get('BLOB_PURGE_INTERVAL', '300'))
+
+# Cache disque LRU des documents téléchargés (DOCUMENT_CACHE_MAX_SIZE=0 pour le désactiver)
+DOCUMENT_CACHE_DIR = os.environ.get('DOCUMENT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'incident-documents-cache'))
+DOCUMENT_CACHE_MAX_SIZE = int(os.environ.get('DOCUMENT_CACHE_MAX_SIZE', str(256 * 1024 * 1024)))
+# Blocs conservés en mémoire pour les téléchargements simultanés d'un même document ;
+# un client plus lent que ce décalage poursuit avec sa propre lecture
+DOWNLOAD_SHARED_BUFFER_CHUNKS = int(os.environ.get('DOWNLOAD_SHARED_BUFFER_CHUNKS', '8'))
+
+# Sondes de disponibilité : vérification des dépendances en arrière-plan
+HEALTH_PROBE_INTERVAL = float(os.environ.get('HEALTH_PROBE_INTERVAL', '15'))
+HEALTH_PROBE_TIMEOUT = float(os.environ.get('HEALTH_PROBE_TIMEOUT', '5'))
+# Démarrer la sonde à l'import de l'application (démarrage du worker) plutôt qu'à sa première requête
+HEALTH_PROBE_ON_STARTUP = os.environ.get('HEALTH_PROBE_ON_STARTUP', 'True').lower() == 'true'
+
+# Métriques des requêtes (/metrics) : chaque worker publie ses compteurs dans METRICS_DIR
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'incident-metrics'))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '5'))
+# Fichiers des workers arrêtés supprimés après METRICS_RETENTION secondes sans mise à jour
+METRICS_RETENTION = float(os.environ.get('METRICS_RETENTION', '86400'))
+
+# Instrumentation SQL : journal des requêtes lentes, alerte N+1, table des requêtes coûteuses
+SQL_SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS', '200'))
+SQL_QUERY_COUNT_WARNING = int(os.environ.get('SQL_QUERY_COUNT_WARNING', '25'))
+SQL_STATS_MAX_STATEMENTS = int(os.environ.get('SQL_STATS_MAX_STATEMENTS', '500'))
+
+# Routes de debug (/debug/...) : désactivées par défaut, protégées par jeton si défini
+DEBUG_ENDPOINTS_ENABLED = os.environ.get('DEBUG_ENDPOINTS_ENABLED', 'False').lower() == 'true'
+DEBUG_ENDPOINTS_TOKEN = os.environ.get('DEBUG_ENDPOINTS_TOKEN')
+
+# Profilage par échantillonnage (/debug/profile)
+PROFILE_SAMPLE_HZ = float(os.environ.get('PROFILE_SAMPLE_HZ', '100'))
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', '60'))
+
+# Compression des réponses texte (négociée via Accept-Encoding : br puis gzip)
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'True').lower() == 'true'
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '500'))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', '6'))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '4'))
+
+# Upload direct navigateur → Blob Storage (URL SAS courte, puis finalisation par l'API)
+DIRECT_UPLOAD_ENABLED = os.environ.get('DIRECT_UPLOAD_ENABLED', 'True').lower() == 'true'
+DIRECT_UPLOAD_SAS_TTL = int(os.environ.get('DIRECT_UPLOAD_SAS_TTL', '600'))  # secondes
+
 def create_azure_sql_connection_string():
     """Créer la chaîne de connexion Azure SQL Database"""
     
@@ -92,8 +257,107 @@ def create_azure_sql_connection_string():
     
     return f"mssql+pyodbc:///?odbc_connect={connection_params}"
 
-def create_blob_service_client():
+class PoolWaitStats:
+    """Temps d'attente pour obtenir une connexion du pool (par processus)"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    def record(self, seconds, timed_out=False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+    
+    def snapshot(self):
+        with self.lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_total_ms': round(self.total_wait * 1000, 2),
+                'wait_avg_ms': round(self.total_wait * 1000 / attempts, 3) if attempts else 0.0,
+                'wait_max_ms': round(self.max_wait * 1000, 2)
+            }
+
+pool_wait_stats = PoolWaitStats()
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool mesurant l'attente d'une connexion disponible"""
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_wait_stats.record(time.perf_counter() - start)
+        return connection
+
+def create_engine_options():
+    """Options du moteur SQLAlchemy pour Azure SQL (pool, pre-ping, fast_executemany, timeouts)"""
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': AZURE_SQL_POOL_SIZE,
+        'max_overflow': AZURE_SQL_MAX_OVERFLOW,
+        'pool_timeout': AZURE_SQL_POOL_TIMEOUT,
+        'pool_recycle': AZURE_SQL_POOL_RECYCLE,
+        'pool_pre_ping': AZURE_SQL_POOL_PRE_PING,
+        'fast_executemany': AZURE_SQL_FAST_EXECUTEMANY,
+        # Délai de connexion (login) pyodbc, identique à celui de la chaîne de connexion
+        'connect_args': {'timeout': int(os.environ.get('AZURE_CONNECTION_TIMEOUT', '30'))}
+    }
+
+def create_storage_transport():
+    """Créer un transport HTTP keep-alive avec un pool de connexions dimensionné"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=AZURE_STORAGE_POOL_CONNECTIONS,
+        pool_maxsize=AZURE_STORAGE_POOL_MAXSIZE
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    
+    return RequestsTransport(
+        session=session,
+        session_owner=False,
+        connection_timeout=AZURE_STORAGE_CONNECTION_TIMEOUT,
+        read_timeout=AZURE_STORAGE_READ_TIMEOUT
+    )
+
+def get_sas_expiry(sas_token):
+    """Extraire la date d'expiration (paramètre se=) d'un token SAS"""
+    params = urllib.parse.parse_qs(sas_token.lstrip('?'))
+    expiry = params.get('se', [None])[0]
+    if not expiry:
+        return None
+    try:
+        return datetime.strptime(expiry.replace('Z', ''), '%Y-%m-%dT%H:%M:%S')
+    except ValueError:
+        try:
+            return datetime.strptime(expiry, '%Y-%m-%d')
+        except ValueError:
+            return None
+
+def create_blob_service_client(transport=None):
     """Créer le client Azure Blob Storage"""
+    # Limiter la taille des GET/PUT pour que les transferts restent en streaming
+    client_kwargs = {
+        'max_single_get_size': AZURE_STORAGE_DOWNLOAD_CHUNK_SIZE,
+        'max_chunk_get_size': AZURE_STORAGE_DOWNLOAD_CHUNK_SIZE,
+        'max_single_put_size': AZURE_STORAGE_MAX_SINGLE_PUT_SIZE,
+        'max_block_size': AZURE_STORAGE_MAX_BLOCK_SIZE
+    }
+    if transport:
+        client_kwargs['transport'] = transport
     try:
         if AZURE_STORAGE_CONNECTION_STRING:
             # Vérifier si c'est une URL SAS ou une vraie connection string
@@ -105,24 +369,24 @@ def create_blob_service_client():
                 if len(parts) == 2:
                     base_url = parts[0].replace('/appincidentsdocs', '')  # Enlever le container de l'URL
                     sas_token = parts[1]
-                    blob_service_client = BlobServiceClient(account_url=base_url, credential=f"?{sas_token}")
+                    blob_service_client = BlobServiceClient(account_url=base_url, credential=f"?{sas_token}", **client_kwargs)
                     print(f"🔑 SAS Token utilisé, expire probablement bientôt")
                 else:
                     raise ValueError("URL SAS malformée")
             else:
                 # Utilisation de la chaîne de connexion complète traditionnelle
-                blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
+                blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING, **client_kwargs)
                 print("🔗 Connexion Azure Blob Storage via connection string")
         elif AZURE_STORAGE_ACCOUNT_NAME and AZURE_STORAGE_ACCOUNT_KEY:
             # Utilisation du nom de compte et de la clé
             account_url = f"https://{AZURE_STORAGE_ACCOUNT_NAME}.blob.core.windows.net"
-            blob_service_client = BlobServiceClient(account_url=account_url, credential=AZURE_STORAGE_ACCOUNT_KEY)
+            blob_service_client = BlobServiceClient(account_url=account_url, credential=AZURE_STORAGE_ACCOUNT_KEY, **client_kwargs)
             print("🔑 Connexion Azure Blob Storage via account key")
         else:
             # Utilisation de l'authentification par défaut Azure (Managed Identity, Azure CLI, etc.)
             account_url = f"https://{AZURE_STORAGE_ACCOUNT_NAME}.blob.core.windows.net"
             credential = DefaultAzureCredential()
-            blob_service_client = BlobServiceClient(account_url=account_url, credential=credential)
+            blob_service_client = BlobServiceClient(account_url=account_url, credential=credential, **client_kwargs)
             print("🎫 Connexion Azure Blob Storage via Default Azure Credential")
         
         return blob_service_client
@@ -130,15 +394,136 @@ def create_blob_service_client():
         print(f"❌ Erreur lors de la création du client Blob Storage: {e}")
         return None
 
+# Registre du client Blob Storage partagé (un client thread-safe par processus worker)
+_blob_client_lock = threading.Lock()
+_blob_client_registry = {'client': None, 'transport': None, 'pid': None, 'expires_at': None}
+
+def close_blob_service_client(client, transport):
+    """Fermer un client remplacé et les connexions keep-alive de sa session (non possédée par le transport).
+    Les requêtes en cours se terminent : urllib3 ne ferme que les connexions inactives."""
+    try:
+        client.close()
+        if transport is not None and transport.session is not None:
+            transport.session.close()
+    except Exception as e:
+        print(f"⚠️  Erreur lors de la fermeture de l'ancien client Blob Storage: {e}")
+
+def release_blob_service_client():
+    """Retirer le client du registre (verrou détenu) et fermer celui de ce processus ;
+    celui hérité d'un fork appartient au processus parent et n'est pas fermé"""
+    registry = _blob_client_registry
+    if registry['client'] and registry['pid'] == os.getpid():
+        close_blob_service_client(registry['client'], registry['transport'])
+    registry.update({'client': None, 'transport': None, 'pid': None, 'expires_at': None})
+
+def get_blob_service_client():
+    """Récupérer le client Blob Storage partagé du processus (créé à la demande)"""
+    registry = _blob_client_registry
+    client = registry['client']
+    if client and registry['pid'] == os.getpid() and time.time() < registry['expires_at']:
+        return client
+    
+    with _blob_client_lock:
+        client = registry['client']
+        if client and registry['pid'] == os.getpid() and time.time() < registry['expires_at']:
+            return client
+        
+        transport = create_storage_transport()
+        client = create_blob_service_client(transport=transport)
+        if not client:
+            transport.session.close()
+            return None
+        
+        expires_at = time.time() + AZURE_STORAGE_CLIENT_TTL
+        if AZURE_STORAGE_CONNECTION_STRING and AZURE_STORAGE_CONNECTION_STRING.startswith('https://'):
+            sas_expiry = get_sas_expiry(AZURE_STORAGE_CONNECTION_STRING.partition('?')[2])
+            if sas_expiry:
+                # Recréer le client une minute avant l'expiration du token SAS
+                sas_remaining = (sas_expiry - datetime.utcnow()).total_seconds() - 60
+                expires_at = min(expires_at, time.time() + max(sas_remaining, 0))
+        
+        # Client expiré remplacé : ses connexions ne doivent pas rester ouvertes
+        release_blob_service_client()
+        registry.update({'client': client, 'transport': transport, 'pid': os.getpid(), 'expires_at': expires_at})
+        print(f"♻️  Client Blob Storage partagé initialisé (pid {os.getpid()})")
+        return client
+
+def invalidate_blob_service_client():
+    """Invalider le client partagé (credential ou SAS expiré)"""
+    with _blob_client_lock:
+        release_blob_service_client()
+    print("♻️  Client Blob Storage partagé invalidé")
+
+# Cache de disponibilité du conteneur (vérifié une fois par processus)
+_container_lock = threading.Lock()
+_container_state = {'ready': False, 'pid': None}
+
+def ensure_container_exists(blob_service_client):
+    """Vérifier/créer le conteneur une seule fois par processus"""
+    if _container_state['ready'] and _container_state['pid'] == os.getpid():
+        return
+    
+    with _container_lock:
+        if _container_state['ready'] and _container_state['pid'] == os.getpid():
+            return
+        
+        container_client = blob_service_client.get_container_client(AZURE_STORAGE_CONTAINER_NAME)
+        try:
+            if not container_client.exists():
+                container_client.create_container()
+                print(f"📦 Conteneur créé: {AZURE_STORAGE_CONTAINER_NAME}")
+        except ResourceExistsError:
+            # Créé entre-temps par un autre processus
+            pass
+        except AzureError as e:
+            # Droits insuffisants (SAS limité au conteneur...) : on continue,
+            # un ContainerNotFound éventuel relancera la vérification
+            print(f"⚠️  Vérification du conteneur impossible: {e}")
+        
+        _container_state.update({'ready': True, 'pid': os.getpid()})
+
+def reset_container_state():
+    """Forcer une nouvelle vérification du conteneur (après ContainerNotFound)"""
+    with _container_lock:
+        _container_state.update({'ready': False, 'pid': None})
+
+def is_container_not_found(error):
+    """Indiquer si une erreur Azure correspond à un conteneur absent"""
+    # error_code n'est renseigné que pour les erreurs décodées d'une réponse du service
+    return isinstance(error, ResourceNotFoundError) and getattr(error, 'error_code', None) == StorageErrorCode.CONTAINER_NOT_FOUND
+
 # Configuration Flask
 app.config['SQLALCHEMY_DATABASE_URI'] = create_azure_sql_connection_string()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = create_engine_options()
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+# Déléguer l'envoi des fichiers en cache au serveur frontal (nginx, Apache) si disponible
+app.config['USE_X_SENDFILE'] = os.environ.get('FLASK_USE_X_SENDFILE', 'False').lower() == 'true'
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'dev-key-change-in-production')
 
-# Initialisation de la base de données
+# Initialisation de la base de données (pool configuré par create_engine_options)
 db = SQLAlchemy(app)
 
+@db.event.listens_for(InstrumentedQueuePool, 'connect')
+def set_query_timeout(dbapi_connection, connection_record):
+    """Appliquer le délai max des requêtes (attribut timeout de pyodbc) aux nouvelles connexions"""
+    if AZURE_SQL_QUERY_TIMEOUT:
+        dbapi_connection.timeout = AZURE_SQL_QUERY_TIMEOUT
+
+def get_pool_stats():
+    """État du pool de connexions du processus (connexions empruntées, inactives, débordement, attentes)"""
+    pool = db.engine.pool
+    stats = {'pool_class': type(pool).__name__, 'pid': os.getpid()}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'idle': pool.checkedin(),
+            'overflow': max(0, pool.overflow())
+        })
+    stats.update(pool_wait_stats.snapshot())
+    return stats
+
 # ========================================
 # FILTRES JINJA2 PERSONNALISÉS
 # ========================================
@@ -170,7 +555,12 @@ class Incident(db.Model):
     severite = db.Column(db.String(50), nullable=False, default='Moyenne')
     date_incident = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     date_creation = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    date_modification = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    date_modification = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    
+    # Index de la pagination par curseur (date_incident, id)
+    __table_args__ = (
+        db.Index('ix_incidents_date_incident_id', 'date_incident', 'id'),
+    )
     
     # Relation avec les documents
     documents = db.relationship('IncidentDocument', backref='incident', lazy=True, cascade='all, delete-orphan')
@@ -187,17 +577,24 @@ class Incident(db.Model):
             'date_incident': self.date_incident.isoformat() if self.date_incident else None,
             'date_creation': self.date_creation.isoformat() if self.date_creation else None,
             'date_modification': self.date_modification.isoformat() if self.date_modification else None,
-            'documents_count': len(self.documents)
+            'documents_count': self.get_documents_count()
         }
+    
+    def get_documents_count(self):
+        """Nombre de documents (pré-chargé par query_incidents_with_counts si possible)"""
+        documents_count = self.__dict__.get('documents_count')
+        if documents_count is None:
+            documents_count = len(self.documents)
+        return documents_count
 
 class IncidentDocument(db.Model):
     """Modèle pour les documents attachés aux incidents"""
     __tablename__ = 'incident_documents'
     
     id = db.Column(db.Integer, primary_key=True)
-    incident_id = db.Column(db.Integer, db.ForeignKey('incidents.id'), nullable=False)
+    incident_id = db.Column(db.Integer, db.ForeignKey('incidents.id'), nullable=False, index=True)
     filename = db.Column(db.String(255), nullable=False)  # Nom original du fichier
-    blob_name = db.Column(db.String(500), nullable=False)  # Nom unique dans le blob storage
+    blob_name = db.Column(db.String(500), nullable=False, index=True)  # Blob (partagé par les documents de même contenu)
     file_size = db.Column(db.Integer, nullable=False)  # Taille en bytes
     content_type = db.Column(db.String(100), nullable=False)  # Type MIME
     upload_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -217,228 +614,2986 @@ class IncidentDocument(db.Model):
             'uploaded_by': self.uploaded_by
         }
 
+class ReleasedBlob(db.Model):
+    """Blob devenu non référencé, en attente de suppression différée (une ligne par blob)"""
+    __tablename__ = 'released_blobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    blob_name = db.Column(db.String(500), nullable=False, index=True, unique=True)
+    released_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<ReleasedBlob {self.blob_name}>'
+
+class DirectUpload(db.Model):
+    """Upload direct autorisé : finalisé une seule fois, purgé une fois son jeton expiré"""
+    __tablename__ = 'direct_uploads'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    blob_name = db.Column(db.String(500), nullable=False, unique=True)
+    incident_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    finalized_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<DirectUpload {self.blob_name}>'
+
+class MaintenanceLease(db.Model):
+    """Bail d'une tâche périodique : un seul worker (toutes instances confondues) l'exécute à la fois"""
+    __tablename__ = 'maintenance_leases'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    holder = db.Column(db.String(200), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<MaintenanceLease {self.name} {self.holder}>'
+
 # ========================================
-# FONCTIONS UTILITAIRES AZURE STORAGE
+# REQUÊTES OPTIMISÉES
 # ========================================
 
-def allowed_file(filename):
-    """Vérifier si le fichier est autorisé"""
-    if '.' not in filename:
-        return False
+def query_incidents_with_counts(*columns):
+    """Requête des incidents (ou de certaines colonnes) avec leur nombre de documents (COUNT groupé, une seule requête)"""
+    counts = db.session.query(
+        IncidentDocument.incident_id.label('incident_id'),
+        func.count(IncidentDocument.id).label('documents_count')
+    ).group_by(IncidentDocument.incident_id).subquery()
     
-    extension = filename.rsplit('.', 1)[1].lower()
-    all_extensions = set()
-    for ext_group in ALLOWED_EXTENSIONS.values():
-        all_extensions.update(ext_group)
+    documents_count = func.coalesce(counts.c.documents_count, 0).label('documents_count')
+    return db.session.query(*(columns or (Incident,)), documents_count).outerjoin(
+        counts, counts.c.incident_id == Incident.id
+    )
+
+def attach_documents_count(rows):
+    """Reporter le nombre de documents sur chaque incident d'un résultat (Incident, count)"""
+    incidents = []
+    for incident, documents_count in rows:
+        incident.documents_count = documents_count
+        incidents.append(incident)
+    return incidents
+
+def encode_cursor(incident):
+    """Encoder le curseur de pagination (date_incident, id) d'un incident"""
+    raw = f"{incident.date_incident.isoformat()}|{incident.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Décoder un curseur de pagination (ValueError si invalide)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        date_value, incident_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(date_value), int(incident_id)
+    except Exception:
+        raise ValueError('Curseur de pagination invalide')
+
+def parse_date_arg(value, name):
+    """Lire un paramètre de date au format AAAA-MM-JJ (ValueError si invalide)"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'Paramètre {name} invalide (format attendu: AAAA-MM-JJ)')
+
+def parse_incident_filters(args):
+    """Extraire les filtres, le curseur et la taille de page des paramètres de requête"""
+    filters = {
+        'severite': args.get('severite', '').strip(),
+        'q': args.get('q', '').strip(),
+        'documents': args.get('documents', '').strip(),
+        'date_debut': args.get('date_debut', '').strip(),
+        'date_fin': args.get('date_fin', '').strip()
+    }
     
-    return extension in all_extensions
+    if filters['severite'] and filters['severite'] not in SEVERITES_VALIDES:
+        raise ValueError(f'Sévérité invalide. Valeurs acceptées: {", ".join(SEVERITES_VALIDES)}')
+    if filters['documents'] not in ('', 'with-docs', 'without-docs'):
+        raise ValueError('Paramètre documents invalide (with-docs ou without-docs)')
+    
+    try:
+        limit = int(args.get('limit', INCIDENTS_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('Paramètre limit invalide')
+    limit = max(1, min(limit, INCIDENTS_MAX_PAGE_SIZE))
+    
+    cursor = args.get('cursor', '').strip() or None
+    return filters, cursor, limit
 
-def get_file_category(filename):
-    """Déterminer la catégorie du fichier"""
-    if '.' not in filename:
-        return 'other'
+def filter_incidents(query, filters):
+    """Appliquer les filtres de la liste (sévérité, préfixe du titre, documents, dates) à une requête"""
+    if filters.get('severite'):
+        query = query.filter(Incident.severite == filters['severite'])
+    if filters.get('q'):
+        # Recherche par préfixe du titre (utilise l'index, contrairement à %texte%)
+        prefix = filters['q'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(Incident.titre.like(f"{prefix}%", escape='\\'))
+    if filters.get('documents') == 'with-docs':
+        query = query.filter(Incident.documents.any())
+    elif filters.get('documents') == 'without-docs':
+        query = query.filter(~Incident.documents.any())
+    if filters.get('date_debut'):
+        query = query.filter(Incident.date_incident >= parse_date_arg(filters['date_debut'], 'date_debut'))
+    if filters.get('date_fin'):
+        date_fin = parse_date_arg(filters['date_fin'], 'date_fin') + timedelta(days=1)
+        query = query.filter(Incident.date_incident < date_fin)
+    return query
+
+def query_incident_page(filters, cursor=None, limit=INCIDENTS_PAGE_SIZE):
+    """Récupérer une page d'incidents filtrés (pagination par curseur sur date_incident, id)"""
+    query = filter_incidents(query_incidents_with_counts(), filters)
     
-    extension = filename.rsplit('.', 1)[1].lower()
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Incident.date_incident < cursor_date,
+            and_(Incident.date_incident == cursor_date, Incident.id < cursor_id)
+        ))
     
-    for category, extensions in ALLOWED_EXTENSIONS.items():
-        if extension in extensions:
-            return category
+    # Une ligne de plus pour savoir s'il existe une page suivante
+    rows = query.order_by(Incident.date_incident.desc(), Incident.id.desc()).limit(limit + 1).all()
+    incidents = attach_documents_count(rows[:limit])
+    next_cursor = encode_cursor(incidents[-1]) if len(rows) > limit else None
     
-    return 'other'
+    return incidents, next_cursor
 
-def generate_blob_name(filename, incident_id):
-    """Générer un nom unique pour le blob"""
-    # Utiliser un UUID pour éviter les conflits
-    unique_id = str(uuid.uuid4())
-    safe_filename = secure_filename(filename)
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    
-    return f"incident_{incident_id}/{timestamp}_{unique_id}_{safe_filename}"
-
-def upload_file_to_blob(file, filename, incident_id):
-    """Uploader un fichier vers Azure Blob Storage"""
-    try:
-        # Mode mock pour tests
-        if AZURE_STORAGE_MODE == 'mock':
-            print(f"🧪 MODE MOCK: Simulation d'upload pour {filename}")
-            file.seek(0)
-            file_content = file.read()
-            blob_name = generate_blob_name(filename, incident_id)
-            print(f"✅ [MOCK] Fichier simulé: {blob_name} ({len(file_content)} bytes)")
-            return blob_name, len(file_content)
-        
-        # Créer le client Blob Storage
-        blob_service_client = create_blob_service_client()
-        if not blob_service_client:
-            raise Exception("Impossible de créer le client Blob Storage")
-        
-        # Générer un nom unique pour le blob
-        blob_name = generate_blob_name(filename, incident_id)
-        
-        # Créer le conteneur s'il n'existe pas
-        try:
-            container_client = blob_service_client.get_container_client(AZURE_STORAGE_CONTAINER_NAME)
-            container_client.create_container()
-        except Exception:
-            # Le conteneur existe déjà ou autre erreur (on continue)
-            pass
-        
-        # Uploader le fichier
-        blob_client = blob_service_client.get_blob_client(
-            container=AZURE_STORAGE_CONTAINER_NAME, 
-            blob=blob_name
-        )
-        
-        # Lire le contenu du fichier
-        file.seek(0)  # Retour au début du fichier
-        file_content = file.read()
-        
-        # Upload avec métadonnées
-        blob_client.upload_blob(
-            file_content, 
-            overwrite=True,
-            metadata={
-                'incident_id': str(incident_id),
-                'original_filename': filename,
-                'upload_date': datetime.utcnow().isoformat(),
-                'uploaded_by': 'flask_app'
-            }
-        )
-        
-        print(f"✅ Fichier uploadé: {blob_name}")
-        return blob_name, len(file_content)
-        
-    except AzureError as e:
-        print(f"❌ Erreur Azure lors de l'upload: {e}")
-        raise
-    except Exception as e:
-        print(f"❌ Erreur lors de l'upload: {e}")
-        raise
+def compute_incident_stats():
+    """Statistiques globales de la liste (agrégats SQL sur toute la table)"""
+    by_severity = dict(
+        db.session.query(Incident.severite, func.count(Incident.id)).group_by(Incident.severite).all()
+    )
+    return {
+        'total': sum(by_severity.values()),
+        'by_severity': by_severity,
+        'documents': db.session.query(func.count(IncidentDocument.id)).scalar() or 0
+    }
 
-def download_file_from_blob(blob_name):
-    """Télécharger un fichier depuis Azure Blob Storage"""
+# Dernières statistiques calculées par ce processus
+_incident_stats_lock = threading.Lock()
+_incident_stats_cache = {'stats': None, 'expires_at': 0}
+
+def get_incident_stats():
+    """Statistiques globales mises en cache INCIDENT_STATS_TTL secondes : le coût d'une page
+    dépend de sa taille et non de celle des tables"""
+    cache = _incident_stats_cache
+    stats = cache['stats']
+    if stats is not None and time.monotonic() < cache['expires_at']:
+        return stats
+    
+    # Une seule requête d'agrégats à la fois ; les autres pages affichent les valeurs précédentes
+    if not _incident_stats_lock.acquire(blocking=stats is None):
+        return stats
     try:
-        # Mode mock pour tests
-        if AZURE_STORAGE_MODE == 'mock':
-            print(f"🧪 MODE MOCK: Simulation de téléchargement pour {blob_name}")
-            # Créer un fichier fictif pour le téléchargement
-            mock_content = f"Contenu simulé du fichier {blob_name}\nGénéré en mode mock."
-            return io.BytesIO(mock_content.encode('utf-8'))
-        
-        blob_service_client = create_blob_service_client()
-        if not blob_service_client:
-            raise Exception("Impossible de créer le client Blob Storage")
-        
-        blob_client = blob_service_client.get_blob_client(
-            container=AZURE_STORAGE_CONTAINER_NAME, 
-            blob=blob_name
+        if cache['stats'] is not None and time.monotonic() < cache['expires_at']:
+            return cache['stats']
+        stats = compute_incident_stats()
+        cache.update(stats=stats, expires_at=time.monotonic() + INCIDENT_STATS_TTL)
+        return stats
+    finally:
+        _incident_stats_lock.release()
+
+def invalidate_incident_stats():
+    """Recalculer les statistiques à la prochaine page (écriture faite par ce processus)"""
+    _incident_stats_cache['expires_at'] = 0
+
+@db.event.listens_for(Incident, 'after_insert')
+@db.event.listens_for(Incident, 'after_delete')
+@db.event.listens_for(IncidentDocument, 'after_insert')
+@db.event.listens_for(IncidentDocument, 'after_delete')
+def invalidate_incident_stats_on_write(mapper, connection, target):
+    invalidate_incident_stats()
+
+def make_etag(*parts):
+    """Construire un ETag fort à partir de valeurs de validation"""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+def not_modified_response(etag):
+    """Réponse 304 si le client possède déjà cette version (If-None-Match), sinon None"""
+    # Comparaison faible (RFC 9110) : l'ETag d'une réponse compressée est renvoyé en W/"..."
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return None
+
+def with_etag(response, etag):
+    """Ajouter l'ETag et imposer la revalidation à chaque utilisation"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def get_incidents_etag():
+    """ETag de la collection : MAX(date_modification) et nombre de lignes (une requête)"""
+    incidents_state = db.session.query(
+        func.max(Incident.date_modification), func.count(Incident.id)
+    ).subquery()
+    documents_state = db.session.query(
+        func.count(IncidentDocument.id), func.max(IncidentDocument.id)
+    ).subquery()
+    # Deux agrégats d'une ligne chacun, combinés en une seule requête
+    state = db.session.execute(
+        select(incidents_state, documents_state).select_from(
+            incidents_state.join(documents_state, text('1 = 1'))
         )
-        
-        # Télécharger le blob
-        download_stream = blob_client.download_blob()
-        file_content = download_stream.readall()
-        
-        return io.BytesIO(file_content)
-        
-    except AzureError as e:
-        print(f"❌ Erreur Azure lors du téléchargement: {e}")
-        raise
-    except Exception as e:
-        print(f"❌ Erreur lors du téléchargement: {e}")
-        raise
+    ).one()
+    # Les paramètres (filtres, curseur, limite) font partie de la représentation
+    return make_etag('incidents', request.query_string.decode('utf-8'), *state)
 
-def delete_file_from_blob(blob_name):
-    """Supprimer un fichier d'Azure Blob Storage"""
-    try:
-        # Mode mock pour tests
-        if AZURE_STORAGE_MODE == 'mock':
-            print(f"🧪 MODE MOCK: Simulation de suppression pour {blob_name}")
-            print(f"✅ [MOCK] Fichier supprimé: {blob_name}")
-            return
-        
-        blob_service_client = create_blob_service_client()
-        if not blob_service_client:
-            raise Exception("Impossible de créer le client Blob Storage")
-        
-        blob_client = blob_service_client.get_blob_client(
-            container=AZURE_STORAGE_CONTAINER_NAME, 
-            blob=blob_name
+def get_incident_etag(incident_id):
+    """ETag d'un incident : date_modification et ensemble de ses documents (une requête)"""
+    state = db.session.query(
+        Incident.date_modification,
+        func.count(IncidentDocument.id),
+        func.sum(IncidentDocument.id),
+        func.max(IncidentDocument.id)
+    ).outerjoin(IncidentDocument, IncidentDocument.incident_id == Incident.id).filter(
+        Incident.id == incident_id
+    ).group_by(Incident.id, Incident.date_modification).first()
+    
+    if state is None:
+        return None
+    return make_etag('incident', incident_id, *state)
+
+# ========================================
+# EXPORT EN STREAMING
+# ========================================
+
+EXPORT_INCIDENT_COLUMNS = [
+    Incident.id, Incident.titre, Incident.description, Incident.severite,
+    Incident.date_incident, Incident.date_creation, Incident.date_modification
+]
+EXPORT_DOCUMENT_COLUMNS = [
+    IncidentDocument.id, IncidentDocument.filename, IncidentDocument.file_size,
+    IncidentDocument.content_type, IncidentDocument.upload_date, IncidentDocument.uploaded_by
+]
+EXPORT_INCIDENT_FIELDS = [column.key for column in EXPORT_INCIDENT_COLUMNS]
+EXPORT_DOCUMENT_FIELDS = [column.key for column in EXPORT_DOCUMENT_COLUMNS]
+
+def export_value(value):
+    """Valeur sérialisable (dates ISO 8601, comme to_dict)"""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def query_incident_export(filters, with_documents):
+    """Lignes de l'export lues par lots (yield_per : curseur serveur, sans objets ORM)"""
+    if with_documents:
+        # Une ligne par document (LEFT JOIN), regroupées ensuite par incident grâce au tri
+        query = db.session.query(*EXPORT_INCIDENT_COLUMNS, *EXPORT_DOCUMENT_COLUMNS).outerjoin(
+            IncidentDocument, IncidentDocument.incident_id == Incident.id
         )
+        order = (Incident.date_incident.desc(), Incident.id.desc(), IncidentDocument.id)
+    else:
+        query = query_incidents_with_counts(*EXPORT_INCIDENT_COLUMNS)
+        order = (Incident.date_incident.desc(), Incident.id.desc())
+    
+    return filter_incidents(query, filters).order_by(*order).yield_per(EXPORT_BATCH_SIZE)
+
+def iter_export_records(rows, with_documents):
+    """Incidents exportés, un dict par incident (documents regroupés si demandés)"""
+    incident_width = len(EXPORT_INCIDENT_FIELDS)
+    current = None
+    
+    for row in rows:
+        if not with_documents:
+            record = dict(zip(EXPORT_INCIDENT_FIELDS, map(export_value, row)))
+            record['documents_count'] = row[incident_width]
+            yield record
+            continue
         
-        blob_client.delete_blob()
-        print(f"✅ Fichier supprimé: {blob_name}")
+        if current is None or current['id'] != row[0]:
+            if current is not None:
+                current['documents_count'] = len(current['documents'])
+                yield current
+            current = dict(zip(EXPORT_INCIDENT_FIELDS, map(export_value, row[:incident_width])))
+            current['documents'] = []
+        if row[incident_width] is not None:
+            current['documents'].append(dict(zip(EXPORT_DOCUMENT_FIELDS, map(export_value, row[incident_width:]))))
+    
+    if current is not None:
+        current['documents_count'] = len(current['documents'])
+        yield current
+
+def generate_incident_export(records, export_format, with_documents, delimiter=','):
+    """Corps de l'export en blocs d'environ EXPORT_CHUNK_SIZE octets (premier incident envoyé sans attendre)"""
+    buffer = io.StringIO()
+    
+    if export_format == 'csv':
+        writer = csv.writer(buffer, delimiter=delimiter, lineterminator='\n')
+        header = EXPORT_INCIDENT_FIELDS + ['documents_count']
+        if with_documents:
+            header += [f'document_{field}' for field in EXPORT_DOCUMENT_FIELDS]
+        writer.writerow(header)
+        blank_document = [''] * len(EXPORT_DOCUMENT_FIELDS)
+    
+    count = 0
+    started = time.perf_counter()
+    try:
+        for record in records:
+            if export_format == 'csv':
+                values = [record[field] for field in EXPORT_INCIDENT_FIELDS] + [record['documents_count']]
+                if with_documents:
+                    # Une ligne CSV par document (au moins une par incident)
+                    for document in record['documents'] or [None]:
+                        writer.writerow(values + ([document[field] for field in EXPORT_DOCUMENT_FIELDS]
+                                                  if document else blank_document))
+                else:
+                    writer.writerow(values)
+            else:
+                buffer.write(json.dumps(record, ensure_ascii=False))
+                buffer.write('\n')
+            
+            count += 1
+            if count == 1 or buffer.tell() >= EXPORT_CHUNK_SIZE:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
         
-    except AzureError as e:
-        print(f"❌ Erreur Azure lors de la suppression: {e}")
-        raise
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+        print(f"📤 Export {export_format}: {count} incident(s) en {time.perf_counter() - started:.1f} s")
     except Exception as e:
-        print(f"❌ Erreur lors de la suppression: {e}")
+        # Les en-têtes sont déjà partis : interrompre le flux pour que le client détecte l'export incomplet
+        print(f"❌ Export {export_format} interrompu après {count} incident(s): {e}")
         raise
 
 # ========================================
-# ROUTES FLASK
+# RECHERCHE PLEIN TEXTE
 # ========================================
 
-@app.route('/')
-def index():
-    """Page d'accueil avec la liste des incidents"""
-    try:
-        # Récupérer tous les incidents avec le nombre de documents
-        incidents = db.session.query(Incident).order_by(Incident.date_incident.desc()).all()
-        
-        # Ajouter le nombre de documents à chaque incident
-        for incident in incidents:
-            incident.documents_count = len(incident.documents)
+SEARCH_STOP_WORDS = {
+    'a', 'au', 'aux', 'avec', 'ce', 'ces', 'dans', 'de', 'des', 'du', 'en', 'et', 'est',
+    'il', 'la', 'le', 'les', 'l', 'd', 'ou', 'par', 'pas', 'pour', 'sur', 'un', 'une'
+}
+SEARCH_TOKEN_PATTERN = re.compile(r'\w+')
+
+def fold_text(value):
+    """Normaliser un texte pour la recherche (minuscules, sans accents : Élevée -> elevee)"""
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+def tokenize(value):
+    """Découper un texte normalisé en termes indexables"""
+    return [t for t in SEARCH_TOKEN_PATTERN.findall(fold_text(value)) if t not in SEARCH_STOP_WORDS]
+
+class IncidentSearchIndex:
+    """Index inversé BM25 des titres et descriptions d'incidents (un par processus)"""
+    
+    TITLE_WEIGHT = 3  # Un terme du titre compte comme 3 termes de la description
+    MAX_PREFIX_EXPANSIONS = 20  # Complétions retenues pour le terme en cours de saisie
+    K1 = 1.2
+    B = 0.75
+    
+    SYNC_BATCH_SIZE = 1000  # Incidents appliqués par prise du verrou (les recherches s'intercalent)
+    
+    def __init__(self):
+        self.lock = threading.RLock()  # Structures de l'index (tenu brièvement)
+        self.sync_lock = threading.Lock()  # Une seule synchronisation à la fois
+        self.start_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pid = None
+        self.postings = {}      # terme -> {incident_id: fréquence pondérée}
+        self.doc_terms = {}     # incident_id -> termes indexés (pour la mise à jour)
+        self.doc_lengths = {}   # incident_id -> longueur pondérée
+        self.doc_versions = {}  # incident_id -> date_modification indexée (lignes relues ignorées)
+        self.total_length = 0
+        self.vocabulary = []    # termes triés (recherche par préfixe)
+        self.vocabulary_dirty = False
+        self.watermark = None   # plus grande date_modification indexée
+        self.last_sync = 0
+        self.last_rebuild = 0
+        self.built = False
+    
+    def index_incident(self, incident_id, titre, description):
+        """Indexer (ou réindexer) un incident"""
+        frequencies = {}
+        for term in tokenize(titre):
+            frequencies[term] = frequencies.get(term, 0) + self.TITLE_WEIGHT
+        for term in tokenize(description):
+            frequencies[term] = frequencies.get(term, 0) + 1
         
-        return render_template('incidents.html', incidents=incidents)
+        with self.lock:
+            self.remove_incident(incident_id)
+            for term, frequency in frequencies.items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = {}
+                    self.vocabulary_dirty = True
+                posting[incident_id] = frequency
+            
+            length = sum(frequencies.values())
+            self.doc_terms[incident_id] = tuple(frequencies)
+            self.doc_lengths[incident_id] = length
+            self.total_length += length
+    
+    def remove_incident(self, incident_id):
+        """Retirer un incident de l'index"""
+        with self.lock:
+            for term in self.doc_terms.pop(incident_id, ()):
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(incident_id, None)
+                    if not posting:
+                        del self.postings[term]
+                        self.vocabulary_dirty = True
+            self.total_length -= self.doc_lengths.pop(incident_id, 0)
+            self.doc_versions.pop(incident_id, None)
+    
+    def ensure_started(self):
+        """Démarrer le thread d'indexation dans ce processus (après un fork, il faut le relancer)"""
+        if self.pid == os.getpid():
+            return
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            threading.Thread(target=self.run_forever, name='search-indexer', daemon=True).start()
+    
+    def run_forever(self):
+        """Construire l'index puis l'actualiser toutes les SEARCH_SYNC_INTERVAL secondes (ou sur écriture locale)"""
+        while True:
+            # Remis à zéro avant la synchronisation : un commit pendant celle-ci en relance une autre
+            self.wakeup.clear()
+            try:
+                with app.app_context():
+                    self.sync()
+            except Exception as e:
+                print(f"❌ Erreur de synchronisation de l'index de recherche: {e}")
+            self.wakeup.wait(SEARCH_SYNC_INTERVAL)
+    
+    def incident_rows(self, since=None):
+        query = db.session.query(Incident.id, Incident.titre, Incident.description, Incident.date_modification)
+        if since:
+            query = query.filter(Incident.date_modification >= since)
+        return query.yield_per(5000)
+    
+    def apply(self, rows):
+        """Indexer un lot de lignes et avancer le marqueur de synchronisation"""
+        with self.lock:
+            for incident_id, titre, description, date_modification in rows:
+                # Ligne de la fenêtre de chevauchement déjà indexée dans cette version
+                if date_modification is None or self.doc_versions.get(incident_id) != date_modification:
+                    self.index_incident(incident_id, titre, description)
+                    self.doc_versions[incident_id] = date_modification
+                if date_modification and (self.watermark is None or date_modification > self.watermark):
+                    self.watermark = date_modification
+    
+    def sync(self):
+        """Construire l'index (première fois) ou l'actualiser avec les incidents modifiés depuis le dernier passage.
         
-    except Exception as e:
-        print(f"❌ Erreur lors de la récupération des incidents: {e}")
-        # Mode dégradé avec des données de démonstration
-        incidents_demo = [
-            {'id': 1, 'titre': 'Connexion Azure en cours...', 'severite': 'Info', 
-             'date_incident': datetime.now(), 'documents_count': 0}
-        ]
-        return render_template('incidents.html', incidents=incidents_demo)
-
-@app.route('/incident/<int:id>')
-def detail_incident(id):
-    """Page de détail d'un incident avec ses documents"""
-    try:
-        incident = Incident.query.get_or_404(id)
-        documents = IncidentDocument.query.filter_by(incident_id=id).order_by(IncidentDocument.upload_date.desc()).all()
+        Les lignes sont lues hors du verrou de l'index : la construction complète se fait dans un
+        index séparé substitué à la fin, l'actualisation par lots de SYNC_BATCH_SIZE incidents.
+        L'actualisation relit SEARCH_SYNC_OVERLAP secondes avant le marqueur, car les commits ne
+        respectent pas l'ordre des date_modification ; l'index est reconstruit toutes les
+        SEARCH_REBUILD_INTERVAL secondes pour les écarts plus grands et les suppressions d'autres workers.
+        """
+        with self.sync_lock:
+            rebuild_due = SEARCH_REBUILD_INTERVAL > 0 and time.time() - self.last_rebuild >= SEARCH_REBUILD_INTERVAL
+            if not self.built or rebuild_due:
+                self.rebuild()
+            else:
+                since = self.watermark - timedelta(seconds=SEARCH_SYNC_OVERLAP) if self.watermark else None
+                batch = []
+                for row in self.incident_rows(since):
+                    batch.append(row)
+                    if len(batch) >= self.SYNC_BATCH_SIZE:
+                        self.apply(batch)
+                        batch = []
+                self.apply(batch)
+            self.last_sync = time.time()
+    
+    def rebuild(self):
+        """Construire un nouvel index sans bloquer les recherches, puis le substituer à l'index courant"""
+        fresh = IncidentSearchIndex()
+        fresh.apply(self.incident_rows())
+        with self.lock:
+            self.postings = fresh.postings
+            self.doc_terms = fresh.doc_terms
+            self.doc_lengths = fresh.doc_lengths
+            self.doc_versions = fresh.doc_versions
+            self.total_length = fresh.total_length
+            self.vocabulary = []
+            self.vocabulary_dirty = True
+            self.watermark = fresh.watermark
+            self.built = True
+        self.last_rebuild = time.time()
+        print(f"🔎 Index de recherche construit: {len(self.doc_lengths)} incident(s), {len(self.postings)} terme(s)")
+    
+    def invalidate(self):
+        """Demander une synchronisation immédiate au thread d'indexation (écriture locale)"""
+        self.wakeup.set()
+    
+    def expand_term(self, term, prefix):
+        """Termes de l'index correspondant à un terme de la requête (préfixe pour le dernier)"""
+        if not prefix:
+            return [term] if term in self.postings else []
         
-        return render_template('detail.html', incident=incident, documents=documents)
+        if self.vocabulary_dirty:
+            self.vocabulary = sorted(self.postings)
+            self.vocabulary_dirty = False
+        start = bisect.bisect_left(self.vocabulary, term)
+        end = bisect.bisect_left(self.vocabulary, term + '\uffff')
+        # Privilégier les complétions les plus courtes (dont le terme exact)
+        return sorted(self.vocabulary[start:end], key=len)[:self.MAX_PREFIX_EXPANSIONS]
+    
+    def search(self, query, limit=SEARCH_MAX_RESULTS):
+        """Rechercher des incidents : tous les termes doivent correspondre, résultats classés BM25"""
+        terms = tokenize(query)
+        if not terms:
+            return []
         
-    except Exception as e:
-        print(f"❌ Erreur lors de la récupération de l'incident {id}: {e}")
-        flash(f'Erreur lors de la récupération de l\'incident: {e}', 'error')
-        return redirect(url_for('index'))
+        with self.lock:
+            doc_count = len(self.doc_lengths)
+            if not doc_count:
+                return []
+            average_length = self.total_length / doc_count
+            
+            scores = None
+            for position, term in enumerate(terms):
+                # Le dernier terme est traité comme un préfixe (recherche en cours de saisie)
+                expansions = self.expand_term(term, prefix=position == len(terms) - 1)
+                term_scores = {}
+                for expansion in expansions:
+                    posting = self.postings[expansion]
+                    idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                    for incident_id, frequency in posting.items():
+                        norm = self.K1 * (1 - self.B + self.B * self.doc_lengths[incident_id] / average_length)
+                        score = idf * frequency * (self.K1 + 1) / (frequency + norm)
+                        if score > term_scores.get(incident_id, 0):
+                            term_scores[incident_id] = score
+                
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {i: scores[i] + term_scores[i] for i in scores.keys() & term_scores.keys()}
+                if not scores:
+                    return []
+            
+            return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
 
-@app.route('/ajouter')
-def ajouter_incident_form():
-    """Formulaire d'ajout d'incident avec upload de documents"""
-    return render_template('ajouter.html', 
-                         max_file_size_mb=MAX_FILE_SIZE // (1024*1024),
-                         allowed_extensions=ALLOWED_EXTENSIONS)
+search_index = IncidentSearchIndex()
 
-@app.route('/ajouter-incident', methods=['POST'])
-def ajouter_incident():
-    """Traitement de l'ajout d'incident avec documents"""
-    try:
-        titre = request.form.get('titre', '').strip()
-        description = request.form.get('description', '').strip()
-        severite = request.form.get('severite', 'Moyenne')
-        
+@db.event.listens_for(Incident, 'after_insert')
+@db.event.listens_for(Incident, 'after_update')
+def mark_search_index_stale(mapper, connection, target):
+    """Noter l'écriture : le thread d'indexation n'est réveillé qu'une fois la ligne validée"""
+    session = object_session(target)
+    if session is not None:
+        session.info['search_index_stale'] = True
+
+@db.event.listens_for(Session, 'after_commit')
+def invalidate_search_index(session):
+    """Resynchroniser l'index de ce processus sans attendre l'intervalle"""
+    if session.info.pop('search_index_stale', False):
+        search_index.invalidate()
+
+@db.event.listens_for(Session, 'after_rollback')
+def discard_search_index_mark(session):
+    session.info.pop('search_index_stale', None)
+
+@app.before_request
+def start_search_indexer():
+    """Construire l'index en arrière-plan dès la première requête du worker, pas dans une recherche"""
+    search_index.ensure_started()
+
+# ========================================
+# IMPORT EN MASSE
+# ========================================
+
+BULK_IMPORT_FORMATS = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson'
+}
+
+def bulk_text_field(row, name):
+    """Valeur texte d'un champ importé (vide si absent, ValueError si ce n'est pas du texte)"""
+    value = row.get(name)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ValueError(f'Champ {name}: texte attendu')
+    return value.strip()
+
+def validate_bulk_row(row):
+    """Valider une ligne importée avec les règles du formulaire (ValueError si invalide)"""
+    if not isinstance(row, dict):
+        raise ValueError('Objet JSON attendu')
+    
+    titre = bulk_text_field(row, 'titre')
+    if not titre:
+        raise ValueError('Le titre de l\'incident est obligatoire')
+    if len(titre) > Incident.titre.type.length:
+        raise ValueError(f'Titre trop long ({len(titre)} caractères, maximum {Incident.titre.type.length})')
+    
+    severite = bulk_text_field(row, 'severite') or 'Moyenne'
+    if severite not in SEVERITES_VALIDES:
+        raise ValueError(f'Sévérité invalide: {severite}. Valeurs acceptées: {", ".join(SEVERITES_VALIDES)}')
+    
+    date_incident = bulk_text_field(row, 'date_incident')
+    if date_incident:
+        try:
+            date_incident = datetime.fromisoformat(date_incident)
+        except ValueError:
+            raise ValueError(f'Date invalide: {date_incident} (format ISO 8601 attendu)')
+        if date_incident.tzinfo is not None:
+            date_incident = date_incident.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    return {
+        'titre': titre,
+        'description': bulk_text_field(row, 'description') or None,
+        'severite': severite,
+        'date_incident': date_incident or None
+    }
+
+def iter_bulk_rows(stream, import_format, delimiter=','):
+    """Décoder un flux CSV ou NDJSON au fil de l'eau : (numéro de ligne, ligne, erreur de lecture)"""
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    
+    if import_format == 'csv':
+        reader = csv.DictReader(text_stream, delimiter=delimiter)
+        if reader.fieldnames is None or 'titre' not in reader.fieldnames:
+            raise ValueError("En-tête CSV manquant ou sans colonne 'titre'")
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    
+    for line_number, line in enumerate(text_stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line), None
+        except ValueError as e:
+            yield line_number, None, f'JSON invalide: {e}'
+
+class BulkIncidentImport:
+    """Import d'incidents par lots : validation ligne à ligne, un executemany et un commit par lot"""
+    
+    def __init__(self, batch_size, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.batch = []
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+        self.started = time.perf_counter()
+    
+    def reject(self, line_number, message):
+        self.rejected += 1
+        if len(self.errors) < BULK_IMPORT_MAX_ERRORS:
+            self.errors.append({'line': line_number, 'error': message})
+    
+    def add(self, line_number, row):
+        try:
+            self.batch.append(validate_bulk_row(row))
+        except ValueError as e:
+            self.reject(line_number, str(e))
+            return
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Insérer le lot courant (fast_executemany avec pyodbc) et le valider"""
+        if not self.batch:
+            return
+        
+        if not self.dry_run:
+            now = datetime.utcnow()
+            local_now = datetime.now()
+            for values in self.batch:
+                values['date_incident'] = values['date_incident'] or local_now
+                values['date_creation'] = values['date_modification'] = now
+            try:
+                # INSERT Core sans RETURNING : un seul executemany, sans hydratation d'objets ORM
+                db.session.execute(Incident.__table__.insert(), self.batch)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        
+        self.imported += len(self.batch)
+        self.batch = []
+    
+    def result(self):
+        elapsed = time.perf_counter() - self.started
+        total = self.imported + self.rejected
+        return {
+            'status': 'success' if not self.rejected else ('partial' if self.imported else 'error'),
+            'dry_run': self.dry_run,
+            'imported': self.imported,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'errors_truncated': self.rejected > len(self.errors),
+            'duration_ms': round(elapsed * 1000, 1),
+            'rows_per_second': round(total / elapsed) if elapsed else None
+        }
+
+# ========================================
+# BACKENDS DE STOCKAGE
+# ========================================
+
+def utc_datetime(timestamp):
+    """Datetime UTC naïf (convention de l'application) d'un horodatage POSIX, à la microseconde près"""
+    return datetime.utcfromtimestamp(timestamp)
+
+class StorageBackend:
+    """Interface commune des backends de stockage des documents"""
+    name = None
+    
+    def upload(self, blob_name, stream, metadata):
+        """Enregistrer le contenu du flux sous blob_name et renvoyer sa taille"""
+        raise NotImplementedError
+    
+    def download(self, blob_name, offset=None, length=None):
+        """Ouvrir un blob (ou une plage d'octets) et renvoyer un itérateur de blocs"""
+        raise NotImplementedError
+    
+    def delete(self, blob_name, if_unmodified_since=None):
+        """Supprimer un blob (ResourceNotFoundError s'il n'existe pas, ResourceModifiedError
+        s'il a été écrit après if_unmodified_since)"""
+        raise NotImplementedError
+    
+    def check(self, timeout):
+        """Vérifier que le stockage est accessible"""
+        raise NotImplementedError
+    
+    def create_upload_url(self, blob_name, expires_at):
+        """URL signée permettant au client de créer blob_name directement jusqu'à expires_at"""
+        raise NotImplementedError(f"Upload direct non disponible avec le backend {self.name}")
+    
+    def properties(self, blob_name):
+        """Taille et type MIME d'un blob (ResourceNotFoundError s'il n'existe pas)"""
+        raise NotImplementedError
+    
+    def set_metadata(self, blob_name, metadata):
+        """Remplacer les métadonnées d'un blob"""
+        raise NotImplementedError
+    
+    def describe(self):
+        """Paramètres du backend pour les routes de diagnostic"""
+        return {}
+
+class AzureBlobStorageBackend(StorageBackend):
+    """Azure Blob Storage via le client partagé du processus"""
+    name = 'azure'
+    
+    def __init__(self):
+        # Clé de délégation utilisateur (SAS sans clé de compte), réutilisée jusqu'à son expiration
+        self.delegation_lock = threading.Lock()
+        self.delegation_key = None
+        self.delegation_expires_at = None
+    
+    def get_service_client(self):
+        blob_service_client = get_blob_service_client()
+        if not blob_service_client:
+            raise Exception("Impossible de créer le client Blob Storage")
+        return blob_service_client
+    
+    def get_blob_client(self, blob_name):
+        return self.get_service_client().get_blob_client(
+            container=AZURE_STORAGE_CONTAINER_NAME,
+            blob=blob_name
+        )
+    
+    def upload(self, blob_name, stream, metadata):
+        blob_service_client = self.get_service_client()
+        
+        # Créer le conteneur s'il n'existe pas (vérification mise en cache)
+        ensure_container_exists(blob_service_client)
+        
+        blob_client = blob_service_client.get_blob_client(
+            container=AZURE_STORAGE_CONTAINER_NAME,
+            blob=blob_name
+        )
+        
+        def send():
+            stream.seek(0)  # Retour au début du fichier
+            
+            if AZURE_STORAGE_UPLOAD_MODE == 'streaming':
+                # Upload par blocs depuis le flux entrant, sans copie complète en mémoire
+                return upload_stream_in_blocks(blob_client, stream, metadata)
+            
+            # Lire le contenu du fichier et l'uploader avec métadonnées
+            file_content = stream.read()
+            blob_client.upload_blob(file_content, overwrite=True, metadata=metadata)
+            return len(file_content)
+        
+        try:
+            return send()
+        except ResourceNotFoundError as e:
+            if not is_container_not_found(e):
+                raise
+            # Conteneur supprimé depuis la dernière vérification : le recréer puis réessayer
+            reset_container_state()
+            ensure_container_exists(blob_service_client)
+            return send()
+    
+    def download(self, blob_name, offset=None, length=None):
+        # Le premier GET est fait ici pour que les erreurs (blob absent, etc.)
+        # remontent avant l'envoi des en-têtes de la réponse
+        download_stream = self.get_blob_client(blob_name).download_blob(offset=offset, length=length)
+        
+        # Blocs bornés par max_single_get_size / max_chunk_get_size du client
+        return download_stream.chunks()
+    
+    def delete(self, blob_name, if_unmodified_since=None):
+        # Condition évaluée par le service : un PUT concurrent fait échouer la suppression (412)
+        self.get_blob_client(blob_name).delete_blob(if_unmodified_since=if_unmodified_since)
+    
+    def check(self, timeout):
+        container_client = self.get_service_client().get_container_client(AZURE_STORAGE_CONTAINER_NAME)
+        container_client.get_container_properties(timeout=int(math.ceil(timeout)))
+    
+    def get_user_delegation_key(self, blob_service_client, expires_at):
+        """Clé de délégation valable au moins jusqu'à expires_at (une requête par jour au plus)"""
+        with self.delegation_lock:
+            if self.delegation_key is None or self.delegation_expires_at < expires_at:
+                start = datetime.utcnow() - DIRECT_UPLOAD_CLOCK_SKEW
+                key_expiry = max(expires_at, datetime.utcnow() + DIRECT_UPLOAD_DELEGATION_KEY_TTL)
+                self.delegation_key = blob_service_client.get_user_delegation_key(start, key_expiry)
+                self.delegation_expires_at = key_expiry
+                print(f"🎫 Clé de délégation utilisateur obtenue (expire {key_expiry.isoformat()})")
+            return self.delegation_key
+    
+    def create_upload_url(self, blob_name, expires_at):
+        blob_service_client = self.get_service_client()
+        
+        # Le PUT du client échouerait sur un conteneur absent
+        ensure_container_exists(blob_service_client)
+        
+        credential = blob_service_client.credential
+        if getattr(credential, 'account_key', None):
+            # Connection string (Azurite compris) ou clé de compte
+            signing = {'account_key': credential.account_key}
+        elif hasattr(credential, 'get_token'):
+            # Identité Azure AD (Managed Identity, Azure CLI...) : SAS de délégation utilisateur
+            signing = {'user_delegation_key': self.get_user_delegation_key(blob_service_client, expires_at)}
+        else:
+            raise NotImplementedError("Upload direct impossible avec une connexion par URL SAS "
+                                      "(clé de compte ou identité Azure AD requise)")
+        
+        # Permission « create » seule : pas de lecture, et le blob ne peut plus être écrasé une fois créé
+        sas_token = generate_blob_sas(
+            account_name=blob_service_client.account_name,
+            container_name=AZURE_STORAGE_CONTAINER_NAME,
+            blob_name=blob_name,
+            permission=BlobSasPermissions(create=True),
+            start=datetime.utcnow() - DIRECT_UPLOAD_CLOCK_SKEW,
+            expiry=expires_at,
+            **signing
+        )
+        blob_client = blob_service_client.get_blob_client(
+            container=AZURE_STORAGE_CONTAINER_NAME,
+            blob=blob_name
+        )
+        return f"{blob_client.url}?{sas_token}"
+    
+    def properties(self, blob_name):
+        properties = self.get_blob_client(blob_name).get_blob_properties()
+        return {'size': properties.size, 'content_type': properties.content_settings.content_type}
+    
+    def set_metadata(self, blob_name, metadata):
+        self.get_blob_client(blob_name).set_blob_metadata(metadata)
+    
+    def describe(self):
+        return {'account': AZURE_STORAGE_ACCOUNT_NAME, 'container': AZURE_STORAGE_CONTAINER_NAME}
+
+class SimulatedStorageError(AzureError):
+    """Erreur injectée par un backend local (STORAGE_SIMULATED_ERROR_RATE)"""
+
+class SimulatedStorageBackend(StorageBackend):
+    """Base des backends locaux : latence, débit et taux d'erreur configurables"""
+    
+    def __init__(self, latency_ms=0, jitter_ms=0, bandwidth=0, error_rate=0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+    
+    def simulate_request(self, operation):
+        """Appliquer la latence d'une requête puis, selon le taux configuré, échouer"""
+        with self.random_lock:
+            delay = self.latency_ms
+            if self.jitter_ms > 0:
+                delay += self.random.expovariate(1 / self.jitter_ms)
+            failed = self.random.random() < self.error_rate
+        
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if failed:
+            raise SimulatedStorageError(f"Erreur simulée ({operation})")
+    
+    def simulate_transfer(self, size):
+        """Attendre la durée de transfert de size octets au débit configuré"""
+        if self.bandwidth > 0:
+            time.sleep(size / self.bandwidth)
+    
+    def read_blocks(self, stream):
+        """Lire un flux entrant par blocs au débit configuré"""
+        stream.seek(0)
+        while True:
+            data = stream.read(AZURE_STORAGE_MAX_BLOCK_SIZE)
+            if not data:
+                break
+            self.simulate_transfer(len(data))
+            yield data
+    
+    def throttle(self, chunks):
+        """Restituer les blocs d'un téléchargement au débit configuré"""
+        for chunk in chunks:
+            self.simulate_transfer(len(chunk))
+            yield chunk
+    
+    def guess_content_type(self, blob_name):
+        """Type MIME d'un blob local : aucun Content-Type n'est enregistré, il est déduit de l'extension"""
+        return mimetypes.guess_type(blob_name)[0] or 'application/octet-stream'
+    
+    def describe(self):
+        return {
+            'latency_ms': self.latency_ms,
+            'jitter_ms': self.jitter_ms,
+            'bandwidth': self.bandwidth,
+            'error_rate': self.error_rate
+        }
+
+class LocalFileStorageBackend(SimulatedStorageBackend):
+    """Documents stockés sur le système de fichiers local (un fichier par blob)"""
+    name = 'local'
+    METADATA_SUFFIX = '.metadata.json'
+    
+    def __init__(self, root, **simulation):
+        super().__init__(**simulation)
+        self.root = os.path.abspath(os.path.join(root, AZURE_STORAGE_CONTAINER_NAME))
+    
+    def get_path(self, blob_name):
+        path = os.path.abspath(os.path.join(self.root, blob_name))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Nom de blob invalide: {blob_name}")
+        return path
+    
+    def upload(self, blob_name, stream, metadata):
+        self.simulate_request('upload')
+        path = self.get_path(blob_name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        
+        # Écriture dans un fichier temporaire puis renommage : un lecteur ne voit jamais de fichier partiel
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for data in self.read_blocks(stream):
+                    f.write(data)
+                    size += len(data)
+            with open(path + self.METADATA_SUFFIX, 'w', encoding='utf-8') as f:
+                json.dump(metadata, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        return size
+    
+    def download(self, blob_name, offset=None, length=None):
+        self.simulate_request('download')
+        try:
+            f = open(self.get_path(blob_name), 'rb')
+        except FileNotFoundError:
+            raise ResourceNotFoundError(f"Blob introuvable: {blob_name}")
+        
+        def read_chunks():
+            with f:
+                if offset:
+                    f.seek(offset)
+                remaining = length
+                while remaining is None or remaining > 0:
+                    size = AZURE_STORAGE_DOWNLOAD_CHUNK_SIZE if remaining is None else min(AZURE_STORAGE_DOWNLOAD_CHUNK_SIZE, remaining)
+                    data = f.read(size)
+                    if not data:
+                        break
+                    if remaining is not None:
+                        remaining -= len(data)
+                    yield data
+        
+        return self.throttle(read_chunks())
+    
+    def delete(self, blob_name, if_unmodified_since=None):
+        self.simulate_request('delete')
+        path = self.get_path(blob_name)
+        try:
+            if if_unmodified_since and utc_datetime(os.stat(path).st_mtime) > if_unmodified_since:
+                raise ResourceModifiedError(f"Blob modifié depuis {if_unmodified_since.isoformat()}: {blob_name}")
+            os.remove(path)
+        except FileNotFoundError:
+            raise ResourceNotFoundError(f"Blob introuvable: {blob_name}")
+        try:
+            os.remove(path + self.METADATA_SUFFIX)
+        except FileNotFoundError:
+            pass
+    
+    def properties(self, blob_name):
+        self.simulate_request('properties')
+        try:
+            size = os.stat(self.get_path(blob_name)).st_size
+        except FileNotFoundError:
+            raise ResourceNotFoundError(f"Blob introuvable: {blob_name}")
+        return {'size': size, 'content_type': self.guess_content_type(blob_name)}
+    
+    def set_metadata(self, blob_name, metadata):
+        self.simulate_request('set_metadata')
+        path = self.get_path(blob_name)
+        if not os.path.exists(path):
+            raise ResourceNotFoundError(f"Blob introuvable: {blob_name}")
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(metadata, f, ensure_ascii=False)
+            os.replace(temp_path, path + self.METADATA_SUFFIX)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+    
+    def check(self, timeout):
+        self.simulate_request('check')
+        os.makedirs(self.root, exist_ok=True)
+        if not os.access(self.root, os.W_OK):
+            raise Exception(f"Répertoire de stockage non accessible en écriture: {self.root}")
+    
+    def describe(self):
+        return dict(super().describe(), path=self.root)
+
+# Blob du backend mémoire (content_type : en-tête reçu par un upload direct, sinon déduit du nom)
+MemoryBlob = namedtuple('MemoryBlob', 'content metadata modified content_type')
+
+class MemoryStorageBackend(SimulatedStorageBackend):
+    """Documents conservés en mémoire (propres à chaque processus, perdus au redémarrage)"""
+    name = 'memory'
+    
+    def __init__(self, **simulation):
+        super().__init__(**simulation)
+        self.blobs = {}
+        self.lock = threading.Lock()
+    
+    def upload(self, blob_name, stream, metadata):
+        self.simulate_request('upload')
+        content = b''.join(self.read_blocks(stream))
+        with self.lock:
+            self.blobs[blob_name] = MemoryBlob(content, dict(metadata), time.time(), None)
+        return len(content)
+    
+    def create_upload_url(self, blob_name, expires_at):
+        """URL de l'application jouant le rôle du SAS : création seule de blob_name jusqu'à expires_at"""
+        grant = {'blob_name': blob_name, 'expires_at': expires_at.isoformat()}
+        return url_for('receive_direct_upload', token=simulated_upload_serializer().dumps(grant), _external=True)
+    
+    def receive_upload(self, blob_name, stream, content_type):
+        """Créer un blob depuis le corps d'un PUT client (ResourceExistsError s'il existe déjà, comme le SAS)"""
+        self.simulate_request('upload')
+        chunks = []
+        while True:
+            data = stream.read(AZURE_STORAGE_MAX_BLOCK_SIZE)
+            if not data:
+                break
+            self.simulate_transfer(len(data))
+            chunks.append(data)
+        content = b''.join(chunks)
+        with self.lock:
+            if blob_name in self.blobs:
+                raise ResourceExistsError(f"Blob déjà existant: {blob_name}")
+            self.blobs[blob_name] = MemoryBlob(content, {}, time.time(), content_type)
+        return len(content)
+    
+    def download(self, blob_name, offset=None, length=None):
+        self.simulate_request('download')
+        with self.lock:
+            entry = self.blobs.get(blob_name)
+        if entry is None:
+            raise ResourceNotFoundError(f"Blob introuvable: {blob_name}")
+        
+        content = entry.content
+        start = offset or 0
+        stop = len(content) if length is None else min(len(content), start + length)
+        chunk_size = AZURE_STORAGE_DOWNLOAD_CHUNK_SIZE
+        return self.throttle(
+            content[i:min(i + chunk_size, stop)] for i in range(start, stop, chunk_size)
+        )
+    
+    def delete(self, blob_name, if_unmodified_since=None):
+        self.simulate_request('delete')
+        with self.lock:
+            entry = self.blobs.get(blob_name)
+            if entry is None:
+                raise ResourceNotFoundError(f"Blob introuvable: {blob_name}")
+            if if_unmodified_since and utc_datetime(entry.modified) > if_unmodified_since:
+                raise ResourceModifiedError(f"Blob modifié depuis {if_unmodified_since.isoformat()}: {blob_name}")
+            del self.blobs[blob_name]
+    
+    def properties(self, blob_name):
+        self.simulate_request('properties')
+        with self.lock:
+            entry = self.blobs.get(blob_name)
+        if entry is None:
+            raise ResourceNotFoundError(f"Blob introuvable: {blob_name}")
+        return {'size': len(entry.content), 'content_type': entry.content_type or self.guess_content_type(blob_name)}
+    
+    def set_metadata(self, blob_name, metadata):
+        self.simulate_request('set_metadata')
+        with self.lock:
+            entry = self.blobs.get(blob_name)
+            if entry is None:
+                raise ResourceNotFoundError(f"Blob introuvable: {blob_name}")
+            self.blobs[blob_name] = entry._replace(metadata=dict(metadata))
+    
+    def check(self, timeout):
+        self.simulate_request('check')
+    
+    def describe(self):
+        with self.lock:
+            blobs_count = len(self.blobs)
+        return dict(super().describe(), blobs=blobs_count)
+
+def create_storage_backend(mode):
+    """Créer le backend correspondant à AZURE_STORAGE_MODE"""
+    if mode == 'azure':
+        return AzureBlobStorageBackend()
+    
+    simulation = {
+        'latency_ms': STORAGE_SIMULATED_LATENCY_MS,
+        'jitter_ms': STORAGE_SIMULATED_JITTER_MS,
+        'bandwidth': STORAGE_SIMULATED_BANDWIDTH,
+        'error_rate': STORAGE_SIMULATED_ERROR_RATE,
+        'seed': int(STORAGE_SIMULATED_SEED) if STORAGE_SIMULATED_SEED else None
+    }
+    if mode == 'local':
+        return LocalFileStorageBackend(LOCAL_STORAGE_PATH, **simulation)
+    if mode in ('memory', 'mock'):
+        return MemoryStorageBackend(**simulation)
+    raise ValueError(f"Mode de stockage inconnu: {mode}")
+
+# Backends instanciés dans ce processus, par mode
+_storage_backends = {}
+_storage_backends_lock = threading.Lock()
+
+def get_storage_backend():
+    """Renvoyer le backend de stockage du mode courant (créé au premier usage)"""
+    backend = _storage_backends.get(AZURE_STORAGE_MODE)
+    if backend is None:
+        with _storage_backends_lock:
+            backend = _storage_backends.get(AZURE_STORAGE_MODE)
+            if backend is None:
+                backend = create_storage_backend(AZURE_STORAGE_MODE)
+                _storage_backends[AZURE_STORAGE_MODE] = backend
+    return backend
+
+# ========================================
+# FONCTIONS UTILITAIRES AZURE STORAGE
+# ========================================
+
+def allowed_file(filename):
+    """Vérifier si le fichier est autorisé"""
+    if '.' not in filename:
+        return False
+    
+    extension = filename.rsplit('.', 1)[1].lower()
+    all_extensions = set()
+    for ext_group in ALLOWED_EXTENSIONS.values():
+        all_extensions.update(ext_group)
+    
+    return extension in all_extensions
+
+def get_file_category(filename):
+    """Déterminer la catégorie du fichier"""
+    if '.' not in filename:
+        return 'other'
+    
+    extension = filename.rsplit('.', 1)[1].lower()
+    
+    for category, extensions in ALLOWED_EXTENSIONS.items():
+        if extension in extensions:
+            return category
+    
+    return 'other'
+
+def build_download_headers(filename, file_size=None):
+    """Construire les en-têtes d'un téléchargement en pièce jointe"""
+    try:
+        filename.encode('ascii')
+        simple_name = filename.replace('"', '\\"')
+        content_disposition = f'attachment; filename="{simple_name}"'
+    except UnicodeEncodeError:
+        # Nom non ASCII : version simplifiée + encodage RFC 5987
+        simple_name = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        simple_name = simple_name.replace('"', '\\"')
+        quoted_name = urllib.parse.quote(filename, safe="!#$&+-.^_`|~")
+        content_disposition = f'attachment; filename="{simple_name}"; filename*=UTF-8\'\'{quoted_name}'
+    
+    headers = {'Content-Disposition': content_disposition}
+    if file_size is not None:
+        headers['Content-Length'] = str(file_size)
+    return headers
+
+def get_document_etag(document):
+    """ETag du contenu d'un document, dérivé du blob seul (un blob n'est jamais réécrit avec un autre
+    contenu) : les documents dédupliqués partagent ainsi le cache disque et la lecture coalescée"""
+    return make_etag('blob', document.blob_name, document.file_size)
+
+def get_requested_range(file_size, etag, last_modified):
+    """Analyser Range/If-Range : (start, stop) pour une réponse 206, None pour le fichier complet.
+    Lève ValueError si la plage demandée est hors du fichier."""
+    byte_range = request.range
+    if byte_range is None or byte_range.units != 'bytes' or len(byte_range.ranges) != 1:
+        # Pas de plage, ou plages multiples : on renvoie le fichier complet
+        return None
+    
+    # If-Range : la plage n'est valable que pour la version connue du client
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != etag:
+        return None
+    if if_range.date is not None:
+        if not last_modified or if_range.date.replace(tzinfo=None) != last_modified.replace(microsecond=0):
+            return None
+    
+    requested = byte_range.range_for_length(file_size)
+    if requested is None:
+        raise ValueError('Plage demandée non satisfiable')
+    return requested
+
+def compute_content_hash(file):
+    """Empreinte SHA-256 du contenu d'un fichier (position remise au début)"""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(functools.partial(file.read, 1024 * 1024), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+def content_blob_name(content_hash):
+    """Nom adressé par le contenu : un seul blob par contenu, quels que soient l'incident et le nom du fichier"""
+    return f"sha256/{content_hash[:2]}/{content_hash}"
+
+def find_stored_contents(content_hashes):
+    """Contenus déjà stockés et référencés : {empreinte: (blob_name, taille d'origine)} (une requête)"""
+    candidates = {}
+    for content_hash in content_hashes:
+        base_name = content_blob_name(content_hash)
+        # Le blob peut avoir été compressé au repos (suffixe du codec)
+        for suffix in ('',) + tuple(STORAGE_CODEC_SUFFIXES.values()):
+            candidates[base_name + suffix] = content_hash
+    if not candidates:
+        return {}
+    
+    rows = db.session.query(IncidentDocument.blob_name, IncidentDocument.file_size).filter(
+        IncidentDocument.blob_name.in_(list(candidates))
+    ).distinct().all()
+    return {candidates[blob_name]: (blob_name, file_size) for blob_name, file_size in rows}
+
+def count_blob_references(blob_name):
+    """Nombre de documents qui référencent un blob"""
+    return db.session.query(func.count(IncidentDocument.id)).filter(
+        IncidentDocument.blob_name == blob_name
+    ).scalar()
+
+def release_blob(blob_name):
+    """Programmer la suppression d'un blob qui n'est plus référencé par aucun document.
+    
+    La suppression est différée de BLOB_RELEASE_GRACE secondes : un upload concurrent qui a
+    trouvé ce contenu déjà stocké (déduplication) a le temps d'enregistrer sa référence.
+    Idempotent : un blob déjà en attente garde sa ligne, dont le délai repart de zéro.
+    """
+    if count_blob_references(blob_name):
+        return False
+    
+    released = ReleasedBlob.query.filter_by(blob_name=blob_name).first()
+    if released is not None:
+        released.released_at = datetime.utcnow()
+    else:
+        db.session.add(ReleasedBlob(blob_name=blob_name))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Libéré au même instant par une autre requête : la ligne existe déjà
+        db.session.rollback()
+    return True
+
+class BlobJanitor:
+    """Supprime en arrière-plan les blobs libérés depuis plus de grace secondes et toujours non référencés"""
+    
+    BATCH_SIZE = 500
+    
+    LEASE_NAME = 'blob-janitor'
+    
+    def __init__(self, interval, grace):
+        self.interval = interval
+        self.grace = grace
+        self.lock = threading.Lock()
+        self.pid = None
+        self.holder = None
+    
+    def ensure_started(self):
+        """Démarrer le thread de purge dans ce processus (après un fork, il faut le relancer)"""
+        if self.interval <= 0 or self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+            threading.Thread(target=self.run_forever, name='blob-janitor', daemon=True).start()
+    
+    def run_forever(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                with app.app_context():
+                    # Un seul worker purge à la fois ; le bail expire si son détenteur s'arrête
+                    if acquire_lease(self.LEASE_NAME, self.holder, 3 * self.interval):
+                        self.purge()
+                        self.sweep_uploads()
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Erreur lors de la purge des blobs libérés: {e}")
+    
+    def purge(self, now=None):
+        """Supprimer les blobs libérés arrivés à échéance et renvoyer leur nombre"""
+        cutoff = (now or datetime.utcnow()) - timedelta(seconds=self.grace)
+        released = ReleasedBlob.query.filter(ReleasedBlob.released_at <= cutoff) \
+            .order_by(ReleasedBlob.id).limit(self.BATCH_SIZE).all()
+        
+        deleted = 0
+        for entry in released:
+            # Référencé de nouveau entre-temps (document ajouté avec le même contenu) : conservé
+            if not count_blob_references(entry.blob_name):
+                try:
+                    # Ré-uploadé depuis sa libération : la suppression conditionnelle échoue
+                    delete_file_from_blob(entry.blob_name, if_unmodified_since=entry.released_at)
+                    deleted += 1
+                except (ResourceNotFoundError, ResourceModifiedError):
+                    pass
+                except Exception:
+                    # Stockage indisponible : nouvelle tentative au prochain passage
+                    continue
+                document_cache.invalidate(entry.blob_name)
+            db.session.delete(entry)
+        db.session.commit()
+        
+        if deleted:
+            print(f"🧹 {deleted} blob(s) non référencé(s) supprimé(s)")
+        return deleted
+    
+    def sweep_uploads(self, now=None):
+        """Oublier les uploads directs dont le jeton a expiré et supprimer les blobs jamais finalisés.
+        
+        Un jeton de finalisation expire DIRECT_UPLOAD_SAS_TTL + DIRECT_UPLOAD_FINALIZE_GRACE après
+        l'émission de l'URL ; grace secondes de plus laissent aboutir une finalisation en cours.
+        Seules les lignes de direct_uploads sont parcourues, jamais le préfixe uploads/ du stockage.
+        """
+        cutoff = (now or datetime.utcnow()) - timedelta(
+            seconds=DIRECT_UPLOAD_SAS_TTL + DIRECT_UPLOAD_FINALIZE_GRACE + self.grace
+        )
+        expired = DirectUpload.query.filter(DirectUpload.created_at <= cutoff) \
+            .order_by(DirectUpload.id).limit(self.BATCH_SIZE).all()
+        
+        deleted = 0
+        for upload in expired:
+            if upload.finalized_at is None:
+                try:
+                    delete_file_from_blob(upload.blob_name)
+                    deleted += 1
+                except ResourceNotFoundError:
+                    pass  # URL émise mais fichier jamais envoyé
+                except Exception:
+                    continue
+            db.session.delete(upload)
+        db.session.commit()
+        
+        if deleted:
+            print(f"🧹 {deleted} upload(s) direct(s) abandonné(s) supprimé(s)")
+        return deleted
+
+def acquire_lease(name, holder, ttl):
+    """Prendre ou prolonger le bail d'une tâche périodique pour ttl secondes : True si holder le détient"""
+    now = datetime.utcnow()
+    taken = MaintenanceLease.query.filter(
+        MaintenanceLease.name == name,
+        or_(MaintenanceLease.holder == holder, MaintenanceLease.expires_at < now)
+    ).update({'holder': holder, 'expires_at': now + timedelta(seconds=ttl)}, synchronize_session=False)
+    if not taken:
+        if MaintenanceLease.query.get(name) is not None:
+            db.session.rollback()
+            return False
+        db.session.add(MaintenanceLease(name=name, holder=holder, expires_at=now + timedelta(seconds=ttl)))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Bail créé au même instant par un autre worker
+        db.session.rollback()
+        return False
+    return True
+
+blob_janitor = BlobJanitor(BLOB_PURGE_INTERVAL, BLOB_RELEASE_GRACE)
+
+@app.before_request
+def start_blob_janitor():
+    blob_janitor.ensure_started()
+
+def read_exactly(stream, size):
+    """Lire size octets (moins à la fin du flux), même si le flux renvoie des lectures partielles"""
+    parts = []
+    remaining = size
+    while remaining > 0:
+        data = stream.read(remaining)
+        if not data:
+            break
+        parts.append(data)
+        remaining -= len(data)
+    return b''.join(parts)
+
+def upload_stream_in_blocks(blob_client, stream, metadata):
+    """Uploader un flux par blocs en parallèle (stage_block puis commit_block_list).
+    La taille du flux n'a pas à être connue d'avance (fichier compressé à la volée)."""
+    stream.seek(0)
+    head = read_exactly(stream, AZURE_STORAGE_MAX_SINGLE_PUT_SIZE + 1)
+    
+    if len(head) <= AZURE_STORAGE_MAX_SINGLE_PUT_SIZE:
+        # Petit fichier : un seul PUT suffit
+        blob_client.upload_blob(head, overwrite=True, metadata=metadata)
+        return len(head)
+    
+    # Début déjà lu, puis suite du flux : découpés en blocs de AZURE_STORAGE_MAX_BLOCK_SIZE
+    head = io.BytesIO(head)
+    
+    def next_block():
+        data = head.read(AZURE_STORAGE_MAX_BLOCK_SIZE)
+        if len(data) < AZURE_STORAGE_MAX_BLOCK_SIZE:
+            data += read_exactly(stream, AZURE_STORAGE_MAX_BLOCK_SIZE - len(data))
+        return data
+    
+    # Au plus AZURE_STORAGE_UPLOAD_CONCURRENCY blocs en mémoire à la fois
+    slots = threading.BoundedSemaphore(AZURE_STORAGE_UPLOAD_CONCURRENCY)
+    block_ids = []
+    futures = []
+    total_size = 0
+    
+    def stage(block_id, data):
+        try:
+            blob_client.stage_block(block_id, data, length=len(data))
+        finally:
+            slots.release()
+    
+    with ThreadPoolExecutor(max_workers=AZURE_STORAGE_UPLOAD_CONCURRENCY) as executor:
+        while True:
+            slots.acquire()
+            data = next_block()
+            if not data or any(f.done() and f.exception() for f in futures):
+                slots.release()
+                break
+            
+            block_id = f"{len(block_ids):08d}"
+            block_ids.append(block_id)
+            total_size += len(data)
+            futures.append(executor.submit(stage, block_id, data))
+        
+        # Propager la première erreur de staging éventuelle
+        for future in futures:
+            future.result()
+    
+    blob_client.commit_block_list(block_ids, metadata=metadata)
+    return total_size
+
+# Suffixe ajouté au nom des blobs compressés au repos : le codec est connu sans lire les métadonnées
+STORAGE_CODEC_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+# Formats déjà compressés : jamais recompressés
+PRECOMPRESSED_EXTENSIONS = {'pdf', 'docx', 'xlsx', 'pptx', 'zip', 'rar', '7z', 'jpg', 'jpeg', 'png', 'gif'}
+# Gain minimal pour garder la version compressée (sinon le fichier est stocké tel quel)
+STORAGE_COMPRESSION_MIN_SAVING = 0.1
+
+def parse_storage_compression(value):
+    """Lire STORAGE_COMPRESSION ('catégorie:codec,...') en {catégorie: codec}"""
+    codecs = {}
+    for item in value.split(','):
+        category, _, codec = item.strip().partition(':')
+        if not category:
+            continue
+        codec = codec.strip() or 'gzip'
+        if category not in ALLOWED_EXTENSIONS or codec not in STORAGE_CODEC_SUFFIXES:
+            print(f"⚠️  STORAGE_COMPRESSION: entrée ignorée '{item.strip()}'")
+            continue
+        if codec == 'zstd' and zstandard is None:
+            print(f"⚠️  Paquet zstandard non installé, gzip utilisé pour la catégorie {category}")
+            codec = 'gzip'
+        codecs[category] = codec
+    return codecs
+
+storage_compression_codecs = parse_storage_compression(STORAGE_COMPRESSION)
+
+def storage_codec_for(filename):
+    """Codec de stockage d'un nouveau fichier selon sa catégorie (None : stocké tel quel)"""
+    extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    if extension in PRECOMPRESSED_EXTENSIONS:
+        return None
+    return storage_compression_codecs.get(get_file_category(filename))
+
+def blob_codec(blob_name):
+    """Codec de stockage d'un blob d'après son nom (None si stocké tel quel)"""
+    for codec, suffix in STORAGE_CODEC_SUFFIXES.items():
+        if blob_name.endswith(suffix):
+            return codec
+    return None
+
+class CompressingReader:
+    """Flux en lecture compressant un fichier à la volée : le blob compressé n'est jamais entier en mémoire.
+    Seul le retour au début (seek(0)) est possible, il recommence la compression."""
+    
+    def __init__(self, file, codec):
+        self.file = file
+        self.codec = codec
+        self.seek(0)
+    
+    def seek(self, offset, whence=os.SEEK_SET):
+        if offset != 0 or whence != os.SEEK_SET:
+            raise io.UnsupportedOperation("Flux compressé : seul le retour au début est possible")
+        self.file.seek(0)
+        level = STORAGE_ZSTD_LEVEL if self.codec == 'zstd' else STORAGE_GZIP_LEVEL
+        self.compressor = StreamCompressor(self.codec, level)
+        self.buffer = bytearray()
+        self.finished = False
+        self.position = 0
+        return 0
+    
+    def tell(self):
+        return self.position
+    
+    def read(self, size=-1):
+        while not self.finished and (size < 0 or len(self.buffer) < size):
+            chunk = self.file.read(AZURE_STORAGE_MAX_BLOCK_SIZE)
+            if chunk:
+                self.buffer += self.compressor.compress(chunk)
+            else:
+                self.buffer += self.compressor.finish()
+                self.finished = True
+        if size < 0 or size > len(self.buffer):
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        self.position += len(data)
+        return data
+
+def compress_for_storage(file, codec):
+    """Préparer la compression d'un fichier uploadé : (flux compressé ou None si le gain est insuffisant, taille d'origine).
+    Le gain est estimé sur le premier bloc ; le fichier est ensuite compressé pendant l'upload."""
+    file.seek(0, os.SEEK_END)
+    original_size = file.tell()
+    file.seek(0)
+    if original_size < STORAGE_COMPRESSION_MIN_SIZE:
+        return None, original_size
+    
+    sample = file.read(AZURE_STORAGE_MAX_BLOCK_SIZE)
+    file.seek(0)
+    level = STORAGE_ZSTD_LEVEL if codec == 'zstd' else STORAGE_GZIP_LEVEL
+    if len(compress_bytes(sample, codec, level)) > len(sample) * (1 - STORAGE_COMPRESSION_MIN_SAVING):
+        return None, original_size
+    return CompressingReader(file, codec), original_size
+
+def decompress_chunks(chunks, codec):
+    """Décompresser un blob en streaming, bloc par bloc"""
+    if codec == 'zstd':
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+    else:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+def upload_file_to_blob(file, filename, incident_id, content_hash=None):
+    """Uploader un fichier vers le backend de stockage configuré (blob nommé d'après son SHA-256)"""
+    try:
+        backend = get_storage_backend()
+        
+        if content_hash is None:
+            content_hash = compute_content_hash(file)
+        blob_name = content_blob_name(content_hash)
+        
+        # incident_id et original_filename : premier document ayant apporté ce contenu
+        metadata = {
+            'incident_id': str(incident_id),
+            'original_filename': filename,
+            'sha256': content_hash,
+            'upload_date': datetime.utcnow().isoformat(),
+            'uploaded_by': 'flask_app'
+        }
+        
+        codec = storage_codec_for(filename)
+        if codec:
+            compressed, original_size = compress_for_storage(file, codec)
+            if compressed is not None:
+                # Codec dans les métadonnées (et non Content-Encoding, que le SDK décompresserait au téléchargement)
+                blob_name += STORAGE_CODEC_SUFFIXES[codec]
+                metadata['codec'] = codec
+                metadata['logical_size'] = str(original_size)
+                stored_size = backend.upload(blob_name, compressed, metadata)
+                print(f"✅ Fichier uploadé: {blob_name} ({codec}: {original_size} → {stored_size} octets)")
+                # file_size du document : taille d'origine, celle que reçoit le client
+                return blob_name, original_size
+        
+        file_size = backend.upload(blob_name, file, metadata)
+        
+        print(f"✅ Fichier uploadé: {blob_name}")
+        return blob_name, file_size
+    
+    except AzureError as e:
+        print(f"❌ Erreur Azure lors de l'upload: {e}")
+        if isinstance(e, ClientAuthenticationError):
+            invalidate_blob_service_client()
+        raise
+    except Exception as e:
+        print(f"❌ Erreur lors de l'upload: {e}")
+        raise
+
+def upload_documents_concurrently(files, incident_id, uploaded_by='User'):
+    """Uploader plusieurs fichiers en parallèle et préparer les documents associés"""
+    accepted = []
+    errors = []
+    
+    for file in files:
+        if not (file and file.filename and allowed_file(file.filename)):
+            continue
+        
+        # Vérifier la taille du fichier
+        file.seek(0, os.SEEK_END)
+        file_size = file.tell()
+        file.seek(0)
+        
+        if file_size > MAX_FILE_SIZE:
+            errors.append(f'Fichier {file.filename} trop volumineux (max {MAX_FILE_SIZE // (1024*1024)} MB)')
+            continue
+        
+        accepted.append(file)
+    
+    if not accepted:
+        return [], errors
+    
+    # Déduplication : un contenu déjà stocké (ou présent deux fois dans l'envoi) n'est uploadé qu'une fois
+    content_hashes = [compute_content_hash(file) for file in accepted]
+    stored = find_stored_contents(set(content_hashes))
+    to_upload = {}
+    for file, content_hash in zip(accepted, content_hashes):
+        if content_hash not in stored:
+            to_upload.setdefault(content_hash, file)
+    
+    # Uploader vers Azure Blob Storage avec un pool de threads borné
+    futures = {}
+    if to_upload:
+        workers = max(1, min(AZURE_STORAGE_UPLOAD_WORKERS, len(to_upload)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for content_hash, file in to_upload.items():
+                futures[content_hash] = executor.submit(upload_file_to_blob, file, file.filename, incident_id, content_hash)
+    
+    documents = []
+    for file, content_hash in zip(accepted, content_hashes):
+        if content_hash in stored:
+            blob_name, actual_size = stored[content_hash]
+            print(f"♻️  Contenu déjà stocké, upload évité: {file.filename} → {blob_name}")
+        else:
+            try:
+                blob_name, actual_size = futures[content_hash].result()
+            except Exception as e:
+                print(f"❌ Erreur lors de l'upload de {file.filename}: {e}")
+                errors.append(f'Erreur lors de l\'upload de {file.filename}: {str(e)}')
+                continue
+        
+        documents.append(IncidentDocument(
+            incident_id=incident_id,
+            filename=file.filename,
+            blob_name=blob_name,
+            file_size=actual_size,
+            content_type=file.content_type or 'application/octet-stream',
+            uploaded_by=uploaded_by
+        ))
+    
+    return documents, errors
+
+def save_uploaded_documents(documents):
+    """Insérer les documents uploadés en un seul flush (blobs non référencés supprimés en cas d'échec)"""
+    if not documents:
+        return
+    
+    try:
+        db.session.bulk_save_objects(documents)
+        db.session.commit()
+        # bulk_save_objects ne déclenche pas les événements du mapper
+        invalidate_incident_stats()
+    except Exception:
+        db.session.rollback()
+        # Un blob partagé avec des documents existants est conservé
+        for blob_name in {document.blob_name for document in documents}:
+            try:
+                release_blob(blob_name)
+            except Exception:
+                pass
+        raise
+
+# Préfixe des blobs envoyés directement par le client (nom unique, hors adressage par contenu)
+DIRECT_UPLOAD_PREFIX = 'uploads/'
+# Délai accordé après l'expiration du SAS pour finaliser un upload commencé à temps
+DIRECT_UPLOAD_FINALIZE_GRACE = 900
+DIRECT_UPLOAD_CLOCK_SKEW = timedelta(minutes=5)
+DIRECT_UPLOAD_DELEGATION_KEY_TTL = timedelta(days=1)
+
+def generate_direct_blob_name(filename):
+    """Nom de blob unique pour un upload direct (le contenu n'est pas connu à l'émission du SAS)"""
+    return f"{DIRECT_UPLOAD_PREFIX}{uuid.uuid4().hex}/{secure_filename(filename) or 'document'}"
+
+def direct_upload_serializer():
+    """Signature des jetons d'upload direct (aucun état serveur entre émission et finalisation)"""
+    return URLSafeTimedSerializer(app.secret_key, salt='direct-upload')
+
+def simulated_upload_serializer():
+    """Signature des URL d'upload direct du backend mémoire (distincte des jetons de finalisation)"""
+    return URLSafeTimedSerializer(app.secret_key, salt='simulated-direct-upload')
+
+def parse_direct_upload_request(data):
+    """Valider nom, taille et type annoncés par le client : (upload, erreur)"""
+    filename = str(data.get('filename') or '').strip()
+    if not filename or not allowed_file(filename):
+        return None, f'Type de fichier non autorisé: {filename or "(vide)"}'
+    
+    size = data.get('size')
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        return None, "Paramètre 'size' invalide (taille en octets)"
+    if size > MAX_FILE_SIZE:
+        return None, f'Fichier {filename} trop volumineux (max {MAX_FILE_SIZE // (1024*1024)} MB)'
+    
+    content_type = str(data.get('content_type') or '').strip() or \
+        mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if len(content_type) > IncidentDocument.content_type.type.length:
+        return None, "Paramètre 'content_type' invalide"
+    
+    return {'filename': filename, 'size': size, 'content_type': content_type}, None
+
+def claim_direct_upload(blob_name):
+    """Marquer un upload direct comme finalisé, sans valider la transaction : False s'il l'était déjà"""
+    return DirectUpload.query.filter(
+        DirectUpload.blob_name == blob_name,
+        DirectUpload.finalized_at.is_(None)
+    ).update({'finalized_at': datetime.utcnow()}, synchronize_session=False) == 1
+
+def verify_direct_upload(upload, properties):
+    """Comparer le blob reçu à ce qui a été annoncé : message d'erreur ou None"""
+    if properties['size'] != upload['size']:
+        return f"Taille reçue ({properties['size']} octets) différente de la taille annoncée ({upload['size']} octets)"
+    if (properties['content_type'] or '').lower() != upload['content_type'].lower():
+        return f"Type reçu ({properties['content_type']}) différent du type annoncé ({upload['content_type']})"
+    return None
+
+def download_file_from_blob(blob_name):
+    """Télécharger un fichier complet en mémoire (décompressé si compressé au repos)"""
+    chunks = stream_file_from_blob(blob_name)
+    codec = blob_codec(blob_name)
+    if codec:
+        chunks = decompress_chunks(chunks, codec)
+    return io.BytesIO(b''.join(chunks))
+
+def stream_file_from_blob(blob_name, offset=None, length=None):
+    """Ouvrir un blob (ou une plage d'octets) en streaming et renvoyer un itérateur de blocs"""
+    try:
+        return get_storage_backend().download(blob_name, offset=offset, length=length)
+    
+    except AzureError as e:
+        print(f"❌ Erreur Azure lors du téléchargement: {e}")
+        if isinstance(e, ClientAuthenticationError):
+            invalidate_blob_service_client()
+        raise
+    except Exception as e:
+        print(f"❌ Erreur lors du téléchargement: {e}")
+        raise
+
+class DocumentDiskCache:
+    """Cache disque LRU des documents, partagé par les workers d'une même machine"""
+    
+    TEMP_PREFIX = '.tmp-'
+    
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.size = None  # Taille occupée par tous les workers lors du dernier parcours
+    
+    @property
+    def enabled(self):
+        return self.max_size > 0
+    
+    def blob_prefix(self, blob_name):
+        return hashlib.sha256(blob_name.encode('utf-8')).hexdigest()
+    
+    def path_for(self, blob_name, etag):
+        """Chemin du fichier en cache pour un blob et une version (ETag) donnés"""
+        version = hashlib.sha256(etag.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.directory, f"{self.blob_prefix(blob_name)}-{version}")
+    
+    def get(self, blob_name, etag):
+        """Chemin du fichier en cache ou None ; un accès le rend le plus récent (LRU)"""
+        if not self.enabled:
+            return None
+        path = self.path_for(blob_name, etag)
+        try:
+            os.utime(path)
+            return path
+        except OSError:
+            return None
+    
+    def fill(self, blob_name, etag, chunks, expected_size):
+        """Transmettre les blocs au client tout en les écrivant dans le cache (expected_size None : taille inconnue)"""
+        if not self.enabled or (expected_size is not None and expected_size > self.max_size):
+            yield from chunks
+            return
+        
+        temp_file = None
+        temp_path = None
+        written = 0
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=self.TEMP_PREFIX)
+            temp_file = os.fdopen(fd, 'wb')
+        except OSError as e:
+            print(f"⚠️  Cache documents indisponible: {e}")
+        
+        try:
+            for chunk in chunks:
+                if temp_file:
+                    try:
+                        temp_file.write(chunk)
+                        written += len(chunk)
+                    except OSError as e:
+                        # Disque plein, etc. : le téléchargement continue sans cache
+                        print(f"⚠️  Écriture du cache documents impossible: {e}")
+                        temp_file.close()
+                        temp_file = None
+                yield chunk
+            
+            if temp_file:
+                temp_file.close()
+                temp_file = None
+                if expected_size is None or written == expected_size:
+                    os.replace(temp_path, self.path_for(blob_name, etag))
+                    temp_path = None
+                    self.evict()
+        finally:
+            # Téléchargement interrompu ou incomplet : ne rien garder
+            if temp_file:
+                temp_file.close()
+            if temp_path:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+    
+    def evict(self):
+        """Supprimer les fichiers les moins récemment utilisés au-delà de la taille maximale.
+        
+        Le répertoire est partagé par les workers : il est parcouru après chaque ajout pour que
+        la limite porte sur les fichiers de tous les processus, et non sur les seuls ajouts de celui-ci.
+        """
+        with self.lock:
+            entries = []
+            total_size = 0
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                total_size += stat.st_size
+                # Fichiers en cours d'écriture : comptés mais pas supprimables
+                if not name.startswith(self.TEMP_PREFIX):
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                    total_size -= size
+                except OSError:
+                    pass
+            self.size = total_size
+    
+    def invalidate(self, blob_name):
+        """Retirer toutes les versions d'un blob du cache"""
+        if not self.enabled or not os.path.isdir(self.directory):
+            return
+        prefix = self.blob_prefix(blob_name) + '-'
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+document_cache = DocumentDiskCache(DOCUMENT_CACHE_DIR, DOCUMENT_CACHE_MAX_SIZE)
+
+class SingleFlight:
+    """Regrouper les appels concurrents identiques : un seul exécute, les autres attendent son résultat"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+    
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = {'event': threading.Event(), 'result': None, 'error': None}
+        
+        if not leader:
+            call['event'].wait()
+            if call['error']:
+                raise call['error']
+            return call['result']
+        
+        try:
+            call['result'] = fn()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call['event'].set()
+
+# Renvoyé à un abonné distancé par la lecture partagée
+DETACHED = object()
+
+class SharedBlobFetch:
+    """Lecture unique d'un blob partagée par les téléchargements concurrents du même document.
+    
+    Aucun thread dédié : l'abonné le plus avancé lit le bloc suivant à la demande. Un bloc est
+    libéré dès que tous les abonnés l'ont consommé (un seul abonné : un bloc en mémoire au plus),
+    et au plus max_chunks blocs sont conservés ; un abonné distancé se détache et poursuit avec
+    sa propre lecture par plage d'octets. La lecture s'arrête quand il ne reste aucun abonné.
+    """
+    
+    def __init__(self, blob_name, max_chunks, on_close):
+        self.blob_name = blob_name
+        self.max_chunks = max(1, max_chunks)
+        self.on_close = on_close
+        self.condition = threading.Condition()
+        self.started = threading.Event()
+        self.source = None
+        self.chunks = deque()
+        self.base = 0  # Index du premier bloc conservé
+        self.base_offset = 0  # Octets déjà libérés (début du blob)
+        self.positions = {}  # Abonné -> index du prochain bloc à lire
+        self.detached = set()
+        self.reading = False
+        self.done = False
+        self.closed = False
+        self.error = None
+    
+    def start(self, source):
+        """Premier GET réussi : les abonnés peuvent lire"""
+        self.source = source
+        self.started.set()
+    
+    def fail(self, error):
+        """Échec avant le premier octet : les abonnés en attente lèvent la même erreur"""
+        self.error = error
+        self.done = True
+        self.closed = True
+        self.started.set()
+    
+    def subscribe(self):
+        """Abonnement depuis le début du blob, ou None si la lecture partagée est close"""
+        self.started.wait()
+        with self.condition:
+            if self.closed:
+                if self.error and not self.source:
+                    raise self.error
+                return None
+            token = object()
+            self.positions[token] = self.base
+            return BlobSubscription(self, token, self.base_offset)
+    
+    def next_chunk(self, token):
+        """Bloc suivant de l'abonné (lu dans le blob s'il est le plus avancé), None à la fin,
+        DETACHED s'il a été distancé"""
+        with self.condition:
+            while True:
+                if token in self.detached:
+                    return DETACHED
+                position = self.positions[token]
+                if position < self.base + len(self.chunks):
+                    chunk = self.chunks[position - self.base]
+                    self.positions[token] = position + 1
+                    self.trim()
+                    return chunk
+                if self.error:
+                    raise self.error
+                if self.done:
+                    return None
+                if not self.reading:
+                    break
+                self.condition.wait()
+            self.reading = True
+        
+        try:
+            chunk = next(self.source, None)
+        except Exception as e:
+            print(f"❌ Erreur lors de la lecture partagée du blob: {e}")
+            with self.condition:
+                self.error = e
+                self.reading = False
+                self.condition.notify_all()
+            self.on_close(self)
+            raise
+        
+        with self.condition:
+            self.reading = False
+            if chunk is None:
+                self.done = True
+            else:
+                self.chunks.append(chunk)
+                self.positions[token] = self.base + len(self.chunks)
+                # Tampon plein : libérer le plus ancien bloc et détacher les abonnés qui ne l'ont pas lu
+                while len(self.chunks) > self.max_chunks:
+                    for other, position in list(self.positions.items()):
+                        if position <= self.base:
+                            del self.positions[other]
+                            self.detached.add(other)
+                    self.release_oldest()
+                self.trim()
+            self.condition.notify_all()
+        if chunk is None:
+            # Les nouveaux téléchargements liront le cache disque
+            self.on_close(self)
+        return chunk
+    
+    def release_oldest(self):
+        self.base_offset += len(self.chunks.popleft())
+        self.base += 1
+    
+    def trim(self):
+        """Libérer les blocs consommés par tous les abonnés"""
+        lowest = min(self.positions.values(), default=self.base + len(self.chunks))
+        while self.chunks and self.base < lowest:
+            self.release_oldest()
+    
+    def unsubscribe(self, token):
+        with self.condition:
+            self.positions.pop(token, None)
+            self.detached.discard(token)
+            self.trim()
+            last = not self.positions and not self.closed
+            if last:
+                self.closed = True
+                self.condition.notify_all()
+        if last:
+            # Plus aucun abonné : arrêter la lecture (le fichier partiel du cache est supprimé)
+            self.on_close(self)
+            if self.source is not None and hasattr(self.source, 'close'):
+                self.source.close()
+
+class BlobSubscription:
+    """Itérateur d'un téléchargement abonné à une lecture partagée (close() le désabonne)"""
+    
+    def __init__(self, fetch, token, prefix):
+        self.fetch = fetch
+        self.token = token
+        self.prefix = prefix  # Octets déjà libérés à l'abonnement, relus par une plage dédiée
+    
+    def __iter__(self):
+        fetch = self.fetch
+        offset = 0
+        try:
+            if self.prefix:
+                for chunk in stream_file_from_blob(fetch.blob_name, offset=0, length=self.prefix):
+                    offset += len(chunk)
+                    yield chunk
+            while True:
+                chunk = fetch.next_chunk(self.token)
+                if chunk is None:
+                    return
+                if chunk is DETACHED:
+                    break
+                offset += len(chunk)
+                yield chunk
+        finally:
+            self.close()
+        
+        # Distancé : suite du blob par une lecture propre à ce téléchargement
+        yield from stream_file_from_blob(fetch.blob_name, offset=offset)
+    
+    def close(self):
+        if self.token is not None:
+            token, self.token = self.token, None
+            self.fetch.unsubscribe(token)
+
+DocumentInfo = namedtuple('DocumentInfo', 'id incident_id filename blob_name file_size content_type upload_date')
+
+_document_lookups = SingleFlight()
+_blob_fetches_lock = threading.Lock()
+_blob_fetches = {}
+
+def get_document_info(doc_id):
+    """Lire un document en base (requêtes concurrentes sur le même document regroupées)"""
+    def load():
+        document = IncidentDocument.query.get(doc_id)
+        if document is None:
+            return None
+        return DocumentInfo(document.id, document.incident_id, document.filename, document.blob_name,
+                            document.file_size, document.content_type, document.upload_date)
+    
+    return _document_lookups.do(doc_id, load)
+
+def stream_blob_coalesced(blob_name, etag, file_size):
+    """Télécharger un blob en entier, une seule lecture Azure pour N requêtes simultanées"""
+    key = (blob_name, etag)
+    
+    def on_close(fetch):
+        with _blob_fetches_lock:
+            if _blob_fetches.get(key) is fetch:
+                del _blob_fetches[key]
+    
+    with _blob_fetches_lock:
+        fetch = _blob_fetches.get(key)
+        leader = fetch is None
+        if leader:
+            fetch = _blob_fetches[key] = SharedBlobFetch(blob_name, DOWNLOAD_SHARED_BUFFER_CHUNKS, on_close)
+    
+    if not leader:
+        subscription = fetch.subscribe()
+        if subscription is not None:
+            return subscription
+        # Lecture partagée terminée entre-temps : nouvelle lecture
+        return stream_blob_coalesced(blob_name, etag, file_size)
+    
+    try:
+        # Premier GET dans la requête : les erreurs remontent avant l'envoi des en-têtes
+        source = document_cache.fill(blob_name, etag, stream_file_from_blob(blob_name), file_size)
+    except Exception as e:
+        on_close(fetch)
+        fetch.fail(e)
+        raise
+    
+    fetch.start(source)
+    return fetch.subscribe()
+
+def compressed_document_response(document, etag, codec):
+    """Document compressé au repos : transmis tel quel (Content-Encoding) si le client accepte
+    le codec, sinon décompressé à la volée. Les plages d'octets (Range) ne sont pas proposées."""
+    cached_file = None
+    cached_path = document_cache.get(document.blob_name, etag)
+    if cached_path:
+        try:
+            cached_file = open(cached_path, 'rb')
+        except FileNotFoundError:
+            # Évincé entre-temps par un autre worker : lecture depuis Azure
+            pass
+    
+    subscription = None
+    if cached_file:
+        chunks = iter(functools.partial(cached_file.read, AZURE_STORAGE_MAX_BLOCK_SIZE), b'')
+    else:
+        chunks = subscription = stream_blob_coalesced(document.blob_name, etag, None)
+    
+    if request.accept_encodings.best_match([codec]):
+        headers = build_download_headers(document.filename)
+        headers['Content-Encoding'] = codec
+        weak = True
+    else:
+        chunks = decompress_chunks(chunks, codec)
+        headers = build_download_headers(document.filename, document.file_size)
+        weak = False
+    
+    headers['Accept-Ranges'] = 'none'
+    response = Response(
+        chunks,
+        mimetype=document.content_type,
+        headers=headers,
+        direct_passthrough=True
+    )
+    if cached_file:
+        response.call_on_close(cached_file.close)
+    if subscription is not None:
+        # decompress_chunks ne ferme pas l'itérateur qu'il enveloppe
+        response.call_on_close(subscription.close)
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag, weak=weak)
+    response.last_modified = document.upload_date
+    return response
+
+def delete_file_from_blob(blob_name, if_unmodified_since=None):
+    """Supprimer un fichier du backend de stockage"""
+    try:
+        get_storage_backend().delete(blob_name, if_unmodified_since=if_unmodified_since)
+        print(f"✅ Fichier supprimé: {blob_name}")
+    
+    except ResourceModifiedError:
+        print(f"♻️  Blob réécrit depuis sa libération, conservé: {blob_name}")
+        raise
+    except AzureError as e:
+        print(f"❌ Erreur Azure lors de la suppression: {e}")
+        if isinstance(e, ClientAuthenticationError):
+            invalidate_blob_service_client()
+        raise
+    except Exception as e:
+        print(f"❌ Erreur lors de la suppression: {e}")
+        raise
+
+# ========================================
+# MÉTRIQUES DES REQUÊTES
+# ========================================
+
+# Bornes des buckets de latence : 4 par doublement (précision ~19 %), de 1 ms à ~65 s
+LATENCY_MIN_SECONDS = 0.001
+LATENCY_SUB_BUCKETS = 4
+LATENCY_BOUNDS = [LATENCY_MIN_SECONDS * 2 ** (i / LATENCY_SUB_BUCKETS) for i in range(65)]
+
+class LatencyHistogram:
+    """Histogramme de latences à buckets logarithmiques fixes (mémoire constante)"""
+    
+    def __init__(self):
+        # Un compteur par borne + un pour les valeurs au-delà de la dernière (+Inf)
+        self.counts = [0] * (len(LATENCY_BOUNDS) + 1)
+        self.total = 0.0
+    
+    def record(self, seconds):
+        if seconds <= LATENCY_MIN_SECONDS:
+            index = 0
+        else:
+            index = min(len(LATENCY_BOUNDS), math.ceil(math.log2(seconds / LATENCY_MIN_SECONDS) * LATENCY_SUB_BUCKETS))
+        self.counts[index] += 1
+        self.total += seconds
+
+class RequestMetrics:
+    """Compteurs par route du processus, publiés dans METRICS_DIR pour l'agrégation entre workers"""
+    
+    FILE_PREFIX = 'metrics-'
+    TEMP_PREFIX = '.tmp-'
+    
+    def __init__(self, directory, flush_interval, retention):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.retention = retention
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.in_flight = 0
+        self.pid = None
+        self.instance_id = None
+    
+    def ensure_started(self):
+        """Démarrer le thread de publication dans ce processus (après un fork, repartir de zéro)"""
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.routes = {}
+            self.in_flight = 0
+            self.pid = os.getpid()
+            # Identifiant propre à ce démarrage : un pid recyclé n'écrase pas le fichier d'un worker arrêté
+            self.instance_id = uuid.uuid4().hex[:12]
+            threading.Thread(target=self.run_forever, name='metrics-flusher', daemon=True).start()
+    
+    def run_forever(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                self.prune()
+            except Exception as e:
+                print(f"❌ Erreur lors de la publication des métriques: {e}")
+    
+    def file_name(self):
+        return f"{self.FILE_PREFIX}{os.getpid()}-{self.instance_id}.json"
+    
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+    
+    def end(self, method, route, status, seconds, bytes_in, bytes_out, in_flight=True):
+        """Enregistrer une requête terminée (in_flight=False si begin() n'a pas été appelé pour elle)"""
+        key = f"{method} {route}"
+        with self.lock:
+            if in_flight:
+                self.in_flight -= 1
+            entry = self.routes.get(key)
+            if entry is None:
+                entry = self.routes[key] = {
+                    'histogram': LatencyHistogram(), 'status': {}, 'bytes_in': 0, 'bytes_out': 0
+                }
+            entry['histogram'].record(seconds)
+            entry['status'][status] = entry['status'].get(status, 0) + 1
+            entry['bytes_in'] += bytes_in
+            entry['bytes_out'] += bytes_out
+    
+    def snapshot(self):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'instance': self.instance_id,
+                'updated_at': time.time(),
+                'in_flight': self.in_flight,
+                'routes': {
+                    key: {
+                        'buckets': list(entry['histogram'].counts),
+                        'sum': entry['histogram'].total,
+                        'status': dict(entry['status']),
+                        'bytes_in': entry['bytes_in'],
+                        'bytes_out': entry['bytes_out']
+                    }
+                    for key, entry in self.routes.items()
+                }
+            }
+    
+    def flush(self):
+        """Écrire l'instantané du processus (fichier temporaire puis renommage)"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, self.file_name())
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=self.TEMP_PREFIX)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+    
+    def prune(self):
+        """Supprimer les fichiers (et temporaires abandonnés) non mis à jour depuis retention secondes"""
+        if self.retention <= 0:
+            return 0
+        cutoff = time.time() - self.retention
+        removed = 0
+        for name in os.listdir(self.directory):
+            if not name.startswith((self.FILE_PREFIX, self.TEMP_PREFIX)):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+    
+    def collect(self):
+        """Instantanés de tous les workers (le processus courant est lu en mémoire)"""
+        snapshots = [self.snapshot()]
+        own_file = self.file_name()
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            if not name.startswith(self.FILE_PREFIX) or name == own_file:
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+    
+    def render(self):
+        """Métriques agrégées au format texte Prometheus"""
+        routes = {}
+        in_flight = 0
+        workers = 0
+        stale_after = time.time() - 3 * self.flush_interval
+        for snapshot in self.collect():
+            # Les compteurs des workers arrêtés restent comptés (compteurs monotones),
+            # seules les jauges ne retiennent que les workers actifs
+            if snapshot['updated_at'] >= stale_after:
+                workers += 1
+                in_flight += snapshot['in_flight']
+            for key, data in snapshot['routes'].items():
+                merged = routes.setdefault(key, {
+                    'buckets': [0] * len(data['buckets']), 'sum': 0.0, 'status': {}, 'bytes_in': 0, 'bytes_out': 0
+                })
+                merged['buckets'] = [a + b for a, b in zip(merged['buckets'], data['buckets'])]
+                merged['sum'] += data['sum']
+                merged['bytes_in'] += data['bytes_in']
+                merged['bytes_out'] += data['bytes_out']
+                for status, count in data['status'].items():
+                    merged['status'][status] = merged['status'].get(status, 0) + count
+        
+        lines = [
+            '# HELP http_request_duration_seconds Durée des requêtes HTTP (jusqu\'à la fin de l\'envoi de la réponse)',
+            '# TYPE http_request_duration_seconds histogram'
+        ]
+        for key in sorted(routes):
+            data = routes[key]
+            labels = metric_labels(key)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BOUNDS, data['buckets']):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+            cumulative += data['buckets'][-1]
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {data["sum"]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {cumulative}')
+        
+        lines += ['# HELP http_requests_total Requêtes HTTP par route et code de statut',
+                  '# TYPE http_requests_total counter']
+        for key in sorted(routes):
+            for status, count in sorted(routes[key]['status'].items()):
+                lines.append(f'http_requests_total{{{metric_labels(key)},status="{status}"}} {count}')
+        
+        lines += ['# HELP http_request_bytes_total Octets reçus dans le corps des requêtes',
+                  '# TYPE http_request_bytes_total counter']
+        lines += [f'http_request_bytes_total{{{metric_labels(key)}}} {routes[key]["bytes_in"]}' for key in sorted(routes)]
+        
+        lines += ['# HELP http_response_bytes_total Octets envoyés dans le corps des réponses',
+                  '# TYPE http_response_bytes_total counter']
+        lines += [f'http_response_bytes_total{{{metric_labels(key)}}} {routes[key]["bytes_out"]}' for key in sorted(routes)]
+        
+        lines += ['# HELP http_requests_in_flight Requêtes en cours de traitement',
+                  '# TYPE http_requests_in_flight gauge',
+                  f'http_requests_in_flight {in_flight}',
+                  '# HELP http_metrics_workers Processus workers ayant publié récemment leurs métriques',
+                  '# TYPE http_metrics_workers gauge',
+                  f'http_metrics_workers {workers}']
+        return '\n'.join(lines) + '\n'
+
+def metric_labels(key):
+    """Labels Prometheus d'une clé 'MÉTHODE route' (valeurs échappées)"""
+    method, _, route = key.partition(' ')
+    route = route.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return f'method="{method}",route="{route}"'
+
+request_metrics = RequestMetrics(METRICS_DIR, METRICS_FLUSH_INTERVAL, METRICS_RETENTION)
+
+class MeteredResponse:
+    """Itérable WSGI comptant les octets envoyés ; la mesure est enregistrée à la fermeture"""
+    
+    def __init__(self, iterable, on_close):
+        self.iterable = iterable
+        self.on_close = on_close
+        self.bytes_out = 0
+    
+    def __iter__(self):
+        for chunk in self.iterable:
+            self.bytes_out += len(chunk)
+            yield chunk
+    
+    def close(self):
+        try:
+            if hasattr(self.iterable, 'close'):
+                self.iterable.close()
+        finally:
+            self.on_close(self.bytes_out)
+
+class RequestMetricsMiddleware:
+    """Middleware WSGI : latence jusqu'à la fin du streaming, statut, octets et requêtes en cours"""
+    
+    # Le scrape Prometheus ne se compte pas lui-même dans http_requests_in_flight
+    NOT_IN_FLIGHT_PATHS = ('/metrics',)
+    
+    def __init__(self, wsgi_app, metrics):
+        self.wsgi_app = wsgi_app
+        self.metrics = metrics
+    
+    def __call__(self, environ, start_response):
+        self.metrics.ensure_started()
+        in_flight = environ.get('PATH_INFO') not in self.NOT_IN_FLIGHT_PATHS
+        if in_flight:
+            self.metrics.begin()
+        start = time.perf_counter()
+        response = {'status': '500', 'length': None}
+        
+        def metered_start_response(status, headers, exc_info=None):
+            response['status'] = status.split(' ', 1)[0]
+            for name, value in headers:
+                if name.lower() == 'content-length':
+                    response['length'] = int(value)
+            return start_response(status, headers, exc_info)
+        
+        def record(bytes_out):
+            self.metrics.end(
+                environ.get('REQUEST_METHOD', 'GET'),
+                environ.get('incidents.route', '<unmatched>'),
+                response['status'],
+                time.perf_counter() - start,
+                int(environ.get('CONTENT_LENGTH') or 0),
+                bytes_out,
+                in_flight
+            )
+        
+        try:
+            iterable = self.wsgi_app(environ, metered_start_response)
+        except BaseException:
+            record(0)
+            raise
+        
+        # Fichier envoyé par wsgi.file_wrapper (sendfile) : ne pas l'envelopper pour
+        # conserver l'optimisation, la mesure s'arrête alors avant le transfert
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if isinstance(file_wrapper, type) and isinstance(iterable, file_wrapper):
+            record(response['length'] or 0)
+            return iterable
+        
+        return MeteredResponse(iterable, record)
+
+@app.before_request
+def remember_route():
+    """Noter la règle de routage (et non l'URL) pour borner le nombre de séries de métriques"""
+    if request.url_rule is not None:
+        request.environ['incidents.route'] = request.url_rule.rule
+
+if METRICS_ENABLED:
+    app.wsgi_app = RequestMetricsMiddleware(app.wsgi_app, request_metrics)
+
+# ========================================
+# INSTRUMENTATION SQL
+# ========================================
+
+SQL_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+SQL_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+SQL_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+SQL_WHITESPACE = re.compile(r'\s+')
+
+def normalize_statement(statement):
+    """Forme normalisée d'une requête : littéraux et listes IN remplacés, espaces compactés"""
+    statement = SQL_STRING_LITERAL.sub('?', statement)
+    statement = SQL_NUMBER_LITERAL.sub('?', statement)
+    statement = SQL_PLACEHOLDER_LIST.sub('(?, ...)', statement)
+    return SQL_WHITESPACE.sub(' ', statement).strip()
+
+def parameter_shape(parameters, executemany=False):
+    """Types des paramètres liés (jamais leurs valeurs) pour le journal des requêtes lentes"""
+    if executemany and isinstance(parameters, (list, tuple)) and parameters:
+        return f"{len(parameters)} × {parameter_shape(parameters[0])}"
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + '}'
+    if isinstance(parameters, (list, tuple)):
+        return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+    return type(parameters).__name__
+
+class StatementStats:
+    """Requêtes normalisées les plus coûteuses du processus (nombre d'entrées borné)"""
+    
+    def __init__(self, max_statements):
+        self.max_statements = max_statements
+        self.lock = threading.Lock()
+        self.statements = {}
+    
+    def record(self, statement, seconds):
+        key = normalize_statement(statement)
+        with self.lock:
+            entry = self.statements.get(key)
+            if entry is None:
+                if len(self.statements) >= self.max_statements:
+                    # Évincer la requête au temps cumulé le plus faible
+                    cheapest = min(self.statements, key=lambda k: self.statements[k]['total'])
+                    del self.statements[cheapest]
+                entry = self.statements[key] = {'count': 0, 'total': 0.0, 'max': 0.0}
+            entry['count'] += 1
+            entry['total'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+    
+    def top(self, limit, order='total'):
+        with self.lock:
+            items = list(self.statements.items())
+        items = heapq.nlargest(limit, items, key=lambda item: item[1][order])
+        return [{
+            'statement': statement,
+            'count': entry['count'],
+            'total_ms': round(entry['total'] * 1000, 2),
+            'avg_ms': round(entry['total'] * 1000 / entry['count'], 3),
+            'max_ms': round(entry['max'] * 1000, 2)
+        } for statement, entry in items]
+    
+    def reset(self):
+        with self.lock:
+            self.statements = {}
+
+statement_stats = StatementStats(SQL_STATS_MAX_STATEMENTS)
+
+@db.event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+@db.event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    """Compter la requête pour la requête HTTP en cours, la journaliser si elle est lente"""
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    statement_stats.record(statement, elapsed)
+    
+    in_request = has_request_context()
+    if in_request:
+        g.sql_queries = g.get('sql_queries', 0) + 1
+        g.sql_time = g.get('sql_time', 0.0) + elapsed
+    
+    if elapsed * 1000 >= SQL_SLOW_QUERY_MS:
+        route = f" [{request.method} {request.path}]" if in_request else ''
+        print(f"🐢 Requête SQL lente ({elapsed * 1000:.1f} ms){route}: {SQL_WHITESPACE.sub(' ', statement).strip()} "
+              f"| paramètres: {parameter_shape(parameters, executemany)}")
+
+@app.before_request
+def reset_sql_counters():
+    g.sql_queries = 0
+    g.sql_time = 0.0
+
+@app.after_request
+def add_sql_timing(response):
+    """Exposer le nombre de requêtes SQL et leur durée (en-tête Server-Timing)"""
+    queries = g.get('sql_queries', 0)
+    if queries:
+        sql_ms = g.get('sql_time', 0.0) * 1000
+        response.headers.add('Server-Timing', f'db;dur={sql_ms:.1f};desc="{queries} requêtes SQL"')
+        if queries >= SQL_QUERY_COUNT_WARNING:
+            print(f"⚠️  {queries} requêtes SQL ({sql_ms:.1f} ms) pour {request.method} {request.path} : motif N+1 ?")
+    return response
+
+def debug_endpoint(view):
+    """Réserver une route de debug : désactivée par défaut, jeton X-Debug-Token si configuré"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not DEBUG_ENDPOINTS_ENABLED:
+            abort(404)
+        if DEBUG_ENDPOINTS_TOKEN:
+            token = request.headers.get('X-Debug-Token', '')
+            if not hmac.compare_digest(token, DEBUG_ENDPOINTS_TOKEN):
+                abort(403)
+        return view(*args, **kwargs)
+    return wrapper
+
+# ========================================
+# PROFILAGE PAR ÉCHANTILLONNAGE
+# ========================================
+
+PROFILE_MAX_HZ = 1000
+
+# Fonctions feuilles d'un thread au repos (attente de verrou, de socket ou de file)
+IDLE_FRAMES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('selectors.py', 'select'),
+    ('socket.py', 'accept'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+    ('app.py', 'run_forever')  # sondes et publication des métriques en sommeil (time.sleep)
+}
+
+# Route en cours de traitement par thread, pour l'attribution des échantillons
+active_routes = {}
+
+@app.before_request
+def register_active_route():
+    rule = request.url_rule.rule if request.url_rule is not None else request.path
+    active_routes[threading.get_ident()] = f"{request.method} {rule}"
+
+@app.teardown_request
+def unregister_active_route(exc):
+    active_routes.pop(threading.get_ident(), None)
+
+class SamplingProfiler:
+    """Échantillonne la pile de tous les threads du processus (sys._current_frames)"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.labels = {}
+    
+    def frame_label(self, code):
+        """Libellé 'fonction (fichier:ligne)' mis en cache par objet code"""
+        label = self.labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+            self.labels[code] = label
+        return label
+    
+    def sample(self, seconds, hz, by_route=False, include_idle=False):
+        """Collecter les piles pendant seconds secondes ; renvoie (compteurs, statistiques)"""
+        if not self.lock.acquire(blocking=False):
+            return None, None
+        try:
+            own_thread = threading.get_ident()
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            counts = {}
+            samples = 0
+            sampling_time = 0.0
+            interval = 1.0 / hz
+            start = time.perf_counter()
+            deadline = start + seconds
+            next_tick = start
+            
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    code = frame.f_code
+                    if not include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(self.frame_label(frame.f_code))
+                        frame = frame.f_back
+                    if by_route:
+                        route = active_routes.get(thread_id)
+                        stack.append(route if route else f"[{thread_names.get(thread_id, thread_id)}]")
+                    key = ';'.join(reversed(stack))
+                    counts[key] = counts.get(key, 0) + 1
+                
+                samples += 1
+                sampling_time += time.perf_counter() - now
+                next_tick += interval
+                delay = min(next_tick, deadline) - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # En retard : reprendre la cadence sans rattraper les ticks manqués
+                    next_tick = time.perf_counter()
+            
+            elapsed = time.perf_counter() - start
+            return counts, {
+                'samples': samples,
+                'duration': elapsed,
+                'rate': samples / elapsed if elapsed else 0.0,
+                'overhead': sampling_time / elapsed if elapsed else 0.0
+            }
+        finally:
+            self.lock.release()
+
+profiler = SamplingProfiler()
+
+def render_collapsed_stacks(counts):
+    """Format 'pile;repliée nombre' (flamegraph.pl, speedscope, inferno), piles les plus fréquentes d'abord"""
+    lines = [f"{stack} {count}" for stack, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))]
+    return '\n'.join(lines) + '\n' if lines else ''
+
+# ========================================
+# COMPRESSION DES RÉPONSES
+# ========================================
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/json', 'application/x-ndjson', 'application/javascript', 'image/svg+xml'
+}
+COMPRESSION_ENCODINGS = ['br', 'gzip'] if brotli is not None else ['gzip']
+# Fichiers statiques compressés une fois au niveau maximal puis gardés en mémoire
+STATIC_PRECOMPRESSED_PREFIXES = ('css/',)
+STATIC_COMPRESSION_LEVELS = {'br': 11, 'gzip': 9}
+
+class StreamCompressor:
+    """Compresseur gzip ou brotli incrémental"""
+    
+    def __init__(self, encoding, level):
+        self.encoding = encoding
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=level)
+        elif encoding == 'zstd':
+            self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    
+    def compress(self, data, flush=False):
+        """Compresser un bloc ; flush=True rend décodable tout ce qui a été reçu jusqu'ici"""
+        if self.encoding == 'br':
+            output = self.compressor.process(data)
+            return output + self.compressor.flush() if flush else output
+        output = self.compressor.compress(data)
+        if not flush:
+            return output
+        return output + self.compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK if self.encoding == 'zstd' else zlib.Z_SYNC_FLUSH
+        )
+    
+    def finish(self):
+        if self.encoding == 'br':
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+def compress_bytes(data, encoding, level):
+    """Compresser un corps complet"""
+    compressor = StreamCompressor(encoding, level)
+    return compressor.compress(data) + compressor.finish()
+
+class CompressedStream:
+    """Corps WSGI compressé à la volée : chaque bloc est vidé aussitôt (exports, pages en flux)"""
+    
+    def __init__(self, chunks, encoding, level):
+        self.chunks = chunks
+        self.compressor = StreamCompressor(encoding, level)
+    
+    def __iter__(self):
+        for chunk in self.chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield self.compressor.compress(chunk, flush=True)
+        yield self.compressor.finish()
+    
+    def close(self):
+        # Fermer le corps d'origine (stream_with_context libère alors le contexte et la session)
+        if hasattr(self.chunks, 'close'):
+            self.chunks.close()
+
+def negotiate_encoding():
+    """Meilleur codage accepté par le client (br, gzip) ou None, q=0 respecté"""
+    return request.accept_encodings.best_match(COMPRESSION_ENCODINGS)
+
+@app.after_request
+def compress_response(response):
+    """Compresser les réponses texte (HTML, JSON, CSV, NDJSON) selon Accept-Encoding"""
+    if not COMPRESSION_ENABLED or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    
+    # Fichiers envoyés tels quels (send_file, téléchargements avec Range) ou déjà encodés : inchangés
+    if response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+    
+    level = COMPRESSION_BROTLI_QUALITY if encoding == 'br' else COMPRESSION_GZIP_LEVEL
+    if response.is_streamed:
+        response.response = CompressedStream(response.response, encoding, level)
+        response.headers.remove('Content-Length')
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_SIZE:
+            return response
+        response.set_data(compress_bytes(data, encoding, level))
+    
+    response.headers['Content-Encoding'] = encoding
+    # L'ETag fort désigne la représentation non compressée
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+static_compression_cache = {}
+
+def serve_static(filename):
+    """Fichiers statiques ; CSS servis pré-compressés (cache mémoire par version du fichier)"""
+    encoding = None
+    if COMPRESSION_ENABLED and filename.startswith(STATIC_PRECOMPRESSED_PREFIXES):
+        encoding = negotiate_encoding()
+    path = safe_join(app.static_folder, filename)
+    if encoding is None or path is None or not os.path.isfile(path):
+        return app.send_static_file(filename)
+    
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = static_compression_cache.get((path, encoding))
+    if cached is None or cached[0] != version:
+        with open(path, 'rb') as f:
+            cached = (version, compress_bytes(f.read(), encoding, STATIC_COMPRESSION_LEVELS[encoding]))
+        static_compression_cache[(path, encoding)] = cached
+    
+    response = Response(cached[1], mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    response.headers['Content-Encoding'] = encoding
+    response.set_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}", weak=True)
+    response.last_modified = stat.st_mtime
+    max_age = app.get_send_file_max_age(filename)
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+app.view_functions['static'] = serve_static
+
+# ========================================
+# ROUTES FLASK
+# ========================================
+
+@app.route('/')
+def index():
+    """Page d'accueil avec la liste des incidents (filtrée et paginée côté serveur)"""
+    try:
+        try:
+            filters, cursor, limit = parse_incident_filters(request.args)
+            incidents, next_cursor = query_incident_page(filters, cursor, limit)
+        except ValueError as e:
+            flash(str(e), 'warning')
+            filters, cursor, limit = parse_incident_filters({})
+            incidents, next_cursor = query_incident_page(filters, None, limit)
+        
+        filter_args = {key: value for key, value in filters.items() if value}
+        first_url = url_for('index', **filter_args)
+        next_url = url_for('index', cursor=next_cursor, limit=limit, **filter_args) if next_cursor else None
+        
+        return render_template('incidents.html',
+                             incidents=incidents,
+                             stats=get_incident_stats(),
+                             filters=filters,
+                             severites=SEVERITES_VALIDES,
+                             first_url=first_url,
+                             next_url=next_url,
+                             is_first_page=cursor is None)
+        
+    except Exception as e:
+        print(f"❌ Erreur lors de la récupération des incidents: {e}")
+        # Mode dégradé avec des données de démonstration
+        incidents_demo = [
+            {'id': 1, 'titre': 'Connexion Azure en cours...', 'severite': 'Info', 
+             'date_incident': datetime.now(), 'documents_count': 0}
+        ]
+        stats_demo = {'total': 1, 'by_severity': {}, 'documents': 0}
+        return render_template('incidents.html', incidents=incidents_demo, stats=stats_demo,
+                             filters={}, severites=SEVERITES_VALIDES, first_url=None, next_url=None,
+                             is_first_page=True)
+
+@app.route('/incident/<int:id>')
+def detail_incident(id):
+    """Page de détail d'un incident avec ses documents"""
+    try:
+        incident = Incident.query.get_or_404(id)
+        documents = IncidentDocument.query.filter_by(incident_id=id).order_by(IncidentDocument.upload_date.desc()).all()
+        
+        return render_template('detail.html', incident=incident, documents=documents)
+        
+    except Exception as e:
+        print(f"❌ Erreur lors de la récupération de l'incident {id}: {e}")
+        flash(f'Erreur lors de la récupération de l\'incident: {e}', 'error')
+        return redirect(url_for('index'))
+
+@app.route('/ajouter')
+def ajouter_incident_form():
+    """Formulaire d'ajout d'incident avec upload de documents"""
+    return render_template('ajouter.html', 
+                         max_file_size_mb=MAX_FILE_SIZE // (1024*1024),
+                         allowed_extensions=ALLOWED_EXTENSIONS)
+
+@app.route('/ajouter-incident', methods=['POST'])
+def ajouter_incident():
+    """Traitement de l'ajout d'incident avec documents"""
+    try:
+        titre = request.form.get('titre', '').strip()
+        description = request.form.get('description', '').strip()
+        severite = request.form.get('severite', 'Moyenne')
+        
         # Validation des données obligatoires
         if not titre:
             flash('Le titre de l\'incident est obligatoire', 'error')
             return redirect(url_for('ajouter_incident_form'))
         
         # Validation de la sévérité (doit correspondre aux contraintes de la base)
-        severites_valides = ['Critique', 'Élevée', 'Moyenne', 'Faible']
-        if severite not in severites_valides:
-            flash(f'Sévérité invalide. Valeurs acceptées: {", ".join(severites_valides)}', 'error')
+        if severite not in SEVERITES_VALIDES:
+            flash(f'Sévérité invalide. Valeurs acceptées: {", ".join(SEVERITES_VALIDES)}', 'error')
             return redirect(url_for('ajouter_incident_form'))
         
         # Créer le nouvel incident
@@ -454,44 +3609,16 @@ def ajouter_incident():
         db.session.commit()
         incident_id = nouvel_incident.id
         
-        # Traitement des fichiers uploadés
-        uploaded_files = request.files.getlist('documents')
-        uploaded_count = 0
-        
-        for file in uploaded_files:
-            if file and file.filename and allowed_file(file.filename):
-                try:
-                    # Vérifier la taille du fichier
-                    file.seek(0, os.SEEK_END)
-                    file_size = file.tell()
-                    file.seek(0)
-                    
-                    if file_size > MAX_FILE_SIZE:
-                        flash(f'Fichier {file.filename} trop volumineux (max {MAX_FILE_SIZE // (1024*1024)} MB)', 'warning')
-                        continue
-                    
-                    # Uploader vers Azure Blob Storage
-                    blob_name, actual_size = upload_file_to_blob(file, file.filename, incident_id)
-                    
-                    # Enregistrer la référence en base
-                    document = IncidentDocument(
-                        incident_id=incident_id,
-                        filename=file.filename,
-                        blob_name=blob_name,
-                        file_size=actual_size,
-                        content_type=file.content_type or 'application/octet-stream',
-                        uploaded_by='User'
-                    )
-                    
-                    db.session.add(document)
-                    uploaded_count += 1
-                    
-                except Exception as e:
-                    print(f"❌ Erreur lors de l'upload de {file.filename}: {e}")
-                    flash(f'Erreur lors de l\'upload de {file.filename}: {str(e)}', 'warning')
+        # Traitement des fichiers uploadés (en parallèle)
+        documents, upload_errors = upload_documents_concurrently(
+            request.files.getlist('documents'), incident_id
+        )
+        for message in upload_errors:
+            flash(message, 'warning')
         
         # Commit final
-        db.session.commit()
+        save_uploaded_documents(documents)
+        uploaded_count = len(documents)
         
         success_msg = f'Incident "{titre}" ajouté avec succès!'
         if uploaded_count > 0:
@@ -506,22 +3633,106 @@ def ajouter_incident():
         flash(f'Erreur lors de l\'ajout: {str(e)}', 'error')
         return redirect(url_for('ajouter_incident_form'))
 
+@app.route('/incident/<int:id>/documents', methods=['POST'])
+def ajouter_documents(id):
+    """Attacher des documents à un incident existant"""
+    try:
+        incident = Incident.query.get_or_404(id)
+        
+        documents, upload_errors = upload_documents_concurrently(
+            request.files.getlist('documents'), incident.id
+        )
+        for message in upload_errors:
+            flash(message, 'warning')
+        
+        save_uploaded_documents(documents)
+        
+        if documents:
+            flash(f'{len(documents)} document(s) attaché(s) à l\'incident', 'success')
+        elif not upload_errors:
+            flash('Aucun fichier valide sélectionné', 'warning')
+        
+        return redirect(url_for('detail_incident', id=incident.id))
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Erreur lors de l'ajout de documents à l'incident {id}: {e}")
+        flash(f'Erreur lors de l\'ajout des documents: {str(e)}', 'error')
+        return redirect(url_for('detail_incident', id=id))
+
 @app.route('/document/<int:doc_id>/download')
 def download_document(doc_id):
     """Télécharger un document depuis Azure Blob Storage"""
     try:
-        document = IncidentDocument.query.get_or_404(doc_id)
+        document = get_document_info(doc_id)
+        if document is None:
+            abort(404)
         
-        # Télécharger depuis Azure Blob Storage
-        file_stream = download_file_from_blob(document.blob_name)
+        etag = get_document_etag(document)
+        cached = not_modified_response(etag)
+        if cached:
+            return cached
         
-        return send_file(
-            file_stream,
-            as_attachment=True,
-            download_name=document.filename,
-            mimetype=document.content_type
+        codec = blob_codec(document.blob_name)
+        if codec:
+            # Range ignoré : un décalage dans le fichier d'origine ne correspond à aucun décalage du blob
+            # compressé. Réponse 200 complète, permise par RFC 9110 §14.2, avec Accept-Ranges: none
+            return compressed_document_response(document, etag, codec)
+        
+        # Plage vérifiée avant le cache : 416 que le document soit en cache ou non
+        file_size = document.file_size
+        try:
+            requested_range = get_requested_range(file_size, etag, document.upload_date)
+        except ValueError:
+            return Response(status=416, headers={'Content-Range': f'bytes */{file_size}'})
+        
+        # Document en cache disque : envoi direct du fichier (wsgi.file_wrapper / X-Sendfile),
+        # Range et If-Range gérés par send_file
+        cached_path = document_cache.get(document.blob_name, etag)
+        if cached_path:
+            try:
+                return send_file(
+                    cached_path,
+                    mimetype=document.content_type,
+                    as_attachment=True,
+                    download_name=document.filename,
+                    conditional=True,
+                    etag=etag,
+                    last_modified=document.upload_date
+                )
+            except FileNotFoundError:
+                # Évincé entre-temps par un autre worker : lecture depuis Azure
+                pass
+        
+        if requested_range:
+            # Lecture partielle : seuls les octets demandés sont lus dans Blob Storage
+            start, stop = requested_range
+            chunks = stream_file_from_blob(document.blob_name, offset=start, length=stop - start)
+            headers = build_download_headers(document.filename, stop - start)
+            headers['Content-Range'] = f'bytes {start}-{stop - 1}/{file_size}'
+            status = 206
+        else:
+            # Télécharger depuis Azure Blob Storage en streaming, en alimentant le cache disque ;
+            # les téléchargements simultanés du même document partagent la même lecture
+            chunks = stream_blob_coalesced(document.blob_name, etag, file_size)
+            headers = build_download_headers(document.filename, file_size)
+            status = 200
+        
+        headers['Accept-Ranges'] = 'bytes'
+        response = Response(
+            chunks,
+            status=status,
+            mimetype=document.content_type,
+            headers=headers,
+            direct_passthrough=True
         )
+        response.set_etag(etag)
+        response.last_modified = document.upload_date
+        return response
         
+    except HTTPException:
+        # 404, 416... : réponses HTTP, pas des erreurs de téléchargement
+        raise
     except Exception as e:
         print(f"❌ Erreur lors du téléchargement du document {doc_id}: {e}")
         flash(f'Erreur lors du téléchargement: {str(e)}', 'error')
@@ -534,12 +3745,10 @@ def delete_document(doc_id):
         document = IncidentDocument.query.get_or_404(doc_id)
         incident_id = document.incident_id
         
-        # Supprimer de Azure Blob Storage
-        delete_file_from_blob(document.blob_name)
-        
-        # Supprimer de la base de données
+        # Supprimer de la base de données, puis programmer la suppression du blob si c'était la dernière référence
         db.session.delete(document)
         db.session.commit()
+        release_blob(document.blob_name)
         
         flash(f'Document "{document.filename}" supprimé avec succès', 'success')
         return redirect(url_for('detail_incident', id=incident_id))
@@ -556,10 +3765,278 @@ def delete_document(doc_id):
 
 @app.route('/api/incidents')
 def api_incidents():
-    """API REST - Liste des incidents avec informations documents"""
+    """API REST - Liste paginée des incidents avec informations documents"""
+    try:
+        # Validation conditionnelle avant toute requête de données
+        etag = get_incidents_etag()
+        cached = not_modified_response(etag)
+        if cached:
+            return cached
+        
+        filters, cursor, limit = parse_incident_filters(request.args)
+        incidents, next_cursor = query_incident_page(filters, cursor, limit)
+        
+        response = with_etag(jsonify([incident.to_dict() for incident in incidents]), etag)
+        if next_cursor:
+            # Page suivante signalée dans les en-têtes (corps inchangé : liste d'incidents)
+            next_args = {key: value for key, value in filters.items() if value}
+            next_url = url_for('api_incidents', cursor=next_cursor, limit=limit, _external=True, **next_args)
+            response.headers['Link'] = f'<{next_url}>; rel="next"'
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/incidents/export')
+def api_incidents_export():
+    """API REST - Export complet des incidents filtrés en NDJSON ou CSV (streaming, mémoire constante)"""
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': "Paramètre 'format' invalide (ndjson ou csv)"}), 400
+    delimiter = request.args.get('delimiter', ',')
+    if len(delimiter) != 1:
+        return jsonify({'error': "Paramètre 'delimiter' invalide (un caractère)"}), 400
+    with_documents = request.args.get('with_documents') == '1'
+    
+    try:
+        filters = parse_incident_filters(request.args)[0]
+        if filters['date_debut']:
+            parse_date_arg(filters['date_debut'], 'date_debut')
+        if filters['date_fin']:
+            parse_date_arg(filters['date_fin'], 'date_fin')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    records = iter_export_records(query_incident_export(filters, with_documents), with_documents)
+    # stream_with_context : la session SQL reste ouverte jusqu'à la fin de l'envoi
+    body = stream_with_context(generate_incident_export(records, export_format, with_documents, delimiter))
+    
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f"incidents-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    response = Response(body, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    # Pas de mise en tampon par un proxy nginx : les premiers octets partent immédiatement
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/incidents/bulk', methods=['POST'])
+def api_incidents_bulk():
+    """API REST - Import en masse d'incidents (CSV ou NDJSON en streaming, insertion par lots)"""
+    import_format = request.args.get('format') or BULK_IMPORT_FORMATS.get(request.mimetype)
+    if import_format not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Format non supporté: envoyer text/csv ou application/x-ndjson (ou ?format=csv|ndjson)'}), 415
+    delimiter = request.args.get('delimiter', ',')
+    if len(delimiter) != 1:
+        return jsonify({'error': "Paramètre 'delimiter' invalide (un caractère)"}), 400
+    
+    # Flux brut lu au fil de l'eau, limité par BULK_IMPORT_MAX_SIZE (et non MAX_CONTENT_LENGTH des pièces jointes)
+    stream = get_input_stream(request.environ, max_content_length=BULK_IMPORT_MAX_SIZE)
+    importer = BulkIncidentImport(BULK_IMPORT_BATCH_SIZE, dry_run=request.args.get('dry_run') == '1')
+    
+    try:
+        for line_number, row, error in iter_bulk_rows(stream, import_format, delimiter):
+            if error:
+                importer.reject(line_number, error)
+            else:
+                importer.add(line_number, row)
+        importer.flush()
+    except (ValueError, csv.Error) as e:
+        # Flux illisible (en-tête, encodage) : les lots déjà validés restent importés
+        return jsonify(dict(importer.result(), status='error', error=str(e))), 400
+    except Exception as e:
+        print(f"❌ Erreur lors de l'import en masse: {e}")
+        return jsonify(dict(importer.result(), status='error', error=str(e))), 500
+    finally:
+        if importer.imported and not importer.dry_run:
+            # L'INSERT Core ne déclenche pas les événements du mapper
+            search_index.invalidate()
+            invalidate_incident_stats()
+    
+    result = importer.result()
+    print(f"📥 Import en masse ({import_format}): {result['imported']} incident(s) importé(s), "
+          f"{result['rejected']} rejeté(s) en {result['duration_ms']:.0f} ms")
+    if not result['imported'] and not result['rejected']:
+        return jsonify(dict(result, status='error', error='Aucune ligne à importer')), 400
+    return jsonify(result), 200 if result['imported'] else 400
+
+@app.route('/api/incidents/<int:id>/uploads', methods=['POST'])
+def api_create_direct_upload(id):
+    """API REST - Autoriser l'upload direct d'un document vers Blob Storage (URL SAS en création seule)"""
+    if not DIRECT_UPLOAD_ENABLED:
+        abort(404)
+    incident = Incident.query.get_or_404(id)
+    
+    upload, error = parse_direct_upload_request(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({'error': error}), 400
+    
+    upload['incident_id'] = incident.id
+    upload['blob_name'] = generate_direct_blob_name(upload['filename'])
+    expires_at = datetime.utcnow() + timedelta(seconds=DIRECT_UPLOAD_SAS_TTL)
+    
+    try:
+        upload_url = get_storage_backend().create_upload_url(upload['blob_name'], expires_at)
+    except NotImplementedError as e:
+        return jsonify({'error': str(e)}), 501
+    except Exception as e:
+        print(f"❌ Erreur lors de la création de l'URL d'upload direct: {e}")
+        if isinstance(e, ClientAuthenticationError):
+            invalidate_blob_service_client()
+        return jsonify({'error': str(e)}), 500
+    
+    # Upload en attente : finalisé une seule fois, ou son blob est purgé après expiration du jeton
+    db.session.add(DirectUpload(blob_name=upload['blob_name'], incident_id=incident.id))
+    db.session.commit()
+    
+    print(f"🔏 Upload direct autorisé: {upload['blob_name']} ({upload['size']} octets, incident {incident.id})")
+    return jsonify({
+        'upload_url': upload_url,
+        'method': 'PUT',
+        # x-ms-blob-type est obligatoire pour un PUT brut ; Content-Type est vérifié à la finalisation
+        'headers': {'x-ms-blob-type': 'BlockBlob', 'Content-Type': upload['content_type']},
+        'expires_at': expires_at.isoformat() + 'Z',
+        'upload_token': direct_upload_serializer().dumps(upload),
+        'finalize_url': url_for('api_finalize_direct_upload', id=incident.id)
+    }), 201
+
+@app.route('/storage/uploads/<token>', methods=['PUT'])
+def receive_direct_upload(token):
+    """Réception d'un upload direct par le backend mémoire (tient lieu de l'URL SAS d'Azure)"""
+    backend = get_storage_backend()
+    if not isinstance(backend, MemoryStorageBackend):
+        abort(404)
+    try:
+        grant = simulated_upload_serializer().loads(token)
+    except BadSignature:
+        return jsonify({'error': 'Signature invalide'}), 403
+    if datetime.fromisoformat(grant['expires_at']) < datetime.utcnow():
+        return jsonify({'error': 'URL d\'upload expirée'}), 403
+    if request.headers.get('x-ms-blob-type') != 'BlockBlob':
+        return jsonify({'error': 'En-tête x-ms-blob-type: BlockBlob obligatoire'}), 400
+    
+    try:
+        backend.receive_upload(grant['blob_name'], request.stream, request.headers.get('Content-Type'))
+    except ResourceExistsError:
+        # La permission create du SAS interdit l'écrasement
+        return jsonify({'error': 'Blob déjà envoyé'}), 409
+    return '', 201
+
+@app.route('/api/incidents/<int:id>/uploads/finalize', methods=['POST'])
+def api_finalize_direct_upload(id):
+    """API REST - Vérifier un upload direct et créer le document de l'incident"""
+    if not DIRECT_UPLOAD_ENABLED:
+        abort(404)
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = direct_upload_serializer().loads(
+            str(data.get('upload_token') or ''),
+            max_age=DIRECT_UPLOAD_SAS_TTL + DIRECT_UPLOAD_FINALIZE_GRACE
+        )
+    except BadSignature:
+        return jsonify({'error': "Jeton d'upload invalide ou expiré"}), 400
+    if upload['incident_id'] != id:
+        return jsonify({'error': "Jeton d'upload émis pour un autre incident"}), 400
+    Incident.query.get_or_404(id)
+    
+    blob_name = upload['blob_name']
+    pending = DirectUpload.query.filter_by(blob_name=blob_name).first()
+    if pending is None:
+        return jsonify({'error': "Upload inconnu ou expiré"}), 400
+    if pending.finalized_at is not None:
+        return jsonify({'error': 'Upload déjà finalisé'}), 409
+    
+    backend = get_storage_backend()
+    try:
+        properties = backend.properties(blob_name)
+    except ResourceNotFoundError:
+        return jsonify({'error': "Blob non reçu : envoyer le fichier sur upload_url avant de finaliser"}), 409
+    except Exception as e:
+        print(f"❌ Erreur lors de la vérification de l'upload direct {blob_name}: {e}")
+        if isinstance(e, ClientAuthenticationError):
+            invalidate_blob_service_client()
+        return jsonify({'error': str(e)}), 500
+    
+    error = verify_direct_upload(upload, properties)
+    if error:
+        # Le SAS ne permet pas d'écraser le blob : le client doit redemander une URL
+        DirectUpload.query.filter_by(blob_name=blob_name, finalized_at=None).delete()
+        db.session.commit()
+        release_blob(blob_name)
+        print(f"⚠️  Upload direct rejeté: {blob_name} ({error})")
+        return jsonify({'error': error}), 400
+    
+    try:
+        # Mêmes métadonnées que les uploads passant par l'application
+        backend.set_metadata(blob_name, {
+            'incident_id': str(id),
+            'original_filename': upload['filename'],
+            'upload_date': datetime.utcnow().isoformat(),
+            'uploaded_by': 'direct_upload'
+        })
+        
+        document = IncidentDocument(
+            incident_id=id,
+            filename=upload['filename'],
+            blob_name=blob_name,
+            file_size=properties['size'],
+            content_type=upload['content_type'],
+            uploaded_by='User'
+        )
+        # De deux finalisations concurrentes, une seule passe l'UPDATE conditionnel (ligne verrouillée
+        # jusqu'au commit) ; le document est inséré dans la même transaction
+        if not claim_direct_upload(blob_name):
+            db.session.rollback()
+            return jsonify({'error': 'Upload déjà finalisé'}), 409
+        db.session.add(document)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Erreur lors de la finalisation de l'upload direct {blob_name}: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    print(f"✅ Upload direct finalisé: {blob_name} → document {document.id}")
+    return jsonify(document.to_dict()), 201
+
+@app.route('/api/incidents/search')
+def api_incidents_search():
+    """API REST - Recherche plein texte classée dans les titres et descriptions"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Paramètre q obligatoire'}), 400
+    
+    try:
+        limit = max(1, min(int(request.args.get('limit', SEARCH_MAX_RESULTS)), SEARCH_MAX_RESULTS))
+    except ValueError:
+        return jsonify({'error': 'Paramètre limit invalide'}), 400
+    
+    if not search_index.built:
+        return jsonify({'error': "Index de recherche en cours de construction, réessayer dans un instant"}), \
+            503, {'Retry-After': '1'}
+    
     try:
-        incidents = Incident.query.order_by(Incident.date_incident.desc()).all()
-        return jsonify([incident.to_dict() for incident in incidents])
+        results = search_index.search(query, limit)
+        if not results:
+            return jsonify([])
+        
+        rows = query_incidents_with_counts().filter(Incident.id.in_([i for i, _ in results])).all()
+        incidents = {incident.id: incident for incident in attach_documents_count(rows)}
+        
+        payload = []
+        for incident_id, score in results:
+            incident = incidents.get(incident_id)
+            if incident is None:
+                # Incident supprimé depuis l'indexation
+                search_index.remove_incident(incident_id)
+                continue
+            result = incident.to_dict()
+            result['score'] = round(score, 4)
+            payload.append(result)
+        
+        return jsonify(payload)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -567,13 +4044,20 @@ def api_incidents():
 def api_incident_detail(id):
     """API REST - Détail d'un incident avec ses documents"""
     try:
+        etag = get_incident_etag(id)
+        if etag:
+            cached = not_modified_response(etag)
+            if cached:
+                return cached
+        
         incident = Incident.query.get_or_404(id)
         documents = IncidentDocument.query.filter_by(incident_id=id).all()
+        incident.documents_count = len(documents)
         
         result = incident.to_dict()
         result['documents'] = [doc.to_dict() for doc in documents]
         
-        return jsonify(result)
+        return with_etag(jsonify(result), etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -581,43 +4065,256 @@ def api_incident_detail(id):
 # ROUTES DE DIAGNOSTIC
 # ========================================
 
-@app.route('/health')
-def health_check():
-    """Health check pour monitoring"""
-    try:
-        # Test de connexion base de données
-        db.session.execute(text('SELECT 1'))
+def check_database():
+    """Vérifier la base de données (exécuté par le thread de sonde)"""
+    with app.app_context():
+        try:
+            db.session.execute(text('SELECT 1'))
+        finally:
+            db.session.remove()
+
+def check_storage():
+    """Vérifier l'accès au stockage des documents (exécuté par le thread de sonde)"""
+    get_storage_backend().check(HEALTH_PROBE_TIMEOUT)
+
+class DependencyProber:
+    """Vérifie périodiquement les dépendances en arrière-plan ; les sondes HTTP lisent le dernier résultat"""
+    
+    def __init__(self, checks, interval, timeout):
+        self.checks = checks
+        self.interval = interval
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.results = {name: {'status': 'UNKNOWN', 'latency_ms': None, 'checked_at': None, 'error': None}
+                        for name in checks}
+        self.running = {}
+        self.pid = None
+    
+    def ensure_started(self):
+        """Démarrer le thread de sonde dans ce processus (après un fork, il faut le relancer)"""
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.running = {}
+            self.pid = os.getpid()
+            threading.Thread(target=self.run_forever, name='dependency-prober', daemon=True).start()
+    
+    def run_forever(self):
+        while True:
+            try:
+                self.probe_all()
+            except Exception as e:
+                print(f"❌ Erreur de la sonde de dépendances: {e}")
+            time.sleep(self.interval)
+    
+    def start_check(self, check):
+        """Exécuter une vérification dans un thread démon (un appel bloqué n'empêche pas l'arrêt)"""
+        outcome = {'done': threading.Event(), 'error': None}
         
-        # Test de connexion Azure Storage
-        blob_service_client = create_blob_service_client()
-        if blob_service_client:
-            # Tenter de lister les conteneurs pour vérifier la connexion
+        def target():
             try:
-                containers = list(blob_service_client.list_containers(max_results=1))
-                storage_status = "OK"
-            except:
-                storage_status = "ERROR"
-        else:
-            storage_status = "ERROR"
+                check()
+            except Exception as e:
+                outcome['error'] = e
+            finally:
+                outcome['done'].set()
         
-        return jsonify({
-            'status': 'healthy',
-            'database': 'OK',
-            'storage': storage_status,
-            'timestamp': datetime.utcnow().isoformat()
-        })
-    except Exception as e:
+        threading.Thread(target=target, daemon=True).start()
+        return outcome
+    
+    def probe_all(self):
+        """Lancer toutes les vérifications en parallèle, chacune bornée par le timeout"""
+        started = {}
+        for name, check in self.checks.items():
+            previous = self.running.get(name)
+            if previous and not previous['done'].is_set():
+                # La vérification précédente est toujours bloquée : ne pas en empiler une autre
+                self.record(name, 'TIMEOUT', None, 'Vérification précédente toujours en cours')
+                continue
+            self.running[name] = self.start_check(check)
+            started[name] = (time.perf_counter(), self.running[name])
+        
+        for name, (start, outcome) in started.items():
+            remaining = max(0, self.timeout - (time.perf_counter() - start))
+            if not outcome['done'].wait(remaining):
+                self.record(name, 'TIMEOUT', None, f'Pas de réponse en {self.timeout} s')
+            elif outcome['error']:
+                self.record(name, 'ERROR', (time.perf_counter() - start) * 1000, str(outcome['error']))
+            else:
+                self.record(name, 'OK', (time.perf_counter() - start) * 1000, None)
+    
+    def record(self, name, status, latency_ms, error):
+        self.results[name] = {
+            'status': status,
+            'latency_ms': round(latency_ms, 2) if latency_ms is not None else None,
+            'checked_at': datetime.utcnow().isoformat(),
+            'checked_at_ts': time.time(),
+            'error': error
+        }
+        if status != 'OK':
+            print(f"⚠️  Sonde {name}: {status} {error or ''}")
+    
+    def snapshot(self):
+        """Dernier état connu de chaque dépendance (sans aucune entrée/sortie)"""
+        max_age = self.interval * 3 + self.timeout
+        now = time.time()
+        snapshot = {}
+        for name, result in self.results.items():
+            result = {key: value for key, value in result.items() if key != 'checked_at_ts'}
+            checked_at_ts = self.results[name].get('checked_at_ts')
+            if result['status'] == 'OK' and (checked_at_ts is None or now - checked_at_ts > max_age):
+                # Résultat trop ancien : le thread de sonde ne tourne plus
+                result['status'] = 'STALE'
+            snapshot[name] = result
+        return snapshot
+
+dependency_prober = DependencyProber(
+    {'database': check_database, 'storage': check_storage},
+    HEALTH_PROBE_INTERVAL,
+    HEALTH_PROBE_TIMEOUT
+)
+
+if HEALTH_PROBE_ON_STARTUP:
+    # Premier résultat disponible avant que l'orchestrateur n'interroge /readyz
+    dependency_prober.ensure_started()
+
+@app.before_request
+def start_dependency_prober():
+    """Relancer la sonde dans un worker créé par fork après l'import (gunicorn --preload)"""
+    dependency_prober.ensure_started()
+
+@app.route('/livez')
+def liveness_probe():
+    """Sonde de vivacité : le processus répond (aucune entrée/sortie)"""
+    return jsonify({'status': 'alive'})
+
+@app.route('/readyz')
+def readiness_probe():
+    """Sonde de disponibilité : dernier résultat des vérifications en arrière-plan"""
+    dependencies = dependency_prober.snapshot()
+    ready = all(result['status'] == 'OK' for result in dependencies.values())
+    
+    return jsonify({
+        'status': 'ready' if ready else 'not_ready',
+        'dependencies': dependencies,
+        'timestamp': datetime.utcnow().isoformat()
+    }), 200 if ready else 503
+
+@app.route('/health')
+def health_check():
+    """Health check pour monitoring (résultats de la sonde en arrière-plan)"""
+    dependencies = dependency_prober.snapshot()
+    database = dependencies['database']
+    storage = dependencies['storage']
+    
+    if database['status'] not in ('OK', 'UNKNOWN'):
         return jsonify({
             'status': 'unhealthy',
-            'error': str(e),
+            'error': database['error'] or database['status'],
+            'dependencies': dependencies,
             'timestamp': datetime.utcnow().isoformat()
         }), 500
+    
+    storage_status = storage['status'] if storage['status'] in ('OK', 'UNKNOWN') else 'ERROR'
+    return jsonify({
+        'status': 'healthy',
+        'database': database['status'],
+        'storage': storage_status,
+        'dependencies': dependencies,
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Métriques des requêtes de tous les workers au format Prometheus"""
+    if not METRICS_ENABLED:
+        abort(404)
+    return Response(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/debug/sql')
+@debug_endpoint
+def debug_sql_statements():
+    """Requêtes SQL normalisées les plus coûteuses de ce processus worker"""
+    order = request.args.get('order', 'total')
+    if order not in ('total', 'count', 'max'):
+        return jsonify({'error': "Paramètre 'order' invalide (total, count ou max)"}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), SQL_STATS_MAX_STATEMENTS)
+    
+    statements = statement_stats.top(limit, order)
+    if request.args.get('reset') == '1':
+        statement_stats.reset()
+    
+    return jsonify({
+        'pid': os.getpid(),
+        'order': order,
+        'statements': statements,
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+@app.route('/debug/profile')
+@debug_endpoint
+def debug_profile():
+    """Profil par échantillonnage de ce processus worker, en piles repliées pour flame graph"""
+    seconds = request.args.get('seconds', 10, type=float)
+    hz = request.args.get('hz', PROFILE_SAMPLE_HZ, type=float)
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        return jsonify({'error': f"Paramètre 'seconds' invalide (0 à {PROFILE_MAX_SECONDS:g})"}), 400
+    if not 0 < hz <= PROFILE_MAX_HZ:
+        return jsonify({'error': f"Paramètre 'hz' invalide (0 à {PROFILE_MAX_HZ})"}), 400
+    
+    counts, stats = profiler.sample(seconds, hz,
+                                    by_route=request.args.get('by_route') == '1',
+                                    include_idle=request.args.get('idle') == '1')
+    if counts is None:
+        return jsonify({'error': 'Un profilage est déjà en cours dans ce processus'}), 409
+    
+    print(f"🔬 Profil de {stats['duration']:.1f} s: {stats['samples']} échantillons "
+          f"({stats['rate']:.0f} Hz, surcoût {stats['overhead']:.1%})")
+    response = Response(render_collapsed_stacks(counts), content_type='text/plain; charset=utf-8')
+    response.headers['X-Profile-Pid'] = str(os.getpid())
+    response.headers['X-Profile-Samples'] = str(stats['samples'])
+    response.headers['X-Profile-Duration'] = f"{stats['duration']:.3f}"
+    response.headers['X-Profile-Rate'] = f"{stats['rate']:.1f}"
+    response.headers['X-Profile-Overhead'] = f"{stats['overhead']:.4f}"
+    return response
+
+@app.route('/db-pool')
+def db_pool_stats():
+    """Statistiques du pool de connexions SQL de ce processus worker"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'pool': get_pool_stats(),
+            'settings': {
+                'pool_size': AZURE_SQL_POOL_SIZE,
+                'max_overflow': AZURE_SQL_MAX_OVERFLOW,
+                'pool_timeout': AZURE_SQL_POOL_TIMEOUT,
+                'pool_recycle': AZURE_SQL_POOL_RECYCLE,
+                'pool_pre_ping': AZURE_SQL_POOL_PRE_PING
+            },
+            'timestamp': datetime.utcnow().isoformat()
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 500
 
 @app.route('/storage-test')
 def storage_test():
     """Test de la connexion Azure Storage"""
     try:
-        blob_service_client = create_blob_service_client()
+        # Backends locaux : vérification et paramètres de simulation
+        if AZURE_STORAGE_MODE != 'azure':
+            backend = get_storage_backend()
+            backend.check(HEALTH_PROBE_TIMEOUT)
+            return jsonify({
+                'status': 'success',
+                'backend': backend.name,
+                'settings': backend.describe(),
+                'timestamp': datetime.utcnow().isoformat()
+            })
+        
+        blob_service_client = get_blob_service_client()
         if not blob_service_client:
             return jsonify({'error': 'Impossible de créer le client Blob Storage'}), 500
         
@@ -655,6 +4352,11 @@ def init_database():
         # Créer les tables si elles n'existent pas
         db.create_all()
         
+        # Créer les index ajoutés après la création initiale des tables
+        for table in (Incident.__table__, IncidentDocument.__table__):
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
+        
         # Vérifier si la table incidents contient des données
         incidents_count = Incident.query.count()
         documents_count = IncidentDocument.query.count()
@@ -692,13 +4394,19 @@ if __name__ == '__main__':
     print(f"👤 Utilisateur: {AZURE_SQL_USERNAME}")
     print(f"📦 Storage Account: {AZURE_STORAGE_ACCOUNT_NAME}")
     print(f"🗂️  Container: {AZURE_STORAGE_CONTAINER_NAME}")
+    print(f"🗄️  Backend de stockage: {AZURE_STORAGE_MODE}")
     print("=" * 70)
     print("📋 Routes disponibles:")
     print("   📊 / - Liste des incidents avec documents")
     print("   ➕ /ajouter - Ajouter un incident avec fichiers")
     print("   🔍 /incident/<id> - Détail incident et téléchargements")
     print("   📡 /api/incidents - API REST avec infos documents")
-    print("   🔧 /health - Health check (DB + Storage)")
+    print("   🔧 /health - Health check (DB + Storage, résultat de la sonde)")
+    print("   💓 /livez, /readyz - Sondes de vivacité et de disponibilité")
+    print("   🏊 /db-pool - Statistiques du pool de connexions SQL")
+    print("   📈 /metrics - Latences et débit par route (format Prometheus)")
+    print("   🐢 /debug/sql - Requêtes SQL les plus coûteuses (DEBUG_ENDPOINTS_ENABLED)")
+    print("   🔬 /debug/profile?seconds=N - Piles échantillonnées pour flame graph (DEBUG_ENDPOINTS_ENABLED)")
     print("   🧪 /storage-test - Test Azure Storage")
     print("=" * 70)
     
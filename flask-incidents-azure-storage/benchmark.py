@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks des chemins critiques (incidents et documents)
+=============================================================
+Exécute l'application sur SQLite et le backend de stockage local, mesure les
+routes et fonctions les plus sollicitées et écrit les résultats en JSON pour
+comparer deux commits.
+
+Exemples :
+    python benchmark.py --output bench.json
+    python benchmark.py --quick --compare bench.json --threshold 0.15
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+WORK_DIR = tempfile.mkdtemp(prefix='incidents-bench-')
+
+# L'application lit sa configuration à l'import : backend local et répertoires temporaires
+os.environ['AZURE_STORAGE_MODE'] = 'local'
+os.environ['LOCAL_STORAGE_PATH'] = os.path.join(WORK_DIR, 'storage')
+os.environ['DOCUMENT_CACHE_DIR'] = os.path.join(WORK_DIR, 'cache')
+# Sonde démarrée à la première requête, une fois la base SQLite configurée
+os.environ['HEALTH_PROBE_ON_STARTUP'] = 'False'
+
+SEVERITES = ['Critique', 'Élevée', 'Moyenne', 'Faible']
+DOWNLOAD_SIZES = [
+    ('1KB', 1024),
+    ('64KB', 64 * 1024),
+    ('1MB', 1024 * 1024),
+    ('8MB', 8 * 1024 * 1024)
+]
+SAMPLE_FILENAMES = [
+    'rapport.pdf', 'capture écran.PNG', 'config-routeur.txt', 'export.xlsx',
+    'trace.log', 'archive.tar.gz', 'script.exe', 'sans_extension', 'données.csv', 'notes.md'
+]
+
+def percentile(sorted_values, fraction):
+    """Percentile par rang le plus proche d'une liste triée"""
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def run_benchmark(name, func, iterations, batch=1):
+    """Mesurer func sur iterations exécutions (après échauffement) et renvoyer les statistiques en µs"""
+    for _ in range(max(1, iterations // 10)):
+        func()
+    
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        func()
+        timings.append((time.perf_counter_ns() - start) / 1000 / batch)
+    
+    timings.sort()
+    mean = statistics.fmean(timings)
+    return {
+        'name': name,
+        'iterations': iterations,
+        'batch': batch,
+        'unit': 'us',
+        'min': round(timings[0], 2),
+        'median': round(statistics.median(timings), 2),
+        'mean': round(mean, 2),
+        'p95': round(percentile(timings, 0.95), 2),
+        'p99': round(percentile(timings, 0.99), 2),
+        'max': round(timings[-1], 2),
+        'stdev': round(statistics.stdev(timings), 2) if len(timings) > 1 else 0.0,
+        'ops_per_sec': round(1e6 / mean, 1) if mean else None
+    }
+
+def expect_status(response, *statuses):
+    """Vérifier le code HTTP pour ne pas mesurer une page d'erreur"""
+    if response.status_code not in statuses:
+        raise AssertionError(f"{response.request.path}: HTTP {response.status_code} (attendu {statuses})")
+    return response
+
+def seed_database(app_module, incidents_count, documents_per_incident):
+    """Créer des incidents et des documents (blobs locaux réels) de démonstration"""
+    db = app_module.db
+    incidents = []
+    for i in range(incidents_count):
+        incidents.append(app_module.Incident(
+            titre=f"Incident de test {i} - panne réseau site {i % 37}",
+            description=f"Perte de connectivité sur le commutateur {i % 11}.\nRedémarrage planifié.",
+            severite=SEVERITES[i % len(SEVERITES)]
+        ))
+    db.session.add_all(incidents)
+    db.session.commit()
+    
+    documents = []
+    for incident in incidents[:max(1, incidents_count // 5)]:
+        for j in range(documents_per_incident):
+            filename = f"journal_{j}.log"
+            blob_name, size = app_module.upload_file_to_blob(io.BytesIO(b'x' * 2048), filename, incident.id)
+            documents.append(app_module.IncidentDocument(
+                incident_id=incident.id,
+                filename=filename,
+                blob_name=blob_name,
+                file_size=size,
+                content_type='text/plain'
+            ))
+    app_module.save_uploaded_documents(documents)
+    return incidents[0].id
+
+def create_document(app_module, incident_id, size):
+    """Uploader un document de la taille donnée et renvoyer son identifiant"""
+    blob_name, file_size = app_module.upload_file_to_blob(io.BytesIO(os.urandom(size)), 'bench.bin', incident_id)
+    document = app_module.IncidentDocument(
+        incident_id=incident_id,
+        filename='bench.bin',
+        blob_name=blob_name,
+        file_size=file_size,
+        content_type='application/octet-stream'
+    )
+    app_module.db.session.add(document)
+    app_module.db.session.commit()
+    return document.id
+
+def run_suite(app_module, args):
+    """Exécuter tous les benchmarks et renvoyer la liste des résultats"""
+    client = app_module.app.test_client()
+    scale = 10 if args.quick else 1
+    
+    def iterations(count):
+        return max(3, count // scale)
+    
+    incident_id = seed_database(app_module, args.incidents, 3)
+    results = []
+    
+    def bench(name, func, count, batch=1):
+        if args.filter and args.filter not in name:
+            return
+        results.append(run_benchmark(name, func, iterations(count), batch))
+        print(f"   ⏱️  {name}: médiane {results[-1]['median']:.1f} µs", file=sys.stderr)
+    
+    # Routes de lecture
+    bench('index', lambda: expect_status(client.get('/'), 200), 200)
+    bench('api_incidents', lambda: expect_status(client.get('/api/incidents'), 200), 200)
+    bench('detail_incident', lambda: expect_status(client.get(f'/incident/{incident_id}'), 200), 500)
+    
+    # Création d'incident avec 0, 1 et 8 pièces jointes (contenus aléatoires : aucun n'est dédupliqué)
+    for attachments in (0, 1, 8):
+        def add_incident(attachments=attachments):
+            data = {
+                'titre': 'Incident benchmark',
+                'description': 'Créé par benchmark.py',
+                'severite': 'Moyenne',
+                'documents': [(io.BytesIO(os.urandom(32 * 1024)), f'piece_{n}.txt') for n in range(attachments)]
+            }
+            expect_status(client.post('/ajouter-incident', data=data, content_type='multipart/form-data'), 302)
+        bench(f'ajouter_incident[{attachments}_fichiers]', add_incident, 100)
+    
+    # Téléchargements complets à plusieurs tailles
+    for label, size in DOWNLOAD_SIZES:
+        doc_id = create_document(app_module, incident_id, size)
+        
+        def download(doc_id=doc_id, size=size):
+            response = expect_status(client.get(f'/document/{doc_id}/download'), 200)
+            if len(response.data) != size:
+                raise AssertionError(f"Téléchargement tronqué: {len(response.data)} / {size} octets")
+        bench(f'download_document[{label}]', download, max(10, min(200, 64 * 1024 * 1024 // size)))
+    
+    # Sérialisation d'une page d'incidents
+    with app_module.app.test_request_context():
+        page = app_module.attach_documents_count(
+            app_module.query_incidents_with_counts().limit(app_module.INCIDENTS_PAGE_SIZE).all()
+        )
+        bench('to_dict[page]', lambda: [incident.to_dict() for incident in page], 500, batch=len(page))
+    
+    # Fonctions utilitaires (mesurées par lot de noms de fichiers)
+    bench('allowed_file', lambda: [app_module.allowed_file(name) for name in SAMPLE_FILENAMES],
+          2000, batch=len(SAMPLE_FILENAMES))
+    
+    # Empreinte SHA-256 calculée à chaque upload (déduplication)
+    payload = io.BytesIO(os.urandom(1024 * 1024))
+    bench('compute_content_hash[1MB]', lambda: app_module.compute_content_hash(payload), 200)
+    
+    return results
+
+def git_revision():
+    """Commit courant (None hors d'un dépôt git)"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_results(results, baseline_path, threshold):
+    """Comparer les médianes à un fichier de référence et renvoyer les régressions"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r['name']: r for r in json.load(f)['results']}
+    
+    regressions = []
+    print(f"\n📊 Comparaison avec {baseline_path} (seuil {threshold:.0%})", file=sys.stderr)
+    for result in results:
+        reference = baseline.get(result['name'])
+        if not reference or not reference['median']:
+            continue
+        ratio = result['median'] / reference['median']
+        status = '❌' if ratio > 1 + threshold else ('🚀' if ratio < 1 - threshold else '✅')
+        print(f"   {status} {result['name']}: {reference['median']:.1f} → {result['median']:.1f} µs ({ratio - 1:+.1%})",
+              file=sys.stderr)
+        if ratio > 1 + threshold:
+            regressions.append(result['name'])
+    
+    # Cibles renommées ou supprimées (ex. generate_blob_name, remplacée par compute_content_hash[1MB]
+    # avec l'adressage par contenu) : signalées plutôt qu'ignorées
+    names = {result['name'] for result in results}
+    for name in sorted(set(baseline) - names):
+        print(f"   ⚠️  {name}: absent de cette exécution (cible supprimée ou filtrée)", file=sys.stderr)
+    for name in sorted(names - set(baseline)):
+        print(f"   🆕 {name}: absent de la référence", file=sys.stderr)
+    return regressions
+
+def main():
+    """Lancer la suite et écrire le rapport JSON"""
+    parser = argparse.ArgumentParser(description="Microbenchmarks Flask Incidents Azure Storage")
+    parser.add_argument('--output', default='-', help="Fichier JSON de sortie ('-' pour la sortie standard)")
+    parser.add_argument('--compare', help="Fichier JSON de référence à comparer")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Régression tolérée sur la médiane (0.10 = 10 %%)")
+    parser.add_argument('--incidents', type=int, default=500, help="Nombre d'incidents créés avant les mesures")
+    parser.add_argument('--filter', help="N'exécuter que les benchmarks dont le nom contient ce texte")
+    parser.add_argument('--quick', action='store_true', help="Dix fois moins d'itérations")
+    parser.add_argument('--document-cache', action='store_true', help="Activer le cache disque des documents")
+    args = parser.parse_args()
+    
+    if not args.document_cache:
+        os.environ['DOCUMENT_CACHE_MAX_SIZE'] = '0'
+    
+    print("🚀 Microbenchmarks - Flask Incidents Azure Storage", file=sys.stderr)
+    print(f"📁 Répertoire de travail: {WORK_DIR}", file=sys.stderr)
+    
+    # Les messages de l'application sont écartés pour ne pas polluer le rapport
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            sys.path.insert(0, SCRIPT_DIR)
+            import app as app_module
+            
+            app_module.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(WORK_DIR, 'bench.db')
+            # Options du pool Azure SQL (pyodbc) inapplicables à SQLite
+            app_module.app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+            app_module.app.config['TESTING'] = True
+            
+            with app_module.app.app_context():
+                app_module.db.create_all()
+                results = run_suite(app_module, args)
+                app_module.db.engine.dispose()
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+    
+    report = {
+        'meta': {
+            'commit': git_revision(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': 'sqlite',
+            'storage_backend': 'local',
+            'document_cache': args.document_cache,
+            'incidents': args.incidents,
+            'quick': args.quick
+        },
+        'results': results
+    }
+    
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"✅ Résultats écrits dans {args.output}", file=sys.stderr)
+    
+    if args.compare:
+        regressions = compare_results(results, args.compare, args.threshold)
+        if regressions:
+            print(f"❌ Régressions: {', '.join(regressions)}", file=sys.stderr)
+            return False
+    
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
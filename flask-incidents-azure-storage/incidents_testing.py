@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Environnement commun des tests automatisés (sans Azure)
+=======================================================
+Importe l'application avec une base SQLite temporaire et le backend de stockage
+en mémoire, comme benchmark.py : aucun service externe n'est nécessaire.
+À importer avant app dans chaque fichier test_*.py :
+
+    from incidents_testing import app_module, ...
+"""
+
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+WORK_DIR = tempfile.mkdtemp(prefix='incidents-tests-')
+
+# L'application lit sa configuration à l'import
+os.environ['AZURE_STORAGE_MODE'] = 'memory'
+os.environ['DOCUMENT_CACHE_DIR'] = os.path.join(WORK_DIR, 'cache')
+os.environ['METRICS_DIR'] = os.path.join(WORK_DIR, 'metrics')
+# Sonde démarrée à la première requête, une fois la base SQLite configurée
+os.environ['HEALTH_PROBE_ON_STARTUP'] = 'False'
+
+sys.path.insert(0, SCRIPT_DIR)
+import app as app_module
+
+# Fichier plutôt que :memory: : les threads d'arrière-plan (index de recherche) ont leur propre connexion
+app_module.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(WORK_DIR, 'incidents.db')
+# Options du pool Azure SQL (pyodbc) inapplicables à SQLite
+app_module.app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+app_module.app.config['TESTING'] = True
+app_context = app_module.app.app_context()
+app_context.push()
+app_module.db.create_all()
+
+CHUNK_SIZE = 1024
+app_module.AZURE_STORAGE_DOWNLOAD_CHUNK_SIZE = CHUNK_SIZE
+
+class settings:
+    """Modifier des constantes de configuration du module le temps d'un test"""
+    
+    def __init__(self, **values):
+        self.values = values
+    
+    def __enter__(self):
+        self.original = {name: getattr(app_module, name) for name in self.values}
+        for name, value in self.values.items():
+            setattr(app_module, name, value)
+    
+    def __exit__(self, *exc_info):
+        for name, value in self.original.items():
+            setattr(app_module, name, value)
+
+class CountingBackend:
+    """Compter les lectures du backend mémoire"""
+    
+    def __init__(self, backend):
+        self.backend = backend
+        self.downloads = []
+    
+    def __enter__(self):
+        self.original = self.backend.download
+        
+        def download(blob_name, offset=None, length=None):
+            self.downloads.append((blob_name, offset, length))
+            return self.original(blob_name, offset=offset, length=length)
+        self.backend.download = download
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.backend.download = self.original
+
+class RecordingBlobClient:
+    """BlobClient factice : enregistre les PUT, les blocs reçus et le nombre de blocs envoyés simultanément"""
+    
+    def __init__(self, stage_delay=0, fail_block=None):
+        self.stage_delay = stage_delay
+        self.fail_block = fail_block
+        self.lock = threading.Lock()
+        self.single_puts = []
+        self.blocks = {}
+        self.block_ids = None
+        self.committed = None
+        self.staging = 0
+        self.max_staging = 0
+    
+    def upload_blob(self, data, overwrite=False, metadata=None):
+        self.single_puts.append(bytes(data))
+    
+    def stage_block(self, block_id, data, length=None):
+        assert length == len(data)
+        with self.lock:
+            self.staging += 1
+            self.max_staging = max(self.max_staging, self.staging)
+        try:
+            time.sleep(self.stage_delay)
+            if block_id == self.fail_block:
+                raise IOError(f"Échec simulé du bloc {block_id}")
+            self.blocks[block_id] = bytes(data)
+        finally:
+            with self.lock:
+                self.staging -= 1
+    
+    def commit_block_list(self, block_ids, metadata=None):
+        self.block_ids = list(block_ids)
+        self.committed = b''.join(self.blocks[block_id] for block_id in block_ids)
+
+def store_blob(blob_name, size):
+    """Créer un blob de size octets dans le backend mémoire et renvoyer son contenu"""
+    content = os.urandom(size)
+    app_module.get_storage_backend().upload(blob_name, io.BytesIO(content), {})
+    return content
+
+def stored_blobs():
+    return app_module.get_storage_backend().blobs
+
+def create_incident(titre='Incident de test', severite='Faible'):
+    incident = app_module.Incident(titre=titre, description='Test', severite=severite)
+    app_module.db.session.add(incident)
+    app_module.db.session.commit()
+    return incident.id
+
+def attach(client, incident_id, content, filename='trace.log'):
+    """Attacher un fichier par le formulaire et renvoyer le document créé"""
+    response = client.post(
+        f'/incident/{incident_id}/documents',
+        data={'documents': [(io.BytesIO(content), filename)]},
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 302
+    return app_module.IncidentDocument.query.filter_by(incident_id=incident_id) \
+        .order_by(app_module.IncidentDocument.id.desc()).first()
+
+def wait_for(predicate, timeout=10):
+    """Attendre qu'une condition (thread d'arrière-plan) devienne vraie"""
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+def raises(exception, func, *args, **kwargs):
+    """Indiquer si l'appel lève exception"""
+    try:
+        func(*args, **kwargs)
+    except exception:
+        return True
+    return False
+
+def run_tests(namespace):
+    """Exécuter les fonctions test_* d'un module sans pytest"""
+    tests = [(name, func) for name, func in sorted(namespace.items()) if name.startswith('test_') and callable(func)]
+    failures = 0
+    for name, func in tests:
+        try:
+            func()
+            print(f"✅ {name}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {name}: {e!r}")
+    print(f"\n🎯 {len(tests) - failures}/{len(tests)} tests passés")
+    return failures == 0
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests du client Blob Storage partagé (sans Azure)
+=================================================
+Un client par processus, recréé à expiration ou après invalidation, l'ancien étant fermé.
+
+    python -m pytest -q test_blob_client.py
+"""
+
+import sys
+import threading
+
+from incidents_testing import app_module, run_tests
+
+class FakeSession:
+    def __init__(self):
+        self.closed = False
+    
+    def close(self):
+        self.closed = True
+
+class FakeTransport:
+    def __init__(self):
+        self.session = FakeSession()
+
+class FakeClient:
+    def __init__(self, transport):
+        self.transport = transport
+        self.closed = False
+    
+    def close(self):
+        self.closed = True
+
+class fake_blob_clients:
+    """Remplacer la création du client et du transport Azure le temps d'un test"""
+    
+    def __enter__(self):
+        self.created = []
+        self.originals = (app_module.create_blob_service_client, app_module.create_storage_transport)
+        
+        def create_client(transport=None):
+            client = FakeClient(transport)
+            self.created.append(client)
+            return client
+        app_module.create_blob_service_client = create_client
+        app_module.create_storage_transport = FakeTransport
+        app_module.invalidate_blob_service_client()
+        return self
+    
+    def __exit__(self, *exc_info):
+        app_module.invalidate_blob_service_client()
+        app_module.create_blob_service_client, app_module.create_storage_transport = self.originals
+
+def test_client_is_shared_by_threads():
+    with fake_blob_clients() as clients:
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(app_module.get_blob_service_client()))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(clients.created) == 1
+        assert all(client is clients.created[0] for client in results)
+
+def test_invalidated_client_and_session_are_closed():
+    with fake_blob_clients() as clients:
+        first = app_module.get_blob_service_client()
+        app_module.invalidate_blob_service_client()
+        assert first.closed and first.transport.session.closed
+        
+        second = app_module.get_blob_service_client()
+        assert second is not first and not second.transport.session.closed
+
+def test_expired_client_is_replaced_and_closed():
+    with fake_blob_clients():
+        first = app_module.get_blob_service_client()
+        app_module._blob_client_registry['expires_at'] = 0
+        second = app_module.get_blob_service_client()
+        assert second is not first
+        assert first.closed and first.transport.session.closed
+        assert not second.closed
+
+def test_client_inherited_from_parent_process_is_not_closed():
+    """Après un fork, le client du parent est recréé sans fermer les connexions qu'il partage avec lui"""
+    with fake_blob_clients():
+        inherited = app_module.get_blob_service_client()
+        app_module._blob_client_registry['pid'] = -1
+        assert app_module.get_blob_service_client() is not inherited
+        assert not inherited.closed and not inherited.transport.session.closed
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
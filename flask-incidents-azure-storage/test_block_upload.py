@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests de l'upload par blocs vers Blob Storage (sans Azure)
+==========================================================
+Seuil du PUT unique, découpage en blocs, parallélisme borné et erreurs de staging.
+
+    python -m pytest -q test_block_upload.py
+"""
+
+import io
+import os
+import sys
+
+from incidents_testing import app_module, RecordingBlobClient, raises, run_tests
+
+SINGLE_PUT_SIZE = 4096
+BLOCK_SIZE = 1024
+
+class block_sizes:
+    """Réduire max_single_put_size / max_block_size le temps d'un test"""
+    
+    def __init__(self, concurrency=None):
+        self.concurrency = concurrency
+    
+    def __enter__(self):
+        self.original = (app_module.AZURE_STORAGE_MAX_SINGLE_PUT_SIZE, app_module.AZURE_STORAGE_MAX_BLOCK_SIZE,
+                         app_module.AZURE_STORAGE_UPLOAD_CONCURRENCY)
+        app_module.AZURE_STORAGE_MAX_SINGLE_PUT_SIZE = SINGLE_PUT_SIZE
+        app_module.AZURE_STORAGE_MAX_BLOCK_SIZE = BLOCK_SIZE
+        if self.concurrency:
+            app_module.AZURE_STORAGE_UPLOAD_CONCURRENCY = self.concurrency
+    
+    def __exit__(self, *exc_info):
+        (app_module.AZURE_STORAGE_MAX_SINGLE_PUT_SIZE, app_module.AZURE_STORAGE_MAX_BLOCK_SIZE,
+         app_module.AZURE_STORAGE_UPLOAD_CONCURRENCY) = self.original
+
+def upload(size, **client_options):
+    content = os.urandom(size)
+    blob_client = RecordingBlobClient(**client_options)
+    stored_size = app_module.upload_stream_in_blocks(blob_client, io.BytesIO(content), {'sha256': 'x'})
+    return content, blob_client, stored_size
+
+def test_file_up_to_single_put_size_is_sent_in_one_put():
+    with block_sizes():
+        for size in (0, 1, SINGLE_PUT_SIZE):
+            content, blob_client, stored_size = upload(size)
+            assert blob_client.single_puts == [content]
+            assert blob_client.blocks == {} and blob_client.block_ids is None
+            assert stored_size == size
+
+def test_file_above_single_put_size_is_staged_in_blocks():
+    """Un octet de plus que le seuil : blocs pleins, puis un dernier bloc d'un octet"""
+    with block_sizes():
+        content, blob_client, stored_size = upload(SINGLE_PUT_SIZE + 1)
+    assert not blob_client.single_puts
+    assert blob_client.block_ids == ['00000000', '00000001', '00000002', '00000003', '00000004']
+    assert [len(blob_client.blocks[block_id]) for block_id in blob_client.block_ids] == [BLOCK_SIZE] * 4 + [1]
+    assert blob_client.committed == content
+    assert stored_size == len(content)
+
+def test_exact_multiple_of_block_size_has_no_empty_block():
+    with block_sizes():
+        content, blob_client, stored_size = upload(8 * BLOCK_SIZE)
+    assert len(blob_client.block_ids) == 8
+    assert all(len(data) == BLOCK_SIZE for data in blob_client.blocks.values())
+    assert blob_client.committed == content
+
+def test_blocks_are_staged_in_parallel_within_the_concurrency_limit():
+    with block_sizes(concurrency=3):
+        content, blob_client, _ = upload(20 * BLOCK_SIZE, stage_delay=0.02)
+    assert blob_client.committed == content
+    assert 1 < blob_client.max_staging <= 3
+
+def test_staging_error_is_raised_without_commit():
+    """Un bloc en échec : l'erreur remonte et la liste de blocs n'est jamais validée"""
+    with block_sizes(concurrency=2):
+        blob_client = RecordingBlobClient(fail_block='00000002')
+        stream = io.BytesIO(os.urandom(20 * BLOCK_SIZE))
+        assert raises(IOError, app_module.upload_stream_in_blocks, blob_client, stream, {})
+    assert blob_client.block_ids is None
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Tests du cache de disponibilité du conteneur (sans Azure)
+=========================================================
+Vérification une fois par processus, upload en un seul PUT ensuite,
+nouvelle vérification après ContainerNotFound.
+
+    python -m pytest -q test_container_cache.py
+"""
+
+import io
+import sys
+
+from incidents_testing import app_module, RecordingBlobClient, run_tests
+
+def container_not_found():
+    error = app_module.ResourceNotFoundError('The specified container does not exist.')
+    error.error_code = app_module.StorageErrorCode.CONTAINER_NOT_FOUND
+    return error
+
+class FakeContainerClient:
+    def __init__(self, exists):
+        self.exists_value = exists
+        self.exists_calls = 0
+        self.create_calls = 0
+    
+    def exists(self):
+        self.exists_calls += 1
+        return self.exists_value
+    
+    def create_container(self):
+        self.create_calls += 1
+        self.exists_value = True
+
+class FakeServiceClient:
+    """Client Blob Storage factice : un conteneur, des blobs enregistrés, des erreurs d'upload programmées"""
+    
+    def __init__(self, exists=True):
+        self.container = FakeContainerClient(exists)
+        self.blob_client = RecordingBlobClient()
+        self.upload_errors = []
+        self.puts = 0
+    
+    def get_container_client(self, name):
+        assert name == app_module.AZURE_STORAGE_CONTAINER_NAME
+        return self.container
+    
+    def get_blob_client(self, container, blob):
+        service = self
+        
+        class BlobClient:
+            def upload_blob(self, data, overwrite=False, metadata=None):
+                service.puts += 1
+                if service.upload_errors:
+                    raise service.upload_errors.pop(0)
+                service.blob_client.upload_blob(data, overwrite=overwrite, metadata=metadata)
+        return BlobClient()
+
+class azure_backend:
+    """Backend Azure branché sur un client factice, état du conteneur remis à zéro"""
+    
+    def __init__(self, service_client):
+        self.service_client = service_client
+    
+    def __enter__(self):
+        self.original = app_module.get_blob_service_client
+        app_module.get_blob_service_client = lambda: self.service_client
+        app_module.reset_container_state()
+        return app_module.AzureBlobStorageBackend()
+    
+    def __exit__(self, *exc_info):
+        app_module.get_blob_service_client = self.original
+        app_module.reset_container_state()
+
+def test_container_is_checked_once_per_process():
+    service = FakeServiceClient(exists=False)
+    with azure_backend(service) as backend:
+        for index in range(5):
+            backend.upload(f'tests/{index}', io.BytesIO(b'contenu'), {})
+    assert service.container.exists_calls == 1
+    assert service.container.create_calls == 1
+    # Chemin courant : un seul PUT par fichier
+    assert service.puts == 5
+    assert len(service.blob_client.single_puts) == 5
+
+def test_container_not_found_triggers_a_new_check_and_retry():
+    """Conteneur supprimé depuis la vérification : recréé puis upload réessayé une fois"""
+    service = FakeServiceClient()
+    with azure_backend(service) as backend:
+        backend.upload('tests/avant', io.BytesIO(b'a'), {})
+        service.container.exists_value = False
+        service.upload_errors.append(container_not_found())
+        assert backend.upload('tests/apres', io.BytesIO(b'b'), {}) == 1
+    assert service.container.exists_calls == 2
+    assert service.container.create_calls == 1
+    assert service.puts == 3
+
+def test_other_not_found_errors_are_not_retried():
+    service = FakeServiceClient()
+    with azure_backend(service) as backend:
+        service.upload_errors.append(app_module.ResourceNotFoundError('Blob introuvable'))
+        try:
+            backend.upload('tests/erreur', io.BytesIO(b'x'), {})
+            assert False, 'ResourceNotFoundError attendue'
+        except app_module.ResourceNotFoundError:
+            pass
+    assert service.container.exists_calls == 1
+    assert service.puts == 1
+
+def test_failed_check_does_not_block_uploads():
+    """Droits insuffisants pour vérifier le conteneur (SAS) : l'upload est tenté, sans nouvelle vérification"""
+    service = FakeServiceClient()
+    
+    def forbidden():
+        service.container.exists_calls += 1
+        raise app_module.AzureError('AuthorizationPermissionMismatch')
+    service.container.exists = forbidden
+    with azure_backend(service) as backend:
+        backend.upload('tests/sas-1', io.BytesIO(b'x'), {})
+        backend.upload('tests/sas-2', io.BytesIO(b'y'), {})
+    assert service.container.exists_calls == 1
+    assert service.puts == 2
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
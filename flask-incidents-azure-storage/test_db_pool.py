@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests du pool de connexions SQL (sans Azure SQL)
+================================================
+Options passées au moteur, mesure des attentes et délai d'attente dépassé.
+
+    python -m pytest -q test_db_pool.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+
+from incidents_testing import app_module, WORK_DIR, raises, run_tests
+
+def create_test_engine(name, **options):
+    """Moteur SQLite fichier avec le pool instrumenté de l'application"""
+    return create_engine('sqlite:///' + os.path.join(WORK_DIR, name),
+                         poolclass=app_module.InstrumentedQueuePool, **options)
+
+def test_engine_options_are_configured_for_azure_sql():
+    options = app_module.create_engine_options()
+    assert options['poolclass'] is app_module.InstrumentedQueuePool
+    assert options['pool_size'] == app_module.AZURE_SQL_POOL_SIZE
+    assert options['pool_recycle'] == app_module.AZURE_SQL_POOL_RECYCLE
+    assert options['fast_executemany'] == app_module.AZURE_SQL_FAST_EXECUTEMANY
+
+def test_pool_timeout_is_counted():
+    """Pool épuisé : l'emprunt suivant échoue après pool_timeout et est compté comme dépassement"""
+    engine = create_test_engine('pool-timeout.db', pool_size=1, max_overflow=0, pool_timeout=0.1)
+    before = app_module.pool_wait_stats.snapshot()
+    held = engine.connect()
+    try:
+        start = time.perf_counter()
+        assert raises(app_module.PoolTimeoutError, engine.connect)
+        assert time.perf_counter() - start >= 0.1
+    finally:
+        held.close()
+        engine.dispose()
+    after = app_module.pool_wait_stats.snapshot()
+    assert after['checkouts'] == before['checkouts'] + 1
+    assert after['timeouts'] == before['timeouts'] + 1
+    assert after['wait_max_ms'] >= 100
+
+def test_pool_wait_is_measured():
+    """Un emprunt qui attend la restitution d'une connexion est mesuré"""
+    engine = create_test_engine('pool-wait.db', pool_size=1, max_overflow=0, pool_timeout=5)
+    held = engine.connect()
+    release = threading.Timer(0.2, held.close)
+    release.start()
+    try:
+        with engine.connect() as connection:
+            assert connection.execute(text('SELECT 1')).scalar() == 1
+    finally:
+        release.join()
+        engine.dispose()
+    assert app_module.pool_wait_stats.snapshot()['wait_max_ms'] >= 150
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Tests de l'upload direct vers le stockage (sans Azure)
+======================================================
+Finalisation, rejet des uploads non conformes et purge des uploads abandonnés.
+
+    python -m pytest -q test_direct_upload.py
+"""
+
+import io
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+from incidents_testing import app_module, WORK_DIR, stored_blobs, create_incident, run_tests
+
+def direct_upload(client, incident_id, content, filename='rapport.txt', size=None, send=True):
+    """Demander une URL d'upload direct (taille annoncée size), y envoyer content et renvoyer (blob_name, jeton)"""
+    size = len(content) if size is None else size
+    response = client.post(f'/api/incidents/{incident_id}/uploads',
+                           json={'filename': filename, 'size': size, 'content_type': 'text/plain'})
+    assert response.status_code == 201
+    grant = response.get_json()
+    if send:
+        assert client.put(grant['upload_url'], data=content, headers=grant['headers']).status_code == 201
+    blob_name = app_module.direct_upload_serializer().loads(grant['upload_token'])['blob_name']
+    return blob_name, grant['upload_token']
+
+def finalize(client, incident_id, token):
+    return client.post(f'/api/incidents/{incident_id}/uploads/finalize', json={'upload_token': token})
+
+def test_memory_backend_direct_upload_round_trip():
+    """Parcours complet sans Azurite : URL d'upload servie par l'application, PUT client, finalisation"""
+    client = app_module.app.test_client()
+    incident_id = create_incident()
+    content = b'ligne de trace\n' * 200
+    response = client.post(f'/api/incidents/{incident_id}/uploads',
+                           json={'filename': 'trace.txt', 'size': len(content), 'content_type': 'text/plain'})
+    assert response.status_code == 201
+    grant = response.get_json()
+    
+    assert client.put(grant['upload_url'], data=content, headers=grant['headers']).status_code == 201
+    # Création seule, comme la permission create du SAS
+    assert client.put(grant['upload_url'], data=b'autre', headers=grant['headers']).status_code == 409
+    
+    response = finalize(client, incident_id, grant['upload_token'])
+    assert response.status_code == 201
+    download = client.get(f"/document/{response.get_json()['id']}/download")
+    assert download.status_code == 200
+    assert download.data == content
+
+def test_memory_backend_upload_url_checks_expiry_and_headers():
+    client = app_module.app.test_client()
+    backend = app_module.get_storage_backend()
+    with app_module.app.test_request_context():
+        expired = backend.create_upload_url('uploads/expire/a.txt', datetime.utcnow() - timedelta(seconds=1))
+        valid = backend.create_upload_url('uploads/valide/a.txt', datetime.utcnow() + timedelta(minutes=5))
+    headers = {'x-ms-blob-type': 'BlockBlob', 'Content-Type': 'text/plain'}
+    assert client.put(expired, data=b'x', headers=headers).status_code == 403
+    assert client.put(valid + 'x', data=b'x', headers=headers).status_code == 403
+    assert client.put(valid, data=b'x', headers={'Content-Type': 'text/plain'}).status_code == 400
+    assert 'uploads/valide/a.txt' not in stored_blobs()
+
+def test_direct_upload_is_finalized_once():
+    """Deux finalisations du même upload : un seul document"""
+    client = app_module.app.test_client()
+    incident_id = create_incident()
+    blob_name, token = direct_upload(client, incident_id, os.urandom(2048))
+    
+    response = finalize(client, incident_id, token)
+    assert response.status_code == 201
+    assert response.get_json()['file_size'] == 2048
+    assert finalize(client, incident_id, token).status_code == 409
+    assert app_module.count_blob_references(blob_name) == 1
+
+def test_direct_upload_claim_is_atomic():
+    """Finalisation concurrente : les deux requêtes ont passé la vérification préalable, un seul UPDATE aboutit"""
+    client = app_module.app.test_client()
+    incident_id = create_incident()
+    blob_name, _ = direct_upload(client, incident_id, os.urandom(512))
+    assert app_module.claim_direct_upload(blob_name)
+    assert not app_module.claim_direct_upload(blob_name)
+    app_module.db.session.rollback()
+    assert app_module.DirectUpload.query.filter_by(blob_name=blob_name).one().finalized_at is None
+
+def test_unknown_direct_upload_is_rejected():
+    """Jeton valide mais upload inconnu de la base (déjà purgé) : refusé sans créer de document"""
+    client = app_module.app.test_client()
+    incident_id = create_incident()
+    blob_name, token = direct_upload(client, incident_id, os.urandom(512))
+    app_module.DirectUpload.query.filter_by(blob_name=blob_name).delete()
+    app_module.db.session.commit()
+    assert finalize(client, incident_id, token).status_code == 400
+    assert app_module.count_blob_references(blob_name) == 0
+
+def test_direct_upload_size_mismatch_is_rejected():
+    client = app_module.app.test_client()
+    incident_id = create_incident()
+    blob_name, token = direct_upload(client, incident_id, b'tronque', size=2048)
+    assert finalize(client, incident_id, token).status_code == 400
+    assert app_module.count_blob_references(blob_name) == 0
+    # Blob déjà libéré : la purge des uploads abandonnés n'a plus à s'en charger
+    assert app_module.DirectUpload.query.filter_by(blob_name=blob_name).count() == 0
+    
+    # Finalisation réessayée : toujours une seule ligne de libération
+    assert finalize(client, incident_id, token).status_code == 400
+    assert app_module.ReleasedBlob.query.filter_by(blob_name=blob_name).count() == 1
+
+def test_abandoned_direct_uploads_are_swept():
+    """Uploads non finalisés : blob supprimé et ligne oubliée une fois le jeton expiré (plus le délai de grâce)"""
+    client = app_module.app.test_client()
+    incident_id = create_incident()
+    finalized, token = direct_upload(client, incident_id, os.urandom(1024))
+    assert finalize(client, incident_id, token).status_code == 201
+    abandoned, _ = direct_upload(client, incident_id, os.urandom(1024))
+    never_sent, _ = direct_upload(client, incident_id, os.urandom(1024), send=False)
+    
+    janitor = app_module.blob_janitor
+    assert janitor.sweep_uploads() == 0
+    expired = datetime.utcnow() + timedelta(
+        seconds=app_module.DIRECT_UPLOAD_SAS_TTL + app_module.DIRECT_UPLOAD_FINALIZE_GRACE + janitor.grace + 1
+    )
+    # Seul le blob abandonné est supprimé ; les blobs hors direct_uploads ne sont jamais parcourus
+    janitor.sweep_uploads(now=expired)
+    assert abandoned not in stored_blobs()
+    assert finalized in stored_blobs()
+    pending = app_module.DirectUpload.query.filter(
+        app_module.DirectUpload.blob_name.in_([finalized, abandoned, never_sent])
+    )
+    assert pending.count() == 0
+
+def test_janitor_lease_is_held_by_one_worker():
+    """Un seul worker purge tant que son bail court ; un bail expiré peut être repris"""
+    name = 'test-lease'
+    assert app_module.acquire_lease(name, 'worker-a', 60)
+    assert not app_module.acquire_lease(name, 'worker-b', 60)
+    assert app_module.acquire_lease(name, 'worker-a', 60)
+    
+    lease = app_module.MaintenanceLease.query.get(name)
+    lease.expires_at = datetime.utcnow() - timedelta(seconds=1)
+    app_module.db.session.commit()
+    assert app_module.acquire_lease(name, 'worker-b', 60)
+    assert not app_module.acquire_lease(name, 'worker-a', 60)
+
+def test_local_backend_properties_and_metadata():
+    backend = app_module.LocalFileStorageBackend(os.path.join(WORK_DIR, 'local'))
+    backend.upload('uploads/abc/rapport.txt', io.BytesIO(b'contenu'), {'incident_id': '1'})
+    
+    assert backend.properties('uploads/abc/rapport.txt') == {'size': 7, 'content_type': 'text/plain'}
+    backend.set_metadata('uploads/abc/rapport.txt', {'uploaded_by': 'direct_upload'})
+    with open(backend.get_path('uploads/abc/rapport.txt') + backend.METADATA_SUFFIX, encoding='utf-8') as f:
+        assert json.load(f) == {'uploaded_by': 'direct_upload'}
+    
+    for method, args in ((backend.properties, ()), (backend.set_metadata, ({},))):
+        try:
+            method('uploads/absent.txt', *args)
+            assert False, 'ResourceNotFoundError attendue'
+        except app_module.ResourceNotFoundError:
+            pass
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
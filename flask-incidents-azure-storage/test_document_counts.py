@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests du nombre de documents par incident (sans Azure)
+======================================================
+COUNT groupé dans la requête de liste : nombre de requêtes SQL indépendant
+du nombre d'incidents affichés, page HTML comme API JSON.
+
+    python -m pytest -q test_document_counts.py
+"""
+
+import os
+import sys
+import uuid
+
+from sqlalchemy import event
+
+from incidents_testing import app_module, create_incident, attach, run_tests
+
+class count_statements:
+    """Compter les requêtes SQL exécutées le temps d'un bloc"""
+    
+    def __enter__(self):
+        self.statements = []
+        self.engine = app_module.db.engine
+        event.listen(self.engine, 'before_cursor_execute', self.record)
+        return self
+    
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+    
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self.record)
+
+def create_incidents(prefix, count, client):
+    """Incidents au titre commun (filtre q), l'incident i ayant i % 3 documents"""
+    expected = {}
+    for index in range(count):
+        incident_id = create_incident(f'{prefix} {index:02d}')
+        for document in range(index % 3):
+            attach(client, incident_id, os.urandom(512), f'doc-{document}.log')
+        expected[incident_id] = index % 3
+    return expected
+
+def test_api_reports_document_counts():
+    client = app_module.app.test_client()
+    prefix = f'Comptage {uuid.uuid4().hex[:8]}'
+    expected = create_incidents(prefix, 6, client)
+    
+    response = client.get('/api/incidents', query_string={'q': prefix, 'limit': 50})
+    assert response.status_code == 200
+    counts = {item['id']: item['documents_count'] for item in response.get_json()}
+    assert counts == expected
+
+def test_query_count_does_not_grow_with_page_size():
+    """Une page de 2 ou de 12 incidents : autant de requêtes SQL (pas de len(incident.documents) par ligne)"""
+    client = app_module.app.test_client()
+    prefix = f'N+1 {uuid.uuid4().hex[:8]}'
+    create_incidents(prefix, 12, client)
+    
+    for url in ('/', '/api/incidents'):
+        client.get(url, query_string={'q': prefix, 'limit': 2})
+        executed = []
+        for limit in (2, 12):
+            with count_statements() as statements:
+                response = client.get(url, query_string={'q': prefix, 'limit': limit})
+            assert response.status_code == 200
+            executed.append(len(statements.statements))
+        assert executed[0] == executed[1], (url, executed)
+
+def test_html_list_shows_document_counts():
+    client = app_module.app.test_client()
+    prefix = f'Page {uuid.uuid4().hex[:8]}'
+    incident_id = create_incident(prefix)
+    for index in range(2):
+        attach(client, incident_id, os.urandom(512), f'page-{index}.log')
+    
+    html = client.get('/', query_string={'q': prefix}).get_data(as_text=True)
+    assert prefix in html
+    assert '2 fichier(s)' in html
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Tests de non-régression des documents (sans Azure)
+==================================================
+Lecture partagée, déduplication, cache disque et plages d'octets.
+
+    python -m pytest -q test_documents.py
+"""
+
+import base64
+import io
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from incidents_testing import (
+    app_module, WORK_DIR, CHUNK_SIZE, CountingBackend, store_blob, stored_blobs, create_incident, attach,
+    raises, run_tests
+)
+
+def cache_temp_files():
+    directory = app_module.document_cache.directory
+    if not os.path.isdir(directory):
+        return []
+    return [name for name in os.listdir(directory) if name.startswith(app_module.DocumentDiskCache.TEMP_PREFIX)]
+
+# ----------------------------------------
+# Lecture partagée des téléchargements
+# ----------------------------------------
+
+def test_single_download_holds_at_most_one_chunk():
+    """Un seul client : aucun bloc conservé, lecture arrêtée à la déconnexion"""
+    content = store_blob('tests/seul', 12 * CHUNK_SIZE)
+    with CountingBackend(app_module.get_storage_backend()) as backend:
+        subscription = app_module.stream_blob_coalesced('tests/seul', 'etag-seul', len(content))
+        fetch = app_module._blob_fetches[('tests/seul', 'etag-seul')]
+        chunks = iter(subscription)
+        
+        assert next(chunks) == content[:CHUNK_SIZE]
+        assert len(fetch.chunks) == 0
+        
+        subscription.close()
+        assert ('tests/seul', 'etag-seul') not in app_module._blob_fetches
+        assert fetch.closed
+        assert len(backend.downloads) == 1
+    assert cache_temp_files() == []
+
+def test_concurrent_downloads_share_one_read():
+    """Deux clients au même rythme : une seule lecture du blob"""
+    content = store_blob('tests/partage', 10 * CHUNK_SIZE)
+    with CountingBackend(app_module.get_storage_backend()) as backend:
+        first = app_module.stream_blob_coalesced('tests/partage', 'etag-partage', len(content))
+        second = app_module.stream_blob_coalesced('tests/partage', 'etag-partage', len(content))
+        first_chunks, second_chunks = iter(first), iter(second)
+        
+        received = ([], [])
+        for chunk in first_chunks:
+            received[0].append(chunk)
+            received[1].append(next(second_chunks))
+        received[1].extend(second_chunks)
+        
+        assert b''.join(received[0]) == content
+        assert b''.join(received[1]) == content
+        assert len(backend.downloads) == 1
+    assert ('tests/partage', 'etag-partage') not in app_module._blob_fetches
+
+def test_threaded_downloads_share_one_read():
+    """Quatre requêtes simultanées dans des threads : une seule lecture du blob"""
+    content = store_blob('tests/threads', 16 * CHUNK_SIZE)
+    barrier = threading.Barrier(4)
+    results = [None] * 4
+    
+    def download(index):
+        subscription = app_module.stream_blob_coalesced('tests/threads', 'etag-threads', len(content))
+        barrier.wait()
+        try:
+            results[index] = b''.join(subscription)
+        finally:
+            subscription.close()
+    
+    # Tampon plus grand que le blob : aucun thread n'est distancé, quel que soit l'ordonnancement
+    buffer_chunks = app_module.DOWNLOAD_SHARED_BUFFER_CHUNKS
+    app_module.DOWNLOAD_SHARED_BUFFER_CHUNKS = 32
+    with CountingBackend(app_module.get_storage_backend()) as backend:
+        threads = [threading.Thread(target=download, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        
+        app_module.DOWNLOAD_SHARED_BUFFER_CHUNKS = buffer_chunks
+        
+        assert results == [content] * 4
+        assert len(backend.downloads) == 1
+
+def test_slow_download_is_detached_with_bounded_buffer():
+    """Client arrêté : le tampon reste borné et le client finit par sa propre lecture"""
+    content = store_blob('tests/lent', 20 * CHUNK_SIZE)
+    max_chunks = app_module.DOWNLOAD_SHARED_BUFFER_CHUNKS
+    with CountingBackend(app_module.get_storage_backend()) as backend:
+        fast = app_module.stream_blob_coalesced('tests/lent', 'etag-lent', len(content))
+        slow = app_module.stream_blob_coalesced('tests/lent', 'etag-lent', len(content))
+        fetch = fast.fetch
+        slow_chunks = iter(slow)
+        received = [next(slow_chunks)]
+        
+        fast_received = []
+        for chunk in fast:
+            fast_received.append(chunk)
+            assert len(fetch.chunks) <= max_chunks
+        received.extend(slow_chunks)
+        
+        assert b''.join(fast_received) == content
+        assert b''.join(received) == content
+        # Lecture partagée puis reprise du client distancé à partir de sa position
+        assert backend.downloads == [('tests/lent', None, None), ('tests/lent', CHUNK_SIZE, None)]
+
+def test_reading_stops_when_all_clients_leave():
+    """Tous les clients déconnectés : plus de lecture, pas de fichier partiel en cache"""
+    content = store_blob('tests/abandon', 10 * CHUNK_SIZE)
+    first = app_module.stream_blob_coalesced('tests/abandon', 'etag-abandon', len(content))
+    second = app_module.stream_blob_coalesced('tests/abandon', 'etag-abandon', len(content))
+    next(iter(first))
+    first.close()
+    assert not first.fetch.closed
+    second.close()
+    
+    assert first.fetch.closed
+    assert ('tests/abandon', 'etag-abandon') not in app_module._blob_fetches
+    assert cache_temp_files() == []
+    assert app_module.document_cache.get('tests/abandon', 'etag-abandon') is None
+
+# ----------------------------------------
+# Déduplication et suppression différée
+# ----------------------------------------
+
+def purge_due():
+    """Purger comme si le délai de grâce était écoulé"""
+    grace = timedelta(seconds=app_module.BLOB_RELEASE_GRACE + 1)
+    return app_module.blob_janitor.purge(now=datetime.utcnow() + grace)
+
+def test_blob_is_deleted_only_after_last_reference_and_grace():
+    """Blob partagé : conservé tant qu'un document le référence, supprimé après le délai de grâce"""
+    client = app_module.app.test_client()
+    # Blobs libérés par les tests précédents (base partagée) : purgés d'abord pour compter ceux de ce test
+    purge_due()
+    content = os.urandom(4096)
+    first = attach(client, create_incident(), content)
+    second = attach(client, create_incident(), content)
+    assert first.blob_name == second.blob_name
+    blob_name = first.blob_name
+    
+    client.post(f'/document/{first.id}/delete')
+    assert blob_name in stored_blobs()
+    assert app_module.ReleasedBlob.query.filter_by(blob_name=blob_name).count() == 0
+    
+    client.post(f'/document/{second.id}/delete')
+    assert app_module.ReleasedBlob.query.filter_by(blob_name=blob_name).count() == 1
+    # Pas de suppression avant la fin du délai de grâce
+    assert app_module.blob_janitor.purge() == 0
+    assert blob_name in stored_blobs()
+    
+    assert purge_due() == 1
+    assert blob_name not in stored_blobs()
+    assert app_module.ReleasedBlob.query.filter_by(blob_name=blob_name).count() == 0
+
+def test_deduplicated_upload_racing_a_delete_keeps_blob():
+    """Upload qui a trouvé le contenu déjà stocké pendant la suppression de sa dernière référence"""
+    client = app_module.app.test_client()
+    content = os.urandom(4096)
+    original = attach(client, create_incident(), content)
+    content_hash = app_module.compute_content_hash(io.BytesIO(content))
+    
+    # Upload A : contenu trouvé, pas de PUT
+    stored = app_module.find_stored_contents({content_hash})
+    blob_name, file_size = stored[content_hash]
+    
+    # Suppression B de la dernière référence avant que A n'enregistre la sienne
+    client.post(f'/document/{original.id}/delete')
+    
+    incident_id = create_incident()
+    app_module.save_uploaded_documents([app_module.IncidentDocument(
+        incident_id=incident_id, filename='copie.log', blob_name=blob_name,
+        file_size=file_size, content_type='text/plain'
+    )])
+    
+    purge_due()
+    assert blob_name in stored_blobs()
+    document = app_module.IncidentDocument.query.filter_by(incident_id=incident_id).one()
+    response = client.get(f'/document/{document.id}/download')
+    assert response.status_code == 200
+    assert response.data == content
+
+def test_blob_rewritten_after_release_is_kept():
+    """Même contenu ré-uploadé après la libération, avant l'enregistrement du document"""
+    client = app_module.app.test_client()
+    content = os.urandom(4096)
+    document = attach(client, create_incident(), content)
+    client.post(f'/document/{document.id}/delete')
+    
+    app_module.get_storage_backend().upload(document.blob_name, io.BytesIO(content), {})
+    assert purge_due() == 0
+    assert document.blob_name in stored_blobs()
+
+def test_deduplicated_documents_share_cache_entry():
+    """Documents de même contenu : même ETag, une seule copie en cache et une seule lecture du blob"""
+    client = app_module.app.test_client()
+    content = os.urandom(8 * CHUNK_SIZE)
+    first = attach(client, create_incident(), content, 'premier.log')
+    second = attach(client, create_incident(), content, 'second.log')
+    assert app_module.get_document_etag(first) == app_module.get_document_etag(second)
+    
+    with CountingBackend(app_module.get_storage_backend()) as backend:
+        assert client.get(f'/document/{first.id}/download').data == content
+        assert client.get(f'/document/{second.id}/download').data == content
+        assert len(backend.downloads) == 1
+    
+    prefix = app_module.document_cache.blob_prefix(first.blob_name)
+    copies = [name for name in os.listdir(app_module.document_cache.directory) if name.startswith(prefix)]
+    assert len(copies) == 1
+
+# ----------------------------------------
+# Cache disque partagé
+# ----------------------------------------
+
+def test_disk_cache_limit_applies_to_all_workers():
+    """Deux workers (deux instances sur le même répertoire) : la taille totale reste sous la limite"""
+    directory = os.path.join(WORK_DIR, 'cache-partage')
+    max_size = 8 * CHUNK_SIZE
+    workers = [app_module.DocumentDiskCache(directory, max_size) for _ in range(2)]
+    
+    for i in range(12):
+        cache = workers[i % 2]
+        content = os.urandom(2 * CHUNK_SIZE)
+        assert b''.join(cache.fill(f'blob-{i}', 'etag', [content], len(content))) == content
+        total_size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        assert total_size <= max_size
+    
+    # Les fichiers les plus récents, quel que soit le worker qui les a écrits, sont conservés
+    assert workers[0].get('blob-11', 'etag') and workers[1].get('blob-10', 'etag')
+    assert workers[0].get('blob-0', 'etag') is None
+
+# ----------------------------------------
+# Plages d'octets (Range)
+# ----------------------------------------
+
+def test_unsatisfiable_range_is_416_with_or_without_cache():
+    """Plage hors du fichier : 416, que le document soit servi depuis le cache ou le stockage"""
+    client = app_module.app.test_client()
+    content = os.urandom(4 * CHUNK_SIZE)
+    document = attach(client, create_incident(), content, 'plage.log')
+    headers = {'Range': 'bytes=99999999-'}
+    
+    assert client.get(f'/document/{document.id}/download', headers=headers).status_code == 416
+    assert client.get(f'/document/{document.id}/download').data == content
+    assert app_module.document_cache.get(document.blob_name, app_module.get_document_etag(document))
+    
+    response = client.get(f'/document/{document.id}/download', headers=headers)
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(content)}'
+    
+    response = client.get(f'/document/{document.id}/download', headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206
+    assert response.data == content[10:20]
+
+def test_unknown_document_is_404():
+    client = app_module.app.test_client()
+    assert client.get('/document/999999/download').status_code == 404
+
+def test_get_requested_range():
+    """Range et If-Range : plage (start, stop), fichier complet (None) ou ValueError"""
+    cases = [
+        ({}, None),
+        ({'Range': 'bytes=0-99'}, (0, 100)),
+        ({'Range': 'bytes=-10'}, (990, 1000)),
+        ({'Range': 'bytes=900-'}, (900, 1000)),
+        ({'Range': 'bytes=0-1,5-6'}, None),
+        ({'Range': 'bytes=0-99', 'If-Range': '"autre"'}, None),
+        ({'Range': 'bytes=0-99', 'If-Range': '"etag"'}, (0, 100))
+    ]
+    for headers, expected in cases:
+        with app_module.app.test_request_context(headers=headers):
+            assert app_module.get_requested_range(1000, 'etag', None) == expected, headers
+    
+    with app_module.app.test_request_context(headers={'Range': 'bytes=5000-'}):
+        try:
+            app_module.get_requested_range(1000, 'etag', None)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('ValueError attendue')
+
+# ----------------------------------------
+# Liste des incidents
+# ----------------------------------------
+
+def test_index_statistics_are_cached_and_invalidated_by_writes():
+    """Statistiques globales : une requête d'agrégats par TTL, recalculées après une écriture"""
+    client = app_module.app.test_client()
+    compute = app_module.compute_incident_stats
+    calls = []
+    
+    def counting_compute():
+        calls.append(1)
+        return compute()
+    
+    app_module.compute_incident_stats = counting_compute
+    try:
+        app_module.invalidate_incident_stats()
+        assert client.get('/').status_code == 200
+        assert client.get('/').status_code == 200
+        assert len(calls) == 1
+        
+        incident_id = create_incident()
+        assert client.get('/').status_code == 200
+        assert len(calls) == 2
+        assert app_module.get_incident_stats()['total'] == app_module.Incident.query.count()
+        
+        attach(client, incident_id, os.urandom(1024))
+        assert app_module.get_incident_stats()['documents'] == app_module.IncidentDocument.query.count()
+    finally:
+        app_module.compute_incident_stats = compute
+
+# ----------------------------------------
+# Fonctions de validation
+# ----------------------------------------
+
+def test_pagination_cursor_round_trip_and_invalid_values():
+    incident = app_module.Incident(id=42, titre='Curseur', date_incident=datetime(2024, 3, 1, 12, 30, 15, 250))
+    cursor = app_module.encode_cursor(incident)
+    assert app_module.decode_cursor(cursor) == (incident.date_incident, 42)
+    
+    for invalid in ('', 'pas-un-curseur', 'Zm9v', base64.urlsafe_b64encode(b'2024-03-01|abc').decode(), '\u00e9t\u00e9'):
+        assert raises(ValueError, app_module.decode_cursor, invalid), invalid
+
+def test_validate_bulk_row():
+    """Mêmes règles que le formulaire ; dates ISO 8601 ramenées en UTC naïf"""
+    row = app_module.validate_bulk_row({'titre': '  Panne  ', 'date_incident': '2024-03-01T12:00:00+02:00'})
+    assert row == {'titre': 'Panne', 'description': None, 'severite': 'Moyenne',
+                   'date_incident': datetime(2024, 3, 1, 10, 0)}
+    assert app_module.validate_bulk_row({'titre': 'Panne', 'severite': 'Critique'})['severite'] == 'Critique'
+    
+    invalid_rows = [
+        ['pas un objet'],
+        {'titre': '   '},
+        {'titre': 'x' * (app_module.Incident.titre.type.length + 1)},
+        {'titre': 'Panne', 'severite': 'Inconnue'},
+        {'titre': 'Panne', 'date_incident': '01/03/2024'},
+        {'titre': 12},
+    ]
+    for row in invalid_rows:
+        assert raises(ValueError, app_module.validate_bulk_row, row), row
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests du téléchargement en streaming des documents (sans Azure)
+===============================================================
+Corps envoyé par blocs bornés avec Content-Length, plages d'octets lues
+dans le stockage ou servies depuis le cache disque.
+
+    python -m pytest -q test_download_streaming.py
+"""
+
+import os
+import sys
+
+from incidents_testing import app_module, CHUNK_SIZE, CountingBackend, create_incident, attach, run_tests
+
+def download(client, document, **headers):
+    return client.get(f'/document/{document.id}/download', headers=headers, buffered=False)
+
+def test_download_is_streamed_in_bounded_chunks():
+    """Corps découpé en blocs de CHUNK_SIZE au plus ; taille annoncée d'après IncidentDocument.file_size"""
+    client = app_module.app.test_client()
+    content = os.urandom(10 * CHUNK_SIZE + 123)
+    document = attach(client, create_incident(), content, 'capture.log')
+    
+    with CountingBackend(app_module.get_storage_backend()) as backend:
+        response = download(client, document)
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.headers['Content-Length'] == str(document.file_size)
+        assert response.headers['Accept-Ranges'] == 'bytes'
+        assert 'attachment' in response.headers['Content-Disposition']
+        
+        chunks = list(response.response)
+        response.close()
+    assert len(chunks) > 1
+    assert all(len(chunk) <= CHUNK_SIZE for chunk in chunks)
+    assert b''.join(chunks) == content
+    assert backend.downloads == [(document.blob_name, None, None)]
+
+def test_range_reads_only_requested_bytes_from_storage():
+    """Document absent du cache : seule la plage demandée est lue dans le stockage"""
+    client = app_module.app.test_client()
+    content = os.urandom(6 * CHUNK_SIZE)
+    document = attach(client, create_incident(), content, 'plage.log')
+    
+    with CountingBackend(app_module.get_storage_backend()) as backend:
+        response = download(client, document, Range='bytes=100-2147')
+        body = response.get_data()
+        response.close()
+    assert response.status_code == 206
+    assert body == content[100:2148]
+    assert response.headers['Content-Length'] == '2048'
+    assert response.headers['Content-Range'] == f'bytes 100-2147/{len(content)}'
+    assert backend.downloads == [(document.blob_name, 100, 2048)]
+
+def test_range_is_served_from_disk_cache():
+    """Document en cache : plages (y compris suffixe) servies sans lecture du stockage"""
+    client = app_module.app.test_client()
+    content = os.urandom(4 * CHUNK_SIZE)
+    document = attach(client, create_incident(), content, 'cache.log')
+    assert client.get(f'/document/{document.id}/download').data == content
+    
+    with CountingBackend(app_module.get_storage_backend()) as backend:
+        response = client.get(f'/document/{document.id}/download', headers={'Range': 'bytes=-10'})
+        assert response.status_code == 206
+        assert response.data == content[-10:]
+        assert response.headers['Content-Range'] == f'bytes {len(content) - 10}-{len(content) - 1}/{len(content)}'
+    assert backend.downloads == []
+
+def test_if_range_with_another_version_returns_full_document():
+    client = app_module.app.test_client()
+    content = os.urandom(3 * CHUNK_SIZE)
+    document = attach(client, create_incident(), content, 'version.log')
+    
+    response = download(client, document, **{'Range': 'bytes=0-9', 'If-Range': '"ancienne-version"'})
+    body = response.get_data()
+    response.close()
+    assert response.status_code == 200
+    assert body == content
+    
+    etag = response.headers['ETag']
+    response = download(client, document, **{'Range': 'bytes=0-9', 'If-Range': etag})
+    body = response.get_data()
+    response.close()
+    assert response.status_code == 206
+    assert body == content[:10]
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
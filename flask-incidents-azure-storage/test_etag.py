@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests des réponses conditionnelles de l'API (sans Azure)
+========================================================
+ETag sur la liste et le détail des incidents : 304 tant que rien ne change,
+nouvel ETag après création, modification ou ajout de document.
+
+    python -m pytest -q test_etag.py
+"""
+
+import os
+import sys
+import uuid
+
+from incidents_testing import app_module, create_incident, attach, run_tests
+
+def revalidate(client, url, etag, **params):
+    return client.get(url, query_string=params, headers={'If-None-Match': etag})
+
+def test_unchanged_list_is_answered_with_304():
+    client = app_module.app.test_client()
+    query = {'q': f'Liste {uuid.uuid4().hex[:8]}'}
+    create_incident(query['q'])
+    
+    response = client.get('/api/incidents', query_string=query)
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-cache'
+    etag = response.headers['ETag']
+    
+    cached = revalidate(client, '/api/incidents', etag, **query)
+    assert cached.status_code == 304
+    assert cached.data == b''
+    assert cached.headers['ETag'] == etag
+    
+    # Forme faible renvoyée par un client après une réponse compressée
+    assert revalidate(client, '/api/incidents', f'W/{etag}', **query).status_code == 304
+
+def test_list_etag_changes_with_data_and_parameters():
+    client = app_module.app.test_client()
+    query = {'q': f'Collection {uuid.uuid4().hex[:8]}'}
+    etag = client.get('/api/incidents', query_string=query).headers['ETag']
+    
+    # Filtres et limite font partie de la représentation
+    other = client.get('/api/incidents', query_string=dict(query, limit=5)).headers['ETag']
+    assert other != etag
+    
+    create_incident(query['q'])
+    response = revalidate(client, '/api/incidents', etag, **query)
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert [item['titre'] for item in response.get_json()] == [query['q']]
+
+def test_detail_etag_follows_incident_and_documents():
+    """Détail : 304 inchangé, nouvel ETag après ajout de document puis après modification de l'incident"""
+    client = app_module.app.test_client()
+    incident_id = create_incident()
+    url = f'/api/incidents/{incident_id}'
+    etag = client.get(url).headers['ETag']
+    assert revalidate(client, url, etag).status_code == 304
+    
+    attach(client, incident_id, os.urandom(256), 'detail.log')
+    response = revalidate(client, url, etag)
+    assert response.status_code == 200
+    assert len(response.get_json()['documents']) == 1
+    etag = response.headers['ETag']
+    assert revalidate(client, url, etag).status_code == 304
+    
+    incident = app_module.Incident.query.get(incident_id)
+    incident.titre = 'Titre modifié'
+    app_module.db.session.commit()
+    response = revalidate(client, url, etag)
+    assert response.status_code == 200
+    assert response.get_json()['titre'] == 'Titre modifié'
+    assert response.headers['ETag'] != etag
+
+def test_unknown_incident_is_not_revalidated():
+    client = app_module.app.test_client()
+    response = revalidate(client, '/api/incidents/999999999', '"quelconque"')
+    assert response.status_code != 304
+    assert 'ETag' not in response.headers
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests de l'export des incidents en streaming (sans Azure)
+=========================================================
+Formats NDJSON et CSV, documents regroupés par incident, validation des
+paramètres et envoi du corps par blocs au fil de la lecture.
+
+    python -m pytest -q test_export.py
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+import uuid
+
+from incidents_testing import app_module, settings, create_incident, attach, run_tests
+
+def create_export_set(client, count=3):
+    """Incidents au titre commun (filtre q) : l'incident i a i documents ; ids du plus récent au plus ancien"""
+    prefix = f'Export {uuid.uuid4().hex[:8]}'
+    incident_ids = []
+    for index in range(count):
+        incident_id = create_incident(f'{prefix} n°{index}, "guillemets"; point-virgule')
+        for document in range(index):
+            attach(client, incident_id, os.urandom(128), f'export-{document}.log')
+        incident_ids.append(incident_id)
+    return prefix, incident_ids[::-1]
+
+def export(client, **params):
+    return client.get('/api/incidents/export', query_string=params)
+
+def test_ndjson_export_lists_filtered_incidents():
+    client = app_module.app.test_client()
+    prefix, incident_ids = create_export_set(client)
+    response = export(client, q=prefix)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [record['id'] for record in records] == incident_ids
+    assert [record['documents_count'] for record in records] == [2, 1, 0]
+    assert set(records[0]) == set(app_module.EXPORT_INCIDENT_FIELDS) | {'documents_count'}
+    assert records[0]['titre'].startswith(prefix)
+    # Dates au format ISO 8601, comme to_dict
+    assert records[0]['date_creation'] == app_module.Incident.query.get(incident_ids[0]).date_creation.isoformat()
+
+def test_ndjson_export_groups_documents_by_incident():
+    client = app_module.app.test_client()
+    prefix, incident_ids = create_export_set(client)
+    records = [json.loads(line) for line in export(client, q=prefix, with_documents=1).get_data(as_text=True).splitlines()]
+    assert [record['id'] for record in records] == incident_ids
+    assert [len(record['documents']) for record in records] == [2, 1, 0]
+    assert [record['documents_count'] for record in records] == [2, 1, 0]
+    assert [document['filename'] for document in records[0]['documents']] == ['export-0.log', 'export-1.log']
+    assert set(records[0]['documents'][0]) == set(app_module.EXPORT_DOCUMENT_FIELDS)
+
+def test_csv_export_with_delimiter_and_documents():
+    """Une ligne CSV par document, une ligne aux colonnes document vides pour un incident sans document"""
+    client = app_module.app.test_client()
+    prefix, incident_ids = create_export_set(client)
+    response = export(client, q=prefix, format='csv', delimiter=';', with_documents=1)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'].endswith('.csv"')
+    
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True)), delimiter=';'))
+    assert [int(row['id']) for row in rows] == [incident_ids[0]] * 2 + [incident_ids[1], incident_ids[2]]
+    assert rows[0]['titre'] == f'{prefix} n°2, "guillemets"; point-virgule'
+    assert [row['document_filename'] for row in rows] == ['export-0.log', 'export-1.log', 'export-0.log', '']
+    assert rows[-1]['documents_count'] == '0' and rows[-1]['document_file_size'] == ''
+
+def test_csv_export_without_documents_has_one_row_per_incident():
+    client = app_module.app.test_client()
+    prefix, incident_ids = create_export_set(client)
+    lines = export(client, q=prefix, format='csv').get_data(as_text=True).splitlines()
+    assert lines[0] == ','.join(app_module.EXPORT_INCIDENT_FIELDS + ['documents_count'])
+    assert len(list(csv.reader(lines[1:]))) == len(incident_ids)
+
+def test_invalid_parameters_are_rejected():
+    client = app_module.app.test_client()
+    for params in ({'format': 'xml'}, {'delimiter': ';;'}, {'severite': 'Inconnue'}, {'date_debut': 'hier'}):
+        response = export(client, **params)
+        assert response.status_code == 400, params
+        assert 'error' in response.get_json()
+
+def test_export_body_is_streamed_in_chunks():
+    """Premier incident envoyé sans attendre, puis blocs d'environ EXPORT_CHUNK_SIZE octets"""
+    client = app_module.app.test_client()
+    prefix, incident_ids = create_export_set(client, count=8)
+    with settings(EXPORT_CHUNK_SIZE=512):
+        response = client.get('/api/incidents/export', query_string={'q': prefix}, buffered=False)
+        assert response.is_streamed
+        assert 'Content-Length' not in response.headers
+        assert response.headers['Cache-Control'] == 'no-store'
+        assert response.headers['X-Accel-Buffering'] == 'no'
+        
+        chunks = list(response.response)
+        response.close()
+    assert len(chunks) > 2
+    assert json.loads(chunks[0])['id'] == incident_ids[0]
+    lines = b''.join(chunks).decode('utf-8').splitlines()
+    assert [json.loads(line)['id'] for line in lines] == incident_ids
+    # Chaque bloc contient des lignes complètes
+    assert all(chunk.endswith(b'\n') for chunk in chunks)
+
+def test_empty_export():
+    client = app_module.app.test_client()
+    assert export(client, q=f'Aucun {uuid.uuid4().hex}').data == b''
+    lines = export(client, q=f'Aucun {uuid.uuid4().hex}', format='csv').get_data(as_text=True).splitlines()
+    assert lines == [','.join(app_module.EXPORT_INCIDENT_FIELDS + ['documents_count'])]
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Tests des sondes de disponibilité (sans Azure)
+==============================================
+Transitions d'état de la sonde en arrière-plan et démarrage avec le worker.
+
+    python -m pytest -q test_health.py
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from incidents_testing import app_module, SCRIPT_DIR, WORK_DIR, wait_for, run_tests
+
+def create_prober(check, timeout=0.2):
+    return app_module.DependencyProber({'service': check}, 60, timeout)
+
+def test_prober_state_transitions():
+    """UNKNOWN puis OK, ERROR, TIMEOUT (sans empiler de vérification bloquée), puis OK à nouveau"""
+    mode = {'value': 'ok'}
+    blocked = threading.Event()
+    
+    def check():
+        if mode['value'] == 'error':
+            raise ConnectionError('connexion refusée')
+        if mode['value'] == 'block':
+            blocked.wait(5)
+    
+    prober = create_prober(check)
+    assert prober.snapshot()['service']['status'] == 'UNKNOWN'
+    
+    prober.probe_all()
+    result = prober.snapshot()['service']
+    assert result['status'] == 'OK' and result['latency_ms'] is not None and result['error'] is None
+    
+    mode['value'] = 'error'
+    prober.probe_all()
+    result = prober.snapshot()['service']
+    assert result['status'] == 'ERROR' and 'connexion refusée' in result['error']
+    
+    mode['value'] = 'block'
+    prober.probe_all()
+    assert prober.snapshot()['service']['status'] == 'TIMEOUT'
+    blocking = prober.running['service']
+    # Vérification précédente toujours bloquée : pas de nouveau thread
+    prober.probe_all()
+    assert prober.running['service'] is blocking
+    assert prober.snapshot()['service']['error'] == 'Vérification précédente toujours en cours'
+    
+    mode['value'] = 'ok'
+    blocked.set()
+    assert blocking['done'].wait(5)
+    prober.probe_all()
+    assert prober.snapshot()['service']['status'] == 'OK'
+
+def test_old_ok_result_is_stale():
+    """Un résultat OK plus ancien que trois intervalles (plus le timeout) signale un thread de sonde arrêté"""
+    prober = create_prober(lambda: None)
+    prober.probe_all()
+    prober.results['service']['checked_at_ts'] = time.time() - (prober.interval * 3 + prober.timeout + 1)
+    assert prober.snapshot()['service']['status'] == 'STALE'
+
+def test_prober_starts_with_the_worker_not_with_readiness_probes():
+    """Toute requête démarre la sonde ; /readyz lit ensuite son résultat sans vérifier lui-même"""
+    client = app_module.app.test_client()
+    prober = app_module.dependency_prober
+    assert client.get('/livez').status_code == 200
+    assert prober.pid == os.getpid()
+    assert wait_for(lambda: all(result['status'] == 'OK' for result in prober.snapshot().values()))
+    
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'ready'
+
+def test_prober_starts_when_the_worker_imports_the_app():
+    """HEALTH_PROBE_ON_STARTUP (par défaut) : thread de sonde lancé à l'import, avant toute requête"""
+    env = dict(os.environ, HEALTH_PROBE_ON_STARTUP='True', AZURE_STORAGE_MODE='memory',
+               METRICS_DIR=os.path.join(WORK_DIR, 'metrics-startup'))
+    code = ("import os, threading, app; "
+            "print(app.dependency_prober.pid == os.getpid(), "
+            "any(t.name == 'dependency-prober' for t in threading.enumerate()))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=SCRIPT_DIR, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == 'True True'
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
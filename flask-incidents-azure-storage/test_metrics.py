@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests des métriques Prometheus (sans Azure)
+===========================================
+Fichiers par worker, jauge des requêtes en cours et exclusion du scrape lui-même.
+
+    python -m pytest -q test_metrics.py
+"""
+
+import os
+import re
+import sys
+import time
+
+from incidents_testing import app_module, WORK_DIR, create_incident, attach, run_tests
+
+def scrape(client):
+    """Lire /metrics et renvoyer (texte, valeur de http_requests_in_flight)"""
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    # La requête est enregistrée à la fermeture de la réponse, comme après l'envoi par le serveur WSGI
+    response.close()
+    return text, int(re.search(r'^http_requests_in_flight (\d+)$', text, re.M).group(1))
+
+def test_metrics_files_are_per_instance_and_pruned():
+    """Deux démarrages avec le même pid : deux fichiers ; fichiers non mis à jour supprimés après la rétention"""
+    directory = os.path.join(WORK_DIR, 'metrics-retention')
+    first = app_module.RequestMetrics(directory, 3600, 60)
+    second = app_module.RequestMetrics(directory, 3600, 60)
+    for metrics in (first, second):
+        metrics.ensure_started()
+        metrics.begin()
+        metrics.end('GET', '/', 200, 0.01, 0, 10)
+        metrics.flush()
+    assert len(os.listdir(directory)) == 2
+    assert len(first.collect()) == 2
+    
+    stale = os.path.join(directory, first.file_name())
+    old = time.time() - 120
+    os.utime(stale, (old, old))
+    assert second.prune() == 1
+    assert os.listdir(directory) == [second.file_name()]
+
+def test_scrape_is_not_counted_in_flight():
+    """Le scrape est mesuré (latence, statut) mais ne compte pas dans la jauge des requêtes en cours"""
+    client = app_module.app.test_client()
+    before = app_module.request_metrics.in_flight
+    _, in_flight = scrape(client)
+    assert in_flight == before
+    assert app_module.request_metrics.in_flight == before
+    
+    text, _ = scrape(client)
+    assert 'route="/metrics"' in text
+
+def test_streaming_download_is_in_flight_until_closed():
+    """Un téléchargement compte dans la jauge jusqu'à la fin de l'envoi du corps"""
+    client = app_module.app.test_client()
+    document = attach(client, create_incident(), os.urandom(4096))
+    before = app_module.request_metrics.in_flight
+    
+    response = client.get(f'/document/{document.id}/download', buffered=False)
+    assert scrape(client)[1] == before + 1
+    response.get_data()
+    response.close()
+    assert scrape(client)[1] == before
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Tests du profilage par échantillonnage (sans Azure)
+===================================================
+Piles repliées pour flame graph, threads au repos ignorés, attribution
+par route et route /debug/profile.
+
+    python -m pytest -q test_profiler.py
+"""
+
+import sys
+import threading
+
+from incidents_testing import app_module, settings, run_tests
+
+class busy_thread:
+    """Thread qui calcule (busy_loop) jusqu'à la fin du bloc"""
+    
+    def __enter__(self):
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.busy_loop, name='calcul', daemon=True)
+        self.thread.start()
+        return self.thread
+    
+    def busy_loop(self):
+        while not self.stop.is_set():
+            sum(range(1000))
+    
+    def __exit__(self, *exc_info):
+        self.stop.set()
+        self.thread.join(5)
+
+def stacks_with(counts, label):
+    return {stack: count for stack, count in counts.items() if label in stack}
+
+def test_collapsed_stacks_are_sorted_by_count():
+    counts = {'main;b': 2, 'main;a': 5, 'main;c': 2}
+    assert app_module.render_collapsed_stacks(counts) == 'main;a 5\nmain;b 2\nmain;c 2\n'
+    assert app_module.render_collapsed_stacks({}) == ''
+
+def test_busy_thread_stack_is_sampled_root_first():
+    """Pile du thread actif : de la racine (bootstrap du thread) vers la fonction en cours"""
+    profiler = app_module.SamplingProfiler()
+    with busy_thread():
+        counts, stats = profiler.sample(0.3, 200)
+    busy = stacks_with(counts, 'busy_loop (test_profiler.py:')
+    assert busy
+    for stack in busy:
+        frames = stack.split(';')
+        assert frames[0].startswith('_bootstrap (threading.py:')
+        assert any(frame.startswith('busy_loop ') for frame in frames[-2:])
+    assert stats['samples'] > 10
+    assert 0 < stats['rate'] <= 200 * 1.1
+    assert 0 <= stats['overhead'] < 1
+    # Le thread qui échantillonne n'apparaît pas dans le profil
+    assert not stacks_with(counts, 'sample (app.py:')
+
+def test_idle_threads_are_skipped_unless_requested():
+    profiler = app_module.SamplingProfiler()
+    released = threading.Event()
+    waiting = threading.Thread(target=released.wait, name='attente', daemon=True)
+    waiting.start()
+    try:
+        counts, _ = profiler.sample(0.1, 100, by_route=True)
+        assert not stacks_with(counts, '[attente];')
+        counts, _ = profiler.sample(0.1, 100, by_route=True, include_idle=True)
+        assert stacks_with(counts, '[attente];')
+    finally:
+        released.set()
+        waiting.join(5)
+
+def test_samples_are_attributed_to_the_active_route():
+    profiler = app_module.SamplingProfiler()
+    with busy_thread() as thread:
+        app_module.active_routes[thread.ident] = 'GET /api/incidents'
+        try:
+            counts, _ = profiler.sample(0.2, 100, by_route=True)
+        finally:
+            app_module.active_routes.pop(thread.ident, None)
+    busy = stacks_with(counts, 'busy_loop ')
+    assert busy and all(stack.startswith('GET /api/incidents;') for stack in busy)
+
+def test_frame_labels_cannot_break_collapsed_format():
+    code = compile('pass', 'a;b.py', 'exec')
+    assert app_module.SamplingProfiler().frame_label(code) == '<module> (a:b.py:1)'
+
+def test_concurrent_profiles_are_refused():
+    profiler = app_module.profiler
+    client = app_module.app.test_client()
+    with settings(DEBUG_ENDPOINTS_ENABLED=True, DEBUG_ENDPOINTS_TOKEN=None):
+        with profiler.lock:
+            assert profiler.sample(0.1, 100) == (None, None)
+            assert client.get('/debug/profile', query_string={'seconds': 0.1}).status_code == 409
+
+def test_debug_profile_returns_collapsed_stacks():
+    client = app_module.app.test_client()
+    with settings(DEBUG_ENDPOINTS_ENABLED=False):
+        assert client.get('/debug/profile').status_code == 404
+    with settings(DEBUG_ENDPOINTS_ENABLED=True, DEBUG_ENDPOINTS_TOKEN=None):
+        for params in ({'seconds': 0}, {'seconds': app_module.PROFILE_MAX_SECONDS + 1}, {'seconds': 1, 'hz': 5000}):
+            assert client.get('/debug/profile', query_string=params).status_code == 400
+        
+        with busy_thread():
+            response = client.get('/debug/profile', query_string={'seconds': 0.3, 'hz': 100})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert int(response.headers['X-Profile-Samples']) > 0
+    assert float(response.headers['X-Profile-Duration']) >= 0.3
+    assert response.headers['X-Profile-Pid']
+    lines = response.get_data(as_text=True).splitlines()
+    assert any('busy_loop ' in line for line in lines)
+    for line in lines:
+        stack, count = line.rsplit(' ', 1)
+        assert stack and int(count) > 0
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Tests de la compression des réponses (sans Azure)
+=================================================
+Négociation gzip/br selon Accept-Encoding, en-tête Vary, seuil de taille,
+ETag faible, flux compressés au fil de l'eau, téléchargements et CSS.
+
+    python -m pytest -q test_response_compression.py
+"""
+
+import gzip
+import json
+import os
+import sys
+import uuid
+import zlib
+
+from incidents_testing import app_module, settings, create_incident, attach, run_tests
+
+def decompress(data, encoding):
+    if encoding == 'br':
+        return app_module.brotli.decompress(data)
+    return gzip.decompress(data)
+
+def create_listed_incidents(count=10):
+    """Assez d'incidents pour dépasser COMPRESSION_MIN_SIZE ; renvoie le filtre q commun"""
+    prefix = f'Compression {uuid.uuid4().hex[:8]}'
+    for index in range(count):
+        create_incident(f'{prefix} {index}')
+    return {'q': prefix}
+
+def test_json_is_compressed_with_the_negotiated_encoding():
+    client = app_module.app.test_client()
+    query = create_listed_incidents()
+    plain = client.get('/api/incidents', query_string=query)
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.headers['Vary'] == 'Accept-Encoding'
+    
+    cases = [('gzip', 'gzip'), ('gzip, deflate', 'gzip'), ('identity', None), ('gzip;q=0', None)]
+    if app_module.brotli is not None:
+        cases += [('gzip, br', 'br'), ('br;q=0, gzip', 'gzip')]
+    for accept, expected in cases:
+        response = client.get('/api/incidents', query_string=query, headers={'Accept-Encoding': accept})
+        assert response.headers.get('Content-Encoding') == expected, accept
+        assert response.headers['Vary'] == 'Accept-Encoding'
+        body = decompress(response.data, expected) if expected else response.data
+        assert json.loads(body) == plain.get_json()
+        if expected:
+            assert int(response.headers['Content-Length']) == len(response.data) < len(plain.data)
+
+def test_small_responses_and_disabled_compression_are_sent_as_is():
+    client = app_module.app.test_client()
+    headers = {'Accept-Encoding': 'gzip'}
+    response = client.get('/livez', headers=headers)
+    assert len(response.data) < app_module.COMPRESSION_MIN_SIZE
+    assert 'Content-Encoding' not in response.headers
+    # Réponse compressible : Vary même sous le seuil, le corps dépendant du codage pour d'autres tailles
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    
+    with settings(COMPRESSION_MIN_SIZE=1):
+        assert client.get('/livez', headers=headers).headers['Content-Encoding'] == 'gzip'
+    with settings(COMPRESSION_ENABLED=False):
+        response = client.get('/api/incidents', headers=headers)
+        assert 'Content-Encoding' not in response.headers and 'Vary' not in response.headers
+
+def test_compressed_response_has_weak_etag_and_revalidates():
+    client = app_module.app.test_client()
+    query = create_listed_incidents()
+    strong = client.get('/api/incidents', query_string=query).headers['ETag']
+    response = client.get('/api/incidents', query_string=query, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['ETag'] == f'W/{strong}'
+    
+    cached = client.get('/api/incidents', query_string=query,
+                        headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+    assert 'Content-Encoding' not in cached.headers
+
+def test_streamed_export_is_compressed_chunk_by_chunk():
+    """Chaque bloc compressé est vidé : le premier incident se décode sans attendre la fin du flux"""
+    client = app_module.app.test_client()
+    query = create_listed_incidents(count=5)
+    response = client.get('/api/incidents/export', query_string=query,
+                          headers={'Accept-Encoding': 'gzip'}, buffered=False)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    
+    chunks = iter(response.response)
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    first = decoder.decompress(next(chunks))
+    assert json.loads(first.decode('utf-8').splitlines()[0])['titre'].startswith(query['q'])
+    rest = b''.join(decoder.decompress(chunk) for chunk in chunks) + decoder.flush()
+    response.close()
+    assert decoder.eof
+    assert len((first + rest).decode('utf-8').splitlines()) == 5
+
+def test_document_downloads_are_sent_as_stored():
+    """Téléchargement texte (streaming puis send_file depuis le cache, avec ou sans Range) : jamais recompressé"""
+    client = app_module.app.test_client()
+    content = b'ligne de journal\n' * 500
+    document = attach(client, create_incident(), content, 'journal.txt')
+    for headers in ({}, {}, {'Range': 'bytes=0-99'}):
+        headers['Accept-Encoding'] = 'gzip'
+        response = client.get(f'/document/{document.id}/download', headers=headers)
+        assert response.mimetype == 'text/plain'
+        assert 'Content-Encoding' not in response.headers
+        assert response.data == (content[:100] if 'Range' in headers else content)
+
+def test_css_is_precompressed_once_and_cached():
+    client = app_module.app.test_client()
+    path = os.path.join(app_module.app.static_folder, 'css', 'style.css')
+    with open(path, 'rb') as f:
+        original = f.read()
+    app_module.static_compression_cache.clear()
+    
+    response = client.get('/static/css/style.css', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.headers['ETag'].startswith('W/')
+    assert gzip.decompress(response.data) == original
+    cached = app_module.static_compression_cache[(path, 'gzip')]
+    
+    again = client.get('/static/css/style.css', headers={'Accept-Encoding': 'gzip'})
+    assert app_module.static_compression_cache[(path, 'gzip')] is cached
+    assert again.data == response.data
+    
+    revalidated = client.get('/static/css/style.css',
+                             headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert client.get('/static/css/style.css').data == original
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Tests de l'index de recherche plein texte (sans Azure)
+======================================================
+Construction en arrière-plan, synchronisation incrémentale et reconstruction.
+
+    python -m pytest -q test_search.py
+"""
+
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from incidents_testing import app_module, create_incident, wait_for, run_tests
+
+def search_ids(client, query):
+    response = client.get('/api/incidents/search', query_string={'q': query})
+    if response.status_code != 200:
+        return None
+    return [incident['id'] for incident in response.get_json()]
+
+def test_search_index_is_built_in_background_and_follows_writes():
+    """Index construit par le thread d'indexation, pas par la recherche ; les écritures locales le réveillent"""
+    client = app_module.app.test_client()
+    incident = app_module.Incident(titre='Disjoncteur quasarique', description='Test', severite='Faible')
+    app_module.db.session.add(incident)
+    app_module.db.session.commit()
+    
+    client.get('/livez')  # Première requête du worker : démarre le thread d'indexation
+    assert wait_for(lambda: search_ids(client, 'quasarique') == [incident.id])
+    
+    other = app_module.Incident(titre='Onduleur quasarique', description='Test', severite='Faible')
+    app_module.db.session.add(other)
+    app_module.db.session.commit()
+    # Réveil au commit : bien avant SEARCH_SYNC_INTERVAL
+    assert wait_for(lambda: sorted(search_ids(client, 'quasarique') or []) == sorted([incident.id, other.id]), timeout=2)
+
+def test_search_index_rebuild_does_not_block_searches():
+    """Reconstruction : les lignes sont indexées hors du verrou, les recherches répondent pendant ce temps"""
+    index = app_module.IncidentSearchIndex()
+    index.index_incident(1, 'Ancien incident', '')
+    index.built = True
+    answered = []
+    
+    def rows(since=None):
+        for incident_id in range(2, 5):
+            searcher = threading.Thread(target=lambda: answered.append(index.search('ancien', 10)))
+            searcher.start()
+            searcher.join(timeout=2)
+            yield incident_id, f'Nouvel incident {incident_id}', '', datetime.utcnow()
+    
+    index.incident_rows = rows
+    index.rebuild()
+    assert len(answered) == 3
+    assert all(result and result[0][0] == 1 for result in answered)
+    assert [result[0] for result in index.search('nouvel', 10)] != []
+    assert index.search('ancien', 10) == []
+
+def create_incident_at(titre, date_modification):
+    incident = app_module.Incident(titre=titre, description='Test', severite='Faible',
+                                   date_modification=date_modification)
+    app_module.db.session.add(incident)
+    app_module.db.session.commit()
+    return incident.id
+
+def found(index, query):
+    return {incident_id for incident_id, _ in index.search(query, 100)}
+
+def test_late_commit_with_older_timestamp_is_indexed():
+    """Ligne validée après une synchronisation avec une date antérieure au marqueur : relue par le chevauchement"""
+    index = app_module.IncidentSearchIndex()
+    first = create_incident('Routeur zirconien')
+    index.sync()
+    assert found(index, 'zirconien') == {first}
+    
+    late = create_incident_at('Commutateur zirconien', index.watermark - timedelta(seconds=30))
+    index.sync()
+    assert found(index, 'zirconien') == {first, late}
+
+def test_rows_older_than_overlap_are_caught_by_periodic_rebuild():
+    index = app_module.IncidentSearchIndex()
+    index.sync()
+    very_late = create_incident_at(
+        'Pare-feu basaltique', index.watermark - timedelta(seconds=app_module.SEARCH_SYNC_OVERLAP + 60)
+    )
+    index.sync()
+    assert found(index, 'basaltique') == set()
+    
+    index.last_rebuild = 0
+    index.sync()
+    assert found(index, 'basaltique') == {very_late}
+
+def test_overlap_rows_already_indexed_are_skipped():
+    index = app_module.IncidentSearchIndex()
+    index.sync()
+    reindexed = []
+    original = index.index_incident
+    index.index_incident = lambda *args: reindexed.append(args[0]) or original(*args)
+    index.sync()
+    assert reindexed == []
+
+def test_search_answers_503_until_index_is_built():
+    client = app_module.app.test_client()
+    built = app_module.search_index.built
+    app_module.search_index.built = False
+    try:
+        response = client.get('/api/incidents/search', query_string={'q': 'panne'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+    finally:
+        app_module.search_index.built = built
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Tests de l'instrumentation SQL (sans Azure)
+===========================================
+Normalisation des requêtes, compteurs par requête HTTP (Server-Timing),
+journal des requêtes lentes et route /debug/sql.
+
+    python -m pytest -q test_sql_instrumentation.py
+"""
+
+import contextlib
+import io
+import sys
+import uuid
+
+from sqlalchemy import text
+
+from incidents_testing import app_module, settings, create_incident, run_tests
+
+def execute_marked(marker, literal, number):
+    app_module.db.session.execute(text(f"SELECT '{literal}' AS {marker}, {number}"))
+
+def test_statement_normalization():
+    normalize = app_module.normalize_statement
+    assert normalize("SELECT * FROM t WHERE a = 'x' AND b = 42") == 'SELECT * FROM t WHERE a = ? AND b = ?'
+    assert normalize("SELECT 'O''Brien', 3.14") == 'SELECT ?, ?'
+    assert normalize('SELECT id FROM t WHERE id IN (?, ?, ?)') == normalize('SELECT id FROM t WHERE id IN (?,?)')
+    assert normalize('SELECT\n    incident_2.id\n FROM  incidents') == 'SELECT incident_2.id FROM incidents'
+
+def test_parameter_shape_never_contains_values():
+    assert app_module.parameter_shape(('secret', 42)) == '(str, int)'
+    assert app_module.parameter_shape({'titre': 'secret'}) == '{titre: str}'
+    assert app_module.parameter_shape([('a', 1), ('b', 2)], executemany=True) == '2 × (str, int)'
+
+def test_statements_with_different_literals_are_grouped():
+    marker = f'marqueur_{uuid.uuid4().hex[:8]}'
+    for index in range(3):
+        execute_marked(marker, f'valeur {index}', index)
+    entries = [entry for entry in app_module.statement_stats.top(app_module.SQL_STATS_MAX_STATEMENTS, 'count')
+               if marker in entry['statement']]
+    assert len(entries) == 1
+    assert entries[0]['statement'] == f'SELECT ? AS {marker}, ?'
+    assert entries[0]['count'] == 3
+
+def test_statement_table_is_bounded():
+    stats = app_module.StatementStats(3)
+    for index, seconds in enumerate((0.5, 0.1, 0.3, 0.2)):
+        stats.record(f'SELECT col_{"abcd"[index]} FROM t', seconds)
+    assert [entry['statement'] for entry in stats.top(10)] == ['SELECT col_a FROM t', 'SELECT col_c FROM t',
+                                                               'SELECT col_d FROM t']
+
+def test_request_reports_its_query_count():
+    """Server-Timing : nombre et durée des requêtes SQL de cette requête HTTP seulement"""
+    client = app_module.app.test_client()
+    incident_id = create_incident()
+    response = client.get(f'/api/incidents/{incident_id}')
+    timing = response.headers['Server-Timing']
+    assert timing.startswith('db;dur=')
+    first_count = int(timing.split('desc="')[1].split()[0])
+    assert first_count > 0
+    
+    # Les compteurs repartent de zéro à chaque requête
+    timing = client.get(f'/api/incidents/{incident_id}').headers['Server-Timing']
+    assert int(timing.split('desc="')[1].split()[0]) <= first_count
+    assert 'Server-Timing' not in client.get('/livez').headers
+
+def test_slow_queries_and_query_count_warnings_are_logged():
+    client = app_module.app.test_client()
+    incident_id = create_incident(titre='Titre confidentiel')
+    output = io.StringIO()
+    with settings(SQL_SLOW_QUERY_MS=0, SQL_QUERY_COUNT_WARNING=1), contextlib.redirect_stdout(output):
+        client.get(f'/api/incidents/{incident_id}')
+    log = output.getvalue()
+    assert 'Requête SQL lente' in log and f'[GET /api/incidents/{incident_id}]' in log
+    assert 'paramètres: (int' in log or 'paramètres: {' in log
+    assert 'motif N+1' in log
+    assert 'Titre confidentiel' not in log
+
+def test_debug_sql_is_disabled_by_default():
+    client = app_module.app.test_client()
+    with settings(DEBUG_ENDPOINTS_ENABLED=False):
+        assert client.get('/debug/sql').status_code == 404
+
+def test_debug_sql_requires_the_configured_token():
+    client = app_module.app.test_client()
+    with settings(DEBUG_ENDPOINTS_ENABLED=True, DEBUG_ENDPOINTS_TOKEN='jeton'):
+        assert client.get('/debug/sql').status_code == 403
+        assert client.get('/debug/sql', headers={'X-Debug-Token': 'autre'}).status_code == 403
+        assert client.get('/debug/sql', headers={'X-Debug-Token': 'jeton'}).status_code == 200
+
+def test_debug_sql_lists_top_statements():
+    client = app_module.app.test_client()
+    marker = f'marqueur_{uuid.uuid4().hex[:8]}'
+    with settings(DEBUG_ENDPOINTS_ENABLED=True, DEBUG_ENDPOINTS_TOKEN=None):
+        assert client.get('/debug/sql', query_string={'order': 'avg'}).status_code == 400
+        
+        client.get('/debug/sql', query_string={'reset': '1'})
+        for index in range(5):
+            execute_marked(marker, 'x', index)
+        create_incident()
+        
+        payload = client.get('/debug/sql', query_string={'order': 'count', 'limit': 1}).get_json()
+        assert payload['order'] == 'count'
+        assert [entry['statement'] for entry in payload['statements']] == [f'SELECT ? AS {marker}, ?']
+        assert payload['statements'][0]['count'] == 5
+        assert set(payload['statements'][0]) == {'statement', 'count', 'total_ms', 'avg_ms', 'max_ms'}
+        
+        # reset=1 : table renvoyée puis vidée
+        assert client.get('/debug/sql', query_string={'reset': '1'}).get_json()['statements']
+        statements = client.get('/debug/sql').get_json()['statements']
+        assert not any(marker in entry['statement'] for entry in statements)
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
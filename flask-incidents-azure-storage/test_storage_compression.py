@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tests de la compression au repos des pièces jointes (sans Azure)
+================================================================
+Compression pendant l'upload par blocs, téléchargement avec ou sans Content-Encoding
+et requêtes Range sur les blobs compressés.
+
+    python -m pytest -q test_storage_compression.py
+"""
+
+import gzip
+import io
+import os
+import sys
+
+from incidents_testing import app_module, RecordingBlobClient, stored_blobs, create_incident, attach, run_tests
+
+def log_content(size):
+    """Texte compressible (environ 2:1) et unique, pour ne pas être dédupliqué"""
+    return os.urandom(size // 2).hex().encode()
+
+class storage_compression:
+    """Activer la compression au repos pour toutes les catégories le temps d'un test"""
+    
+    def __init__(self, codec='gzip'):
+        self.codec = codec
+    
+    def __enter__(self):
+        self.original = dict(app_module.storage_compression_codecs)
+        for category in app_module.ALLOWED_EXTENSIONS:
+            app_module.storage_compression_codecs[category] = self.codec
+    
+    def __exit__(self, *exc_info):
+        app_module.storage_compression_codecs.clear()
+        app_module.storage_compression_codecs.update(self.original)
+
+def test_parse_storage_compression():
+    """Codec gzip par défaut, entrées inconnues ignorées, repli sur gzip sans le paquet zstandard"""
+    assert app_module.parse_storage_compression('') == {}
+    assert app_module.parse_storage_compression('documents, other:gzip ,images:lz4,inconnue:gzip') == {
+        'documents': 'gzip', 'other': 'gzip'
+    }
+    expected = 'zstd' if app_module.zstandard is not None else 'gzip'
+    assert app_module.parse_storage_compression('spreadsheets:zstd') == {'spreadsheets': expected}
+
+def test_compressed_upload_is_streamed_in_blocks():
+    """Le flux compressé est découpé en blocs pleins (sauf le dernier) sans connaître sa taille d'avance"""
+    content = log_content(200 * 1024)
+    single_put, block_size = app_module.AZURE_STORAGE_MAX_SINGLE_PUT_SIZE, app_module.AZURE_STORAGE_MAX_BLOCK_SIZE
+    app_module.AZURE_STORAGE_MAX_SINGLE_PUT_SIZE = app_module.AZURE_STORAGE_MAX_BLOCK_SIZE = 8 * 1024
+    try:
+        compressed, original_size = app_module.compress_for_storage(io.BytesIO(content), 'gzip')
+        assert original_size == len(content)
+        blob_client = RecordingBlobClient()
+        stored_size = app_module.upload_stream_in_blocks(blob_client, compressed, {})
+    finally:
+        app_module.AZURE_STORAGE_MAX_SINGLE_PUT_SIZE, app_module.AZURE_STORAGE_MAX_BLOCK_SIZE = single_put, block_size
+    
+    assert not blob_client.single_puts
+    sizes = [len(blob_client.blocks[block_id]) for block_id in sorted(blob_client.blocks)]
+    assert len(sizes) > 2
+    assert all(size == 8 * 1024 for size in sizes[:-1]) and 0 < sizes[-1] <= 8 * 1024
+    assert stored_size == len(blob_client.committed) < len(content)
+    assert gzip.decompress(blob_client.committed) == content
+
+def test_compressing_reader_restarts_from_the_beginning():
+    """seek(0) (nouvel essai d'upload) recommence la compression ; les autres déplacements sont refusés"""
+    content = log_content(50 * 1024)
+    reader = app_module.CompressingReader(io.BytesIO(content), 'gzip')
+    first = reader.read()
+    reader.seek(0)
+    assert reader.read(100) + reader.read() == first
+    assert reader.tell() == len(first)
+    try:
+        reader.seek(10)
+        assert False, 'io.UnsupportedOperation attendue'
+    except io.UnsupportedOperation:
+        pass
+
+def test_incompressible_file_is_stored_as_is():
+    client = app_module.app.test_client()
+    incident_id = create_incident()
+    content = os.urandom(20 * 1024)
+    with storage_compression():
+        document = attach(client, incident_id, content, filename='capture.log')
+    assert app_module.blob_codec(document.blob_name) is None
+    assert stored_blobs()[document.blob_name].content == content
+
+def test_compressed_document_download_and_range():
+    """Blob .gz : décompressé pour le client sans gzip, transmis tel quel sinon ; Range reçoit un 200 complet"""
+    client = app_module.app.test_client()
+    incident_id = create_incident()
+    content = log_content(20 * 1024)
+    with storage_compression():
+        document = attach(client, incident_id, content, filename='trace.log')
+    assert document.blob_name.endswith('.gz')
+    assert document.file_size == len(content)
+    assert gzip.decompress(stored_blobs()[document.blob_name].content) == content
+    
+    url = f'/document/{document.id}/download'
+    response = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert response.status_code == 200
+    assert response.data == content
+    
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == content
+    
+    # Plage ignorée volontairement : ni 206 ni 416, document complet
+    for byte_range in ('bytes=0-99', f'bytes={len(content) * 2}-'):
+        response = client.get(url, headers={'Range': byte_range, 'Accept-Encoding': 'identity'})
+        assert response.status_code == 200
+        assert response.headers['Accept-Ranges'] == 'none'
+        assert 'Content-Range' not in response.headers
+        assert response.data == content
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests(globals()) else 1)
@@ -4,6 +4,7 @@ from datetime import datetime
 import urllib.parse
 import os
 from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
 
 # Charger les variables d'environnement depuis le fichier .env
 try:
@@ -26,6 +27,17 @@ AZURE_SQL_DATABASE = os.environ.get('AZURE_SQL_DATABASE', 'IncidentsReseau')
 AZURE_SQL_USERNAME = os.environ.get('AZURE_SQL_USERNAME', 'votre-admin')
 AZURE_SQL_PASSWORD = os.environ.get('AZURE_SQL_PASSWORD', 'VotreMotDePasse123!')
 
+# Pool de connexions SQLAlchemy (appliqué aux moteurs SQL Server / Azure SQL)
+AZURE_SQL_POOL_SIZE = int(os.environ.get('AZURE_SQL_POOL_SIZE', '10'))
+AZURE_SQL_MAX_OVERFLOW = int(os.environ.get('AZURE_SQL_MAX_OVERFLOW', '20'))
+AZURE_SQL_POOL_TIMEOUT = int(os.environ.get('AZURE_SQL_POOL_TIMEOUT', '30'))
+# Azure SQL ferme les connexions inactives : les recycler avant (secondes)
+AZURE_SQL_POOL_RECYCLE = int(os.environ.get('AZURE_SQL_POOL_RECYCLE', '1800'))
+AZURE_SQL_POOL_PRE_PING = os.environ.get('AZURE_SQL_POOL_PRE_PING', 'True').lower() == 'true'
+AZURE_SQL_FAST_EXECUTEMANY = os.environ.get('AZURE_SQL_FAST_EXECUTEMANY', 'True').lower() == 'true'
+# Délai max d'exécution d'une requête en secondes (0 = illimité)
+AZURE_SQL_QUERY_TIMEOUT = int(os.environ.get('AZURE_SQL_QUERY_TIMEOUT', '0'))
+
 # 🔐 Méthodes d'authentification Azure SQL
 def create_azure_connection_string():
     """Créer la chaîne de connexion Azure SQL Database"""
@@ -56,14 +68,33 @@ def create_azure_connection_string():
     
     return f"mssql+pyodbc:///?odbc_connect={connection_params}"
 
-# Configuration Flask
+def create_engine_options():
+    """Options du moteur SQLAlchemy pour Azure SQL (pool, pre-ping, fast_executemany, timeouts)"""
+    return {
+        'pool_size': AZURE_SQL_POOL_SIZE,
+        'max_overflow': AZURE_SQL_MAX_OVERFLOW,
+        'pool_timeout': AZURE_SQL_POOL_TIMEOUT,
+        'pool_recycle': AZURE_SQL_POOL_RECYCLE,
+        'pool_pre_ping': AZURE_SQL_POOL_PRE_PING,
+        'fast_executemany': AZURE_SQL_FAST_EXECUTEMANY,
+        # Délai de connexion (login) pyodbc, identique à celui de la chaîne de connexion
+        'connect_args': {'timeout': int(os.environ.get('AZURE_CONNECTION_TIMEOUT', '30'))}
+    }
+
 app.config['SQLALCHEMY_DATABASE_URI'] = create_azure_connection_string()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = create_engine_options()
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'azure-secret-key-dev')
 
-# Initialisation SQLAlchemy
+# Initialisation SQLAlchemy (pool configuré par create_engine_options)
 db = SQLAlchemy(app)
 
+@db.event.listens_for(QueuePool, 'connect')
+def set_query_timeout(dbapi_connection, connection_record):
+    """Appliquer le délai max des requêtes (attribut timeout de pyodbc) aux nouvelles connexions"""
+    if AZURE_SQL_QUERY_TIMEOUT:
+        dbapi_connection.timeout = AZURE_SQL_QUERY_TIMEOUT
+
 # ========================================
 # MODÈLE DE DONNÉES (identique au projet original)
 # ========================================
@@ -4,6 +4,7 @@ from datetime import datetime
 import urllib.parse
 import os
 from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
 
 app = Flask(__name__)
 
@@ -11,6 +12,17 @@ app = Flask(__name__)
 # Nom de serveur correct détecté automatiquement
 DB_SERVER = 'vmappincidents\\SQLEXPRESS'  # Nom réel du serveur détecté
 DB_DATABASE = 'IncidentsReseau'           # Base de données existante
+DB_CONNECTION_TIMEOUT = int(os.environ.get('DB_CONNECTION_TIMEOUT', '10'))
+
+# Pool de connexions SQLAlchemy
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'True').lower() == 'true'
+DB_FAST_EXECUTEMANY = os.environ.get('DB_FAST_EXECUTEMANY', 'True').lower() == 'true'
+# Délai max d'exécution d'une requête en secondes (0 = illimité)
+DB_QUERY_TIMEOUT = int(os.environ.get('DB_QUERY_TIMEOUT', '0'))
 
 # Configurations alternatives si nécessaire
 DB_CONFIGS_BACKUP = [
@@ -27,7 +39,7 @@ params = urllib.parse.quote_plus(
     f"DATABASE={DB_DATABASE};"
     f"Trusted_Connection=yes;"
     f"TrustServerCertificate=yes;"
-    f"Connection Timeout=10;"
+    f"Connection Timeout={DB_CONNECTION_TIMEOUT};"
 )
 
 # Option 2: SQL Server Authentication (décommentez si vous préférez)
@@ -42,12 +54,33 @@ params = urllib.parse.quote_plus(
 #     f"TrustServerCertificate=yes;"
 # )
 
+def create_engine_options():
+    """Options du moteur SQLAlchemy (pool, pre-ping, fast_executemany, timeouts)"""
+    return {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+        'fast_executemany': DB_FAST_EXECUTEMANY,
+        # Délai de connexion (login) pyodbc, identique à celui de la chaîne de connexion
+        'connect_args': {'timeout': DB_CONNECTION_TIMEOUT}
+    }
+
 app.config['SQLALCHEMY_DATABASE_URI'] = f"mssql+pyodbc:///?odbc_connect={params}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = create_engine_options()
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 
+# Pool configuré par create_engine_options
 db = SQLAlchemy(app)
 
+@db.event.listens_for(QueuePool, 'connect')
+def set_query_timeout(dbapi_connection, connection_record):
+    """Appliquer le délai max des requêtes (attribut timeout de pyodbc) aux nouvelles connexions"""
+    if DB_QUERY_TIMEOUT:
+        dbapi_connection.timeout = DB_QUERY_TIMEOUT
+
 # Modèle de données pour les incidents réseau
 class Incident(db.Model):
     __tablename__ = 'incidents'